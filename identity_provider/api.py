@@ -2,14 +2,17 @@
 
 import logging
 import json
+import threading
 
+import psycopg2
 from bottle import Bottle, request, response, abort
 
 from config import LISTEN_ADDRESS, LISTEN_PORT
 from data_models import dataclass_response, extract_request_body, HTTPResponse, NewUserRequest, \
     TokenRequest
-from persistence import create_new_user
-from helpers import email_in_use, username_in_use, is_authenticated_user
+from persistence import create_new_user, get_missing_unique_columns
+from helpers import email_in_use, username_in_use, is_authenticated_user, load_signup_filters
+from internal import start_internal_server
 from token_helpers import generate_jwt
 
 
@@ -96,9 +99,19 @@ def create_user(body: NewUserRequest) -> HTTPResponse:
         abort(400, 'username already in use')
 
     LOGGER.debug('create new user %s', body.uid)
-    user_id = create_new_user(body.uid, body.password, body.email)
+    try:
+        user_id = create_new_user(body.uid, body.password, body.email)
+    except psycopg2.IntegrityError:
+        # uniqueness is enforced by the database for signups that
+        # are not yet known to the signup filters of this instance
+        LOGGER.error('username %s or email %s already in use', body.uid, body.email)
+        abort(400, 'username or email already in use')
     return HTTPResponse(success=True, http_code=200, payload={'userId': user_id})
 
 if __name__ == '__main__':
 
+    if missing := get_missing_unique_columns():
+        raise RuntimeError(f'columns {missing} are not unique, run migrate.py before the API')
+    start_internal_server()
+    threading.Thread(target=load_signup_filters, daemon=True).start()
     APP.run(host=LISTEN_ADDRESS, port=LISTEN_PORT, server='waitress')
\ No newline at end of file
@@ -0,0 +1,79 @@
+"""module containing bloom filters used to skip database
+lookups when checking if usernames and emails are in use"""
+
+import logging
+import hashlib
+import math
+import threading
+
+from config import BLOOM_CAPACITY, BLOOM_ERROR_RATE
+from data_models import FilterStats
+
+LOGGER = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Class containing a bloom filter over strings. A negative
+    result means that the value is definitely not present. Until
+    the filter has been marked as ready all lookups are treated
+    as possible hits"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity, self.error_rate = capacity, error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(math.ceil(self.size / 8))
+        self.count, self.ready = 0, False
+        self.lookups, self.negatives, self.false_positives = 0, 0, 0
+        self._lock = threading.Lock()
+
+    def _indices(self, value: str) -> list:
+        """Function used to generate bit indices for
+        a value using double hashing"""
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, value: str):
+        """Function used to add a value to the filter"""
+        indices = self._indices(value)
+        with self._lock:
+            for index in indices:
+                self.bits[index >> 3] |= 1 << (index & 7)
+            self.count += 1
+        if self.count == self.capacity + 1:
+            LOGGER.warning('bloom filter capacity %s exceeded. false positive rate will increase', self.capacity)
+
+    def might_contain(self, value: str) -> bool:
+        """Function used to check if a value may be present
+
+        Arguments:
+            value: str value to check
+        Returns:
+            False if value is definitely not present else True
+        """
+        present = not self.ready or all(self.bits[index >> 3] & (1 << (index & 7)) for index in self._indices(value))
+        with self._lock:
+            self.lookups += 1
+            self.negatives += not present
+        return present
+
+    def record_false_positive(self):
+        """Function used to record a possible hit that was
+        not found in the database"""
+        with self._lock:
+            self.false_positives += 1
+
+    def stats(self) -> FilterStats:
+        """Function used to retrieve filter statistics"""
+        with self._lock:
+            count, lookups, negatives, false_positives = self.count, self.lookups, self.negatives, self.false_positives
+        estimated = (1 - math.exp(-self.hashes * count / self.size)) ** self.hashes
+        positives = false_positives + negatives
+        return FilterStats(ready=self.ready, items=count, capacity=self.capacity, bits=self.size,
+                           hashes=self.hashes, memory_bytes=len(self.bits), estimated_false_positive_rate=estimated,
+                           lookups=lookups, skipped_queries=negatives,
+                           observed_false_positive_rate=false_positives / positives if positives else 0.0)
+
+USERNAME_FILTER = BloomFilter(BLOOM_CAPACITY, BLOOM_ERROR_RATE)
+EMAIL_FILTER = BloomFilter(BLOOM_CAPACITY, BLOOM_ERROR_RATE)
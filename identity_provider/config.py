@@ -2,9 +2,18 @@
 
 import logging
 import os
+import sys
 
 from typing import Any
 
+# docker images copy the shared modules next to the service modules,
+# while checkouts keep them in the shared directory of the repository
+SHARED_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'shared')
+if os.path.isdir(SHARED_DIRECTORY) and SHARED_DIRECTORY not in sys.path:
+    sys.path.append(SHARED_DIRECTORY)
+
+from log_setup import configure_logging, parse_module_levels
+
 LOGGER = logging.getLogger(__name__)
 
 
@@ -42,15 +51,36 @@ LOG_LEVELS = {
     'CRITICAL': logging.CRITICAL
 }
 
-LOG_LEVEL = LOG_LEVELS.get(override_value('log_level', 'DEBUG'), logging.DEBUG)
-logging.basicConfig(level=LOG_LEVEL)
+LOG_LEVEL = LOG_LEVELS.get(override_value('log_level', 'INFO'), logging.INFO)
+# per-module levels in the format module=LEVEL,module=LEVEL
+MODULE_LOG_LEVELS = parse_module_levels(override_value('module_log_levels', ''), LOG_LEVELS)
+LOG_FORMAT = override_value('log_format', 'text')
+# max debug records emitted per message per interval. 0 disables limit
+LOG_RATE_LIMIT = override_value('log_rate_limit', 10)
+LOG_RATE_INTERVAL = override_value('log_rate_interval', 1.0)
+LOG_SAMPLE_RATE = override_value('log_sample_rate', 1.0)
+
+LOG_LISTENER = configure_logging(LOG_LEVEL, module_levels=MODULE_LOG_LEVELS, log_format=LOG_FORMAT,
+                                 rate_limit=LOG_RATE_LIMIT, rate_interval=LOG_RATE_INTERVAL,
+                                 sample_rate=LOG_SAMPLE_RATE)
 
 LISTEN_ADDRESS = override_value('LISTEN_ADDRESS', '0.0.0.0')
 LISTEN_PORT = override_value('LISTEN_PORT', 10081)
 
+# internal API serving filter statistics. must not be exposed
+# through the gateway
+INTERNAL_LISTEN_ADDRESS = override_value('internal_listen_address', '0.0.0.0')
+INTERNAL_LISTEN_PORT = override_value('internal_listen_port', 10082)
+
 JWT_SECRET = override_value('jwt_secret', '')
 JWT_EXPIRY = override_value('jwt_expiry', 120)
 
+# bloom filters over existing usernames and emails used to skip
+# database lookups during signup
+BLOOM_CAPACITY = override_value('bloom_capacity', 1000000)
+BLOOM_ERROR_RATE = override_value('bloom_error_rate', 0.001)
+BLOOM_LOAD_BATCH_SIZE = override_value('bloom_load_batch_size', 10000)
+
 POSTGRES_PORT = override_value('postgres_port', 5432)
 POSTGRES_HOST = override_value('postgres_host', 'localhost')
 POSTGRES_USER = override_value('postgres_user', 'postgres')
@@ -65,4 +65,17 @@ class NewUserRequest(BaseModel):
 class TokenRequest(BaseModel):
     """Dataclass contianing token request"""
     uid: str
-    password: str
\ No newline at end of file
+    password: str
+
+class FilterStats(BaseModel):
+    """Dataclass containing bloom filter statistics"""
+    ready: bool
+    items: int
+    capacity: int
+    bits: int
+    hashes: int
+    memory_bytes: int
+    estimated_false_positive_rate: float
+    observed_false_positive_rate: float
+    lookups: int
+    skipped_queries: int
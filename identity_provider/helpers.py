@@ -4,7 +4,9 @@ import logging
 import hashlib
 import uuid
 
-from persistence import get_user_credentials, get_email_entry, get_username_entry, hash_password
+from persistence import get_user_credentials, get_email_entry, get_username_entry, hash_password, \
+    stream_usernames, stream_emails
+from bloom import USERNAME_FILTER, EMAIL_FILTER
 
 LOGGER = logging.getLogger(__name__)
 
@@ -20,13 +22,36 @@ def is_authenticated_user(user: str, password: str) -> bool:
 
 def email_in_use(email: str) -> bool:
     """Helper function used to check if a particular email
-    address is already in use"""
-    return bool(get_email_entry(email))
+    address is already in use. The database is only queried
+    if the email filter reports a possible hit"""
+    if not EMAIL_FILTER.might_contain(email):
+        return False
+    if not (in_use := bool(get_email_entry(email))):
+        EMAIL_FILTER.record_false_positive()
+    return in_use
 
 def username_in_use(username: str) -> bool:
     """Helper function used to check if a username is already
-    in use"""
-    return bool(get_username_entry(username))
+    in use. The database is only queried if the username
+    filter reports a possible hit"""
+    if not USERNAME_FILTER.might_contain(username):
+        return False
+    if not (in_use := bool(get_username_entry(username))):
+        USERNAME_FILTER.record_false_positive()
+    return in_use
+
+def load_signup_filters():
+    """Function used to load all existing usernames and emails
+    into the signup filters. Filters are only used for lookups
+    once they have been fully loaded"""
+    try:
+        for bloom_filter, values in [(USERNAME_FILTER, stream_usernames()), (EMAIL_FILTER, stream_emails())]:
+            for value in values:
+                bloom_filter.add(value)
+            bloom_filter.ready = True
+            LOGGER.info('loaded %s values into signup filter', bloom_filter.count)
+    except Exception:
+        LOGGER.exception('unable to load signup filters. falling back to database lookups')
 
 def check_password(hashed_password: str, user_password: str) -> bool: # pragma: no cover
     """Function used to check that password hash
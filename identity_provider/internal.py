@@ -0,0 +1,44 @@
+"""Module containing internal API functions. The internal
+API is served on a separate port that is not exposed
+through the gateway"""
+
+import logging
+import threading
+
+from bottle import Bottle
+
+from config import INTERNAL_LISTEN_ADDRESS, INTERNAL_LISTEN_PORT
+from data_models import dataclass_response, HTTPResponse
+from bloom import USERNAME_FILTER, EMAIL_FILTER
+
+
+LOGGER = logging.getLogger(__name__)
+
+INTERNAL_APP = Bottle()
+
+@INTERNAL_APP.route('/internal/filters', method=['GET'])
+@dataclass_response
+def get_filter_stats() -> HTTPResponse:
+    """API route used to retrieve memory usage and false
+    positive rates of the signup filters
+
+    Returns:
+        HTTPResponse object containing filter statistics
+    """
+    return HTTPResponse(success=True, http_code=200, payload={
+        'username': USERNAME_FILTER.stats(), 'email': EMAIL_FILTER.stats()
+    })
+
+def start_internal_server() -> threading.Thread:
+    """Function used to serve the internal API from
+    a background thread
+
+    Returns:
+        Thread object running the server
+    """
+    LOGGER.info('starting internal API on %s:%s', INTERNAL_LISTEN_ADDRESS, INTERNAL_LISTEN_PORT)
+    thread = threading.Thread(target=INTERNAL_APP.run, daemon=True, kwargs={
+        'host': INTERNAL_LISTEN_ADDRESS, 'port': INTERNAL_LISTEN_PORT, 'server': 'waitress', 'quiet': True
+    })
+    thread.start()
+    return thread
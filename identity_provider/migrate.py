@@ -0,0 +1,31 @@
+"""module containing the one-shot migration of the user
+schema. Creating the unique indexes fails if existing users
+share a username or email, which must be resolved first
+
+    python migrate.py
+"""
+
+import logging
+
+from persistence import persistence, UNIQUE_COLUMNS
+
+LOGGER = logging.getLogger(__name__)
+
+# index names match the names postgres gives UNIQUE constraints,
+# so columns that are already unique are not indexed twice
+USER_MIGRATIONS = [f'CREATE UNIQUE INDEX IF NOT EXISTS {table}_{column}_key ON {table}({column})'
+                   for table, column in UNIQUE_COLUMNS]
+
+def migrate():
+    """Function used to create the unique indexes of the
+    user tables if they do not exist"""
+    with persistence() as conn:
+        cursor = conn.cursor()
+        for statement in USER_MIGRATIONS:
+            LOGGER.info('running migration %s', statement)
+            cursor.execute(statement)
+        conn.commit()
+
+if __name__ == '__main__':
+
+    migrate()
@@ -11,7 +11,9 @@ from contextlib import contextmanager
 import psycopg2
 import psycopg2.extras
 
-from config import POSTGRES_HOST, POSTGRES_PORT, POSTGRES_DB, POSTGRES_USER, POSTGRES_PASSWORD
+from config import POSTGRES_HOST, POSTGRES_PORT, POSTGRES_DB, POSTGRES_USER, POSTGRES_PASSWORD, \
+    BLOOM_LOAD_BATCH_SIZE
+from bloom import USERNAME_FILTER, EMAIL_FILTER
 
 LOGGER = logging.getLogger(__name__)
 
@@ -74,6 +76,8 @@ def create_new_user(conn: object, cursor: object, uid: str, password: str, email
     cursor.execute('INSERT INTO user_details(user_id, email, signup_timestamp) VALUES(%s,%s,%s)', (str(user_id), email, datetime.utcnow()))
 
     conn.commit()
+    USERNAME_FILTER.add(uid)
+    EMAIL_FILTER.add(email)
     return user_id
 
 @database_function
@@ -90,3 +94,48 @@ def get_username_entry(conn: object, cursor: object, username: str):
     cursor.execute('SELECT user_id FROM users WHERE username=%s', (username,))
     return cursor.fetchone()
 
+def stream_column(query: str, batch_size: int = BLOOM_LOAD_BATCH_SIZE):
+    """Generator used to stream the values of a single column
+    query from a server side cursor in batches
+
+    Arguments:
+        query: str query selecting a single column
+        batch_size: int number of rows fetched per round trip
+    Returns:
+        generator of column values
+    """
+    with persistence() as conn:
+        cursor = conn.cursor(name='stream_' + uuid.uuid4().hex)
+        cursor.itersize = batch_size
+        cursor.execute(query)
+        for row in cursor:
+            yield row[0]
+
+def stream_usernames():
+    """Generator used to stream all usernames"""
+    return stream_column('SELECT username FROM users')
+
+def stream_emails():
+    """Generator used to stream all email addresses"""
+    return stream_column('SELECT email FROM user_details')
+
+
+# columns that must be unique. created by migrate.py and checked
+# on startup, since signup relies on the database to reject
+# usernames and emails that are not known to the signup filters
+UNIQUE_COLUMNS = [('users', 'username'), ('user_credentials', 'username'), ('user_details', 'email')]
+
+@database_function
+def get_missing_unique_columns(conn: object, cursor: object) -> list:
+    """Function used to retrieve the columns of UNIQUE_COLUMNS
+    that are not covered by a single column unique index
+
+    Returns:
+        list containing (table, column) tuples
+    """
+    cursor.execute('SELECT t.relname AS table, a.attname AS column FROM pg_index i JOIN pg_class t ON t.oid=i.indrelid '
+                   'JOIN pg_attribute a ON a.attrelid=t.oid AND a.attnum=i.indkey[0] '
+                   'WHERE i.indisunique AND i.indnatts=1 AND t.relname=ANY(%s)',
+                   ([table for table, _ in UNIQUE_COLUMNS],))
+    unique = {(row['table'], row['column']) for row in cursor.fetchall()}
+    return [column for column in UNIQUE_COLUMNS if column not in unique]
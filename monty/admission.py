@@ -0,0 +1,186 @@
+"""module containing admission control plugin for monty application"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from math import ceil
+
+from bottle import request, HTTPError
+
+from config import ADMISSION_QUEUE_TIMEOUT, ADMISSION_RETRY_AFTER, ADMISSION_RESERVED_THREADS, SERVER_THREADS, \
+    SIMULATION_CONCURRENCY, SIMULATION_QUEUE_SIZE, SIMULATION_RATE, SIMULATION_BURST, METRICS_CONCURRENCY, \
+    METRICS_QUEUE_SIZE, METRICS_RATE, METRICS_BURST, TASKS_CONCURRENCY, TASKS_QUEUE_SIZE, TASKS_RATE, TASKS_BURST
+from data_models import AdmissionPolicy
+
+
+LOGGER = logging.getLogger(__name__)
+
+SIMULATION_POLICY = AdmissionPolicy(concurrency=SIMULATION_CONCURRENCY, queue_size=SIMULATION_QUEUE_SIZE,
+                                    rate=SIMULATION_RATE, burst=SIMULATION_BURST)
+METRICS_POLICY = AdmissionPolicy(concurrency=METRICS_CONCURRENCY, queue_size=METRICS_QUEUE_SIZE,
+                                 rate=METRICS_RATE, burst=METRICS_BURST)
+TASKS_POLICY = AdmissionPolicy(concurrency=TASKS_CONCURRENCY, queue_size=TASKS_QUEUE_SIZE,
+                               rate=TASKS_RATE, burst=TASKS_BURST)
+
+# routes without a policy are never limited. routes sharing a
+# policy share its concurrency limit and rate limits
+ROUTE_POLICIES = {
+    '/monty/simulation': SIMULATION_POLICY,
+    '/monty/simulation/team': SIMULATION_POLICY,
+    '/monty/schedule': SIMULATION_POLICY,
+    '/monty/metrics/<start>/<end>': METRICS_POLICY,
+    '/monty/tasks': TASKS_POLICY,
+    '/monty/tasks/search': TASKS_POLICY
+}
+
+
+class ConcurrencyLimiter:
+    """Class used to limit the number of concurrent requests
+    on a route. Requests exceeding the limit wait in a bounded
+    queue until a slot is released or the deadline passes"""
+
+    def __init__(self, limit: int, queue_size: int, timeout: float):
+        self.limit, self.queue_size, self.timeout = limit, queue_size, timeout
+        self.active, self.waiting = 0, 0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> bool:
+        """Function used to acquire a slot
+
+        Returns:
+            True if slot was acquired else False
+        """
+        with self._condition:
+            if self.active < self.limit:
+                self.active += 1
+                return True
+            if self.waiting >= self.queue_size:
+                return False
+            self.waiting += 1
+            try:
+                deadline = time.monotonic() + self.timeout
+                while self.active >= self.limit:
+                    if (remaining := deadline - time.monotonic()) <= 0:
+                        return False
+                    self._condition.wait(remaining)
+                self.active += 1
+                return True
+            finally:
+                self.waiting -= 1
+
+    def release(self):
+        """Function used to release a slot"""
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+class RateLimiter:
+    """Class containing per user token buckets. The number of
+    buckets is bounded by evicting the least recently used user"""
+
+    def __init__(self, rate: float, burst: int, max_users: int = 10000):
+        self.rate, self.burst, self.max_users = rate, burst, max_users
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, uid: str) -> float:
+        """Function used to take a token from the bucket
+        of a given user
+
+        Arguments:
+            uid: str ID of user
+        Returns:
+            0 if a token was available else the number of
+                seconds until the next token is available
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(uid, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / self.rate
+            self._buckets[uid] = (tokens - 1 if not wait else tokens, now)
+            if len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+        return wait
+
+def release_after(body: object, limiter: ConcurrencyLimiter):
+    """Generator used to hold a concurrency slot until a
+    streaming response body has been consumed
+
+    Arguments:
+        body: iterable response body
+        limiter: ConcurrencyLimiter to release
+    Returns:
+        generator of response chunks
+    """
+    try:
+        yield from body
+    finally:
+        limiter.release()
+        if hasattr(body, 'close'):
+            body.close()
+
+class AdmissionPlugin:
+    """Bottle plugin used to apply admission control to
+    expensive routes. Requests are rate limited per user
+    and limited in concurrency per route. Overloaded
+    routes are answered with 429 or 503 and a Retry-After
+    header. Must be installed after the AuthenticationPlugin"""
+
+    def __init__(self, policies: dict = None, threads: int = SERVER_THREADS,
+                 reserved_threads: int = ADMISSION_RESERVED_THREADS):
+        self.policies = ROUTE_POLICIES if policies is None else policies
+        self.threads, self.reserved_threads, self.limiters = threads, reserved_threads, {}
+
+    def setup(self, app: object):
+        """Function used to check that plugin has not been
+        added to bottle application twice and that all policies
+        together leave enough server threads for unmanaged routes.
+        Routes sharing a policy share its limits, so every policy
+        is only counted once"""
+        for plugin in app.plugins:
+            if isinstance(plugin, AdmissionPlugin):
+                raise RuntimeError('admission plugin already applied to application')
+        policies = {id(policy): policy for policy in self.policies.values()}.values()
+        if (total := sum(policy.concurrency + policy.queue_size for policy in policies)) > \
+                self.threads - self.reserved_threads:
+            raise ValueError(f'admission policies admit {total} requests, which exceeds {self.threads} server '
+                             f'threads minus {self.reserved_threads} reserved threads')
+
+    def get_limiters(self, policy: AdmissionPolicy) -> tuple:
+        """Function used to retrieve the concurrency and rate
+        limiters of a policy, which are shared between all
+        routes using the policy"""
+        if id(policy) not in self.limiters:
+            limiter = ConcurrencyLimiter(policy.concurrency, policy.queue_size, ADMISSION_QUEUE_TIMEOUT)
+            self.limiters[id(policy)] = (limiter, RateLimiter(policy.rate, policy.burst))
+        return self.limiters[id(policy)]
+
+    def apply(self, callback: object, context: object):
+        """Function used to apply admission decorator
+        to bottle application"""
+        if (policy := self.policies.get(context.rule)) is None:
+            return callback
+        limiter, rate_limiter = self.get_limiters(policy)
+
+        def wrapper(*args: tuple, **kwargs: dict):
+            # CORS preflights are cheap and must not use up slots or tokens
+            if request.method == 'OPTIONS':
+                return callback(*args, **kwargs)
+            if (wait := rate_limiter.consume(request.uid)) > 0:
+                LOGGER.warning('rate limited user %s on route %s', request.uid, context.rule)
+                raise HTTPError(429, 'too many requests', headers={'Retry-After': str(ceil(wait))})
+            if not limiter.acquire():
+                LOGGER.warning('shedding request from user %s on route %s', request.uid, context.rule)
+                raise HTTPError(503, 'service overloaded', headers={'Retry-After': str(ADMISSION_RETRY_AFTER)})
+            try:
+                body = callback(*args, **kwargs)
+            except BaseException:
+                limiter.release()
+                raise
+            if body is None or isinstance(body, (str, bytes, dict)):
+                limiter.release()
+                return body
+            return release_after(body, limiter)
+        return wrapper
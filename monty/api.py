@@ -1,21 +1,36 @@
 """Module containing API functions"""
 
 import logging
+import base64
 import json
+import re
+import uuid
+from datetime import datetime
 
 from bottle import Bottle, request, response, abort
 from dateutil import parser
 from dateutil.parser._parser import ParserError
 
-from config import LISTEN_ADDRESS, LISTEN_PORT
-from persistence import get_user_tasks, create_user_task, complete_task, \
-    get_task, get_user_task, delete_task, update_task_hours
-from data_models import dataclass_response, extract_request_body, HTTPResponse, NewTaskRequest, \
-    Task, TaskUpdateRequest
-from simulation import analyse_task_set
+from config import LISTEN_ADDRESS, LISTEN_PORT, SERVER_THREADS, SIMULATION_ETAG_TTL, SIMULATION_HOURS_PER_DAY, \
+    TEAM_SIMULATION_MAX_MEMBERS, TEAM_SIMULATION_ADMINS, SCHEDULE_DEFAULT_LIMIT, SCHEDULE_MAX_LIMIT, SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT, \
+    SEARCH_MAX_TERMS, CALIBRATION_ENABLED, APPROXIMATE_ACCURACY, APPROXIMATE_TIME_BUDGET, APPROXIMATE_MAX_TIME_BUDGET
+from backends import BACKEND, get_user_tasks, create_user_task, complete_task, \
+    get_task, get_user_task, delete_task, update_task_hours, get_user_tasks_json, stream_user_tasks_json, \
+    get_team_task_columns, get_schedule_task_columns, search_user_tasks, get_duration_calibrations
+from data_models import dataclass_response, extract_request_body, json_envelope, HTTPResponse, \
+    NewTaskRequest, Task, TaskUpdateRequest, TeamSimulationRequest
+from simulation import analyse_task_set, analyse_team, project_schedule, encode_schedule, approximate_columns, \
+    approximate_team, COLUMN_SORTING_FUNCTIONS
+from calibration import calibrate_durations
 from authenticate import AuthenticationPlugin
+from admission import AdmissionPlugin
+from compression import CompressionPlugin
+from instrumentation import InstrumentationPlugin
+from profiling import ProfilingPlugin
+from internal import start_internal_server
 from helpers import get_user_details
 from metrics import get_user_metrics
+from versioning import conditional_response
 
 
 LOGGER = logging.getLogger(__name__)
@@ -61,24 +76,71 @@ def create_task(body: NewTaskRequest) -> HTTPResponse:
     return HTTPResponse(success=True, http_code=200, payload={'task_id': str(task_id)})
 
 @APP.route('/monty/tasks', method=['GET', 'OPTIONS'])
-@dataclass_response
-def get_tasks() -> HTTPResponse:
-    """API route used to create new task
-    objects in the postgres database
+@conditional_response()
+def get_tasks() -> bytes:
+    """API route used to retrieve tasks for a given
+    user. The task array is rendered by postgres and
+    wrapped in the HTTPResponse envelope as is. Clients
+    accepting application/x-ndjson are sent a stream of
+    tasks instead
 
-    Arguments:
-        body: task containing request body
     Returns:
-        HTTPResponse containing response
+        bytes containing JSON encoded HTTPResponse
     """
     LOGGER.debug('received request to retrieve tasks for user %s', request.uid)
     fetch_completed = request.query.fetch_completed if request.query.fetch_completed else 'false'
     fetch_completed = fetch_completed.lower() in ['true', 't']
 
-    tasks = [Task(**row) for row in get_user_tasks(request.uid)]
-    if not fetch_completed:
-        tasks = [task for task in tasks if not task.completion_date]
-    return HTTPResponse(success=True, http_code=200, payload=tasks)
+    response.add_header('Vary', 'Accept')
+    if 'application/x-ndjson' in request.headers.get('Accept', ''):
+        response.content_type = 'application/x-ndjson'
+        return stream_user_tasks_json(request.uid, fetch_completed=fetch_completed)
+    return json_envelope(get_user_tasks_json(request.uid, fetch_completed=fetch_completed))
+
+def encode_search_cursor(task: dict) -> str:
+    """Function used to encode the position of a search
+    result as an opaque pagination cursor"""
+    return base64.urlsafe_b64encode(json.dumps([task['rank'], task['task_id']]).encode()).decode()
+
+def decode_search_cursor(cursor: str) -> tuple:
+    """Function used to decode a pagination cursor into a
+    (rank, task_id) tuple. Invalid cursors are rejected"""
+    try:
+        rank, task_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(rank), str(uuid.UUID(task_id))
+    except (ValueError, TypeError):
+        abort(400, 'invalid cursor')
+
+@APP.route('/monty/tasks/search', method=['GET', 'OPTIONS'])
+@conditional_response()
+@dataclass_response
+def search_tasks() -> HTTPResponse:
+    """API route used to search the titles and content of
+    the tasks of a user. All words of the q query parameter
+    must match and the last word is matched as a prefix.
+    Results are ordered by rank and paginated with the next
+    cursor of the previous page
+
+    Returns:
+        HTTPResponse containing matching tasks and next cursor
+    """
+    terms = re.findall(r'\w+', request.query.q)[:SEARCH_MAX_TERMS]
+    if not terms:
+        abort(400, 'invalid search query')
+    try:
+        limit = int(request.query.limit) if request.query.limit else SEARCH_DEFAULT_LIMIT
+    except ValueError:
+        abort(400, 'invalid limit')
+    if not 0 < limit <= SEARCH_MAX_LIMIT:
+        abort(400, 'invalid limit')
+    after = decode_search_cursor(request.query.cursor) if request.query.cursor else None
+    fetch_completed = request.query.fetch_completed.lower() in ['true', 't']
+    prefix = request.query.prefix.lower() not in ['false', 'f']
+
+    LOGGER.debug('received request to search tasks of user %s for %s', request.uid, terms)
+    tasks = search_user_tasks(request.uid, terms, limit, after=after, fetch_completed=fetch_completed, prefix=prefix)
+    cursor = encode_search_cursor(tasks[-1]) if len(tasks) == limit else None
+    return HTTPResponse(success=True, http_code=200, payload={'tasks': tasks, 'next': cursor})
 
 TASK_PATCH_OPERATIONS = {
     'COMPLETE': complete_task,
@@ -103,7 +165,9 @@ def update_task(body: TaskUpdateRequest, task_id: str) -> HTTPResponse:
     if not task:
         abort(400, 'invalid task id ' + task_id)
     if (handler := TASK_PATCH_OPERATIONS.get(operation, None)) is not None:
-        handler(task_id, body)
+        # tasks deleted since they were retrieved are not updated
+        if not handler(task_id, body):
+            abort(400, 'invalid task id ' + task_id)
         return HTTPResponse(success=True, http_code=200, message='successfully update task ' + task_id)
     abort(400, 'invalid operation')
 
@@ -125,7 +189,49 @@ def delete_user_task(task_id: str):
         LOGGER.warning('user %s attempted to delete task %s', request.uid, task_id)
         return abort(404, 'invalid task ID ' + task_id)
 
+def calibration_factors(uids: list) -> dict:
+    """Function used to retrieve the factors used to correct
+    the planned durations of the tasks of a list of users.
+    All factors are 1 if calibration is disabled"""
+    if not CALIBRATION_ENABLED:
+        return {uid: 1.0 for uid in uids}
+    return {uid: calibration.factor() for uid, calibration in get_duration_calibrations(uids).items()}
+
+@APP.route('/monty/calibration', method=['GET', 'OPTIONS'])
+@conditional_response()
+@dataclass_response
+def get_calibration() -> HTTPResponse:
+    """API route used to retrieve the duration calibration
+    of a user, containing statistics of the ratio of actual to
+    planned hours of completed tasks and the factor applied
+    to planned durations by simulations
+
+    Returns:
+        HTTPResponse containing calibration summary
+    """
+    LOGGER.debug('received request to get calibration for user %s', request.uid)
+    calibration = get_duration_calibrations([request.uid])[request.uid]
+    payload = {**calibration.summary(), 'enabled': CALIBRATION_ENABLED}
+    return HTTPResponse(success=True, http_code=200, payload=payload)
+
+def approximation_budget(accuracy: object, time_budget: object) -> tuple:
+    """Function used to validate the accuracy and time budget
+    of approximate simulations. Defaults are used if not set
+
+    Returns:
+        tuple containing (accuracy, time_budget)
+    """
+    try:
+        accuracy = float(accuracy) if accuracy not in [None, ''] else APPROXIMATE_ACCURACY
+        time_budget = float(time_budget) if time_budget not in [None, ''] else APPROXIMATE_TIME_BUDGET
+    except ValueError:
+        abort(400, 'invalid accuracy or time budget')
+    if not 0 < accuracy <= 1 or not 0 < time_budget <= APPROXIMATE_MAX_TIME_BUDGET:
+        abort(400, 'invalid accuracy or time budget')
+    return accuracy, time_budget
+
 @APP.route('/monty/simulation', method=['GET', 'OPTIONS'])
+@conditional_response(ttl=SIMULATION_ETAG_TTL)
 @dataclass_response
 def run_user_simulation() -> HTTPResponse:
     """API route used to create new task
@@ -137,11 +243,107 @@ def run_user_simulation() -> HTTPResponse:
         HTTPResponse containing response
     """
     LOGGER.debug('received request to run simulations for user %s', request.uid)
+    if request.query.mode == 'approximate':
+        return run_approximate_simulation()
     tasks = [Task(**dict(row)) for row in get_user_tasks(request.uid)]
+    if (factor := calibration_factors([request.uid])[request.uid]) != 1:
+        durations = calibrate_durations([task.duration for task in tasks], factor).tolist()
+        tasks = [task.copy(update={'duration': duration}) for task, duration in zip(tasks, durations)]
     LOGGER.info('running simulation for %s tasks', len(tasks))
-    return HTTPResponse(success=True, http_code=200, payload=analyse_task_set(8, tasks))
+    return HTTPResponse(success=True, http_code=200, payload=analyse_task_set(SIMULATION_HOURS_PER_DAY, tasks))
+
+def run_approximate_simulation() -> HTTPResponse:
+    """Function used to estimate the simulation results of a user
+    with confidence bounds from a sample of tasks. Used by the
+    simulation route if the mode query parameter is approximate.
+    The accuracy and time_budget query parameters set the target
+    half width of bounds and the time spent sampling in seconds
+
+    Returns:
+        HTTPResponse containing results with bounds
+    """
+    accuracy, time_budget = approximation_budget(request.query.accuracy, request.query.time_budget)
+    columns, factor = get_team_task_columns([request.uid]), calibration_factors([request.uid])[request.uid]
+    LOGGER.info('running approximate simulation for %s tasks', len(columns['uid']))
+    payload = approximate_columns(SIMULATION_HOURS_PER_DAY, calibrate_durations(columns['duration'], factor),
+                                  columns['deadline'], columns['priority'], columns['completion_date'],
+                                  accuracy=accuracy, time_budget=time_budget)
+    return HTTPResponse(success=True, http_code=200, payload=payload)
+
+@APP.route('/monty/simulation/team', method=['POST', 'OPTIONS'])
+@extract_request_body(TeamSimulationRequest, source='json', raise_on_error=True)
+@dataclass_response
+def run_team_simulation(body: TeamSimulationRequest) -> HTTPResponse:
+    """API route used to run simulations for every member
+    of a team and for the team as a whole. The tasks of all
+    members are retrieved in a single query. Team results pool
+    the tasks of all members, so only team simulation admins
+    may simulate teams other than themselves alone
+
+    Arguments:
+        body: team containing request body
+    Returns:
+        HTTPResponse containing per member and team results
+    """
+    members = list(dict.fromkeys(body.members))
+    hours_per_day = body.hours_per_day if body.hours_per_day is not None else SIMULATION_HOURS_PER_DAY
+    LOGGER.debug('received request to run team simulations for members %s', members)
+    # there is no team model, so other users may only simulate themselves
+    if request.uid not in TEAM_SIMULATION_ADMINS and members != [request.uid]:
+        abort(403, 'only team simulation admins may simulate other users')
+    if len(members) > TEAM_SIMULATION_MAX_MEMBERS:
+        abort(400, f'teams are limited to {TEAM_SIMULATION_MAX_MEMBERS} members')
+    if not 0 < hours_per_day <= 24:
+        abort(400, 'invalid hours per day')
+    if body.approximate:
+        accuracy, time_budget = approximation_budget(body.accuracy, body.time_budget)
+
+    columns, factors = get_team_task_columns(members), calibration_factors(members)
+    columns['duration'] = calibrate_durations(columns['duration'], [factors[uid] for uid in columns['uid']])
+    LOGGER.info('running team simulation for %s members and %s tasks', len(members), len(columns['uid']))
+    columns = [columns[column] for column in ['uid', 'duration', 'deadline', 'priority', 'completion_date']]
+    if body.approximate:
+        payload = approximate_team(hours_per_day, members, *columns, accuracy=accuracy, time_budget=time_budget)
+    else:
+        payload = analyse_team(hours_per_day, members, *columns)
+    payload['calibration_factors'] = {uid: round(factor, 4) for uid, factor in factors.items()}
+    return HTTPResponse(success=True, http_code=200, payload=payload)
+
+@APP.route('/monty/schedule', method=['GET', 'OPTIONS'])
+@conditional_response(ttl=SIMULATION_ETAG_TTL)
+@dataclass_response
+def get_schedule() -> HTTPResponse:
+    """API route used to retrieve the projected schedule of
+    the tasks of a user for a given simulation type. Only
+    the window given by the offset and limit query parameters
+    is returned. See encode_schedule for the format
+
+    Returns:
+        HTTPResponse containing schedule window
+    """
+    policy = request.query.policy if request.query.policy else 'as_they_come'
+    if policy not in COLUMN_SORTING_FUNCTIONS:
+        abort(400, 'invalid policy ' + policy)
+    try:
+        offset = int(request.query.offset) if request.query.offset else 0
+        limit = int(request.query.limit) if request.query.limit else SCHEDULE_DEFAULT_LIMIT
+    except ValueError:
+        abort(400, 'invalid offset or limit')
+    if offset < 0 or not 0 < limit <= SCHEDULE_MAX_LIMIT:
+        abort(400, 'invalid offset or limit')
+
+    LOGGER.debug('received request to project %s schedule for user %s', policy, request.uid)
+    columns, now = get_schedule_task_columns(request.uid), datetime.utcnow()
+    factor = calibration_factors([request.uid])[request.uid]
+    schedule = project_schedule(SIMULATION_HOURS_PER_DAY, calibrate_durations(columns['duration'], factor),
+                                columns['deadline'], columns['priority'], now, sim_type=policy)
+    payload = encode_schedule(columns['task_id'], schedule, offset=offset, limit=limit)
+    payload.update({'policy': policy, 'started': now.isoformat(), 'hours_per_day': SIMULATION_HOURS_PER_DAY,
+                    'calibration_factor': round(factor, 4)})
+    return HTTPResponse(success=True, http_code=200, payload=payload)
 
 @APP.route('/monty/metrics/<start>/<end>', method=['GET', 'OPTIONS'])
+@conditional_response()
 @dataclass_response
 def get_metrics(start: str, end: str) -> HTTPResponse:
     """API route used to retrieve user metrics
@@ -163,5 +365,12 @@ def get_metrics(start: str, end: str) -> HTTPResponse:
 
 if __name__ == '__main__':
 
+    start_internal_server()
+    BACKEND.start()
+
+    APP.install(InstrumentationPlugin())
     APP.install(AuthenticationPlugin())
-    APP.run(host=LISTEN_ADDRESS, port=LISTEN_PORT, server='waitress')
\ No newline at end of file
+    APP.install(AdmissionPlugin())
+    APP.install(ProfilingPlugin())
+    APP.install(CompressionPlugin())
+    APP.run(host=LISTEN_ADDRESS, port=LISTEN_PORT, server='waitress', threads=SERVER_THREADS)
\ No newline at end of file
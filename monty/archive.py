@@ -0,0 +1,176 @@
+"""module containing the background mover used to archive
+completed tasks and a benchmark of active task queries on
+large tables. Archived tasks are still returned by all reads
+of completed tasks through the all_tasks view
+
+    python archive.py --benchmark --rows 10000000
+"""
+
+import logging
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import psycopg2.extensions
+
+from config import ARCHIVE_AFTER_DAYS, ARCHIVE_INTERVAL, ARCHIVE_BATCH_SIZE
+from persistence import persistence, archive_completed_tasks, get_table_sizes, \
+    get_user_tasks_json, get_user_tasks
+from helpers import save_tasks
+from migrate import migrate
+
+LOGGER = logging.getLogger(__name__)
+
+BENCHMARK_USERS = 'archive-benchmark-%'
+
+
+class ArchiveMover:
+    """Class used to periodically move completed tasks into
+    the archive table from a background thread. Tasks are
+    moved in batches so that locks are only held briefly"""
+
+    def __init__(self, archive_after: timedelta = timedelta(days=ARCHIVE_AFTER_DAYS), interval: float = ARCHIVE_INTERVAL,
+                 batch_size: int = ARCHIVE_BATCH_SIZE):
+        self.archive_after, self.interval, self.batch_size = archive_after, interval, batch_size
+        self._stopped = threading.Event()
+
+    def start(self) -> threading.Thread:
+        """Function used to start moving tasks from a daemon thread"""
+        thread = threading.Thread(target=self.run, name='archive-mover', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        """Function used to stop moving tasks after the current batch"""
+        self._stopped.set()
+
+    def run(self):
+        """Function used to archive tasks every interval until stopped"""
+        while not self._stopped.wait(self.interval):
+            try:
+                self.archive()
+            except Exception:
+                LOGGER.exception('unable to archive completed tasks')
+
+    def archive(self, completed_before: datetime = None) -> int:
+        """Function used to archive all tasks completed before
+        the given date or the archive age
+
+        Returns:
+            int number of tasks moved
+        """
+        completed_before = completed_before or datetime.utcnow() - self.archive_after
+        moved, start = 0, time.perf_counter()
+        while not self._stopped.is_set():
+            batch = archive_completed_tasks(completed_before, self.batch_size)
+            moved += batch
+            if batch < self.batch_size:
+                break
+        if moved:
+            LOGGER.info('archived %s tasks completed before %s in %.2fs', moved, completed_before, time.perf_counter() - start)
+        return moved
+
+ARCHIVE_MOVER = ArchiveMover()
+
+def start_archive_mover() -> threading.Thread:
+    """Function used to start the archive mover. The mover
+    is disabled if the archive interval is not positive
+
+    Returns:
+        Thread object running the mover or None if disabled
+    """
+    if ARCHIVE_INTERVAL <= 0:
+        return None
+    return ARCHIVE_MOVER.start()
+
+def run_sql(statement: str, args: tuple = None):
+    """Function used to run a statement outside of a
+    transaction. Required for VACUUM"""
+    with persistence() as conn:
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        conn.cursor().execute(statement, args)
+
+def time_queries(users: list, repeat: int) -> dict:
+    """Function used to time the active task query and the
+    full task query over a set of users
+
+    Returns:
+        dict containing mean latencies in milliseconds
+    """
+    latencies = {'open_tasks_ms': [], 'all_tasks_ms': []}
+    for _ in range(repeat):
+        for uid in users:
+            start = time.perf_counter()
+            get_user_tasks_json(uid, fetch_completed=False)
+            latencies['open_tasks_ms'].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            get_user_tasks(uid)
+            latencies['all_tasks_ms'].append(time.perf_counter() - start)
+    return {key: round(float(np.mean(values)) * 1000, 3) for key, values in latencies.items()}
+
+def benchmark(rows: int, steps: int, users: int, completed_fraction: float, repeat: int, seed: int) -> dict:
+    """Function used to benchmark active task queries and index
+    sizes as completed history grows, first without archiving and
+    then with completed tasks moved to the archive table. Tasks
+    are created for benchmark users and removed afterwards, but
+    all completed tasks are archived, so the benchmark should be
+    run against a dedicated database
+
+    Arguments:
+        rows: int total number of tasks to load
+        steps: int number of steps to load tasks in
+        users: int number of benchmark users
+        completed_fraction: float fraction of loaded tasks to complete
+        repeat: int number of times each query is timed per user
+        seed: int random seed
+    Returns:
+        dict containing benchmark report
+    """
+    migrate()
+    uids = [f'archive-benchmark-{i}' for i in range(users)]
+    sample = uids[:min(users, 20)]
+    report = {'config': {'rows': rows, 'steps': steps, 'users': users, 'completed_fraction': completed_fraction},
+              'unarchived': [], 'archived': []}
+    try:
+        for step in range(steps):
+            save_tasks(rows // steps, None, output_format='postgres', users=uids, seed=seed + step)
+            run_sql("UPDATE tasks SET completion_date=created + duration * interval '1 hour' "
+                    'WHERE uid LIKE %s AND completion_date IS NULL AND random() < %s', (BENCHMARK_USERS, completed_fraction))
+            run_sql('VACUUM ANALYZE tasks')
+            report['unarchived'].append({'loaded': rows // steps * (step + 1), **get_table_sizes(),
+                                         **time_queries(sample, repeat)})
+            LOGGER.info('unarchived step %s: %s', step, report['unarchived'][-1])
+
+        ArchiveMover().archive(completed_before=datetime.utcnow() + timedelta(days=1))
+        run_sql('VACUUM ANALYZE tasks')
+        run_sql('VACUUM ANALYZE tasks_archive')
+        # index pages of deleted rows are only returned by a rebuild
+        run_sql('REINDEX TABLE tasks')
+        report['archived'].append({'loaded': rows, **get_table_sizes(), **time_queries(sample, repeat)})
+        LOGGER.info('archived: %s', report['archived'][-1])
+    finally:
+        run_sql('DELETE FROM tasks WHERE uid LIKE %s', (BENCHMARK_USERS,))
+        run_sql('DELETE FROM tasks_archive WHERE uid LIKE %s', (BENCHMARK_USERS,))
+    return report
+
+
+if __name__ == '__main__':
+
+    arg_parser = argparse.ArgumentParser(description='completed task archival')
+    arg_parser.add_argument('--benchmark', action='store_true', help='run benchmark instead of archiving once')
+    arg_parser.add_argument('--rows', type=int, default=10000000)
+    arg_parser.add_argument('--steps', type=int, default=5)
+    arg_parser.add_argument('--users', type=int, default=1000)
+    arg_parser.add_argument('--completed-fraction', type=float, default=0.95)
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    arg_parser.add_argument('--seed', type=int, default=0)
+    args = arg_parser.parse_args()
+
+    if args.benchmark:
+        print(json.dumps(benchmark(args.rows, args.steps, args.users, args.completed_fraction, args.repeat, args.seed),
+                         indent=2))
+    else:
+        print(json.dumps({'archived': ARCHIVE_MOVER.archive()}))
@@ -1,22 +1,141 @@
 """module containing authentication plugin for monty application"""
 
 import logging
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 
 import jwt
 from bottle import request, response, abort
 from pydantic import BaseModel, ValidationError
 
-from config import JWT_SECRET
+from config import JWT_SECRET, AUTHENTICATION_MODE, JWT_CACHE_SIZE
 
 
 LOGGER = logging.getLogger(__name__)
 
 
+class ClaimsCache:
+    """Class containing a bounded LRU cache of decoded
+    token claims keyed by token digest. Tokens found in
+    the cache have already had their signature verified"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._claims = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest: bytes) -> tuple:
+        """Function used to retrieve cached claims
+
+        Arguments:
+            digest: bytes digest of token
+        Returns:
+            tuple containing (uid, expiry) or None if not cached
+        """
+        with self._lock:
+            if (claims := self._claims.get(digest)) is not None:
+                self._claims.move_to_end(digest)
+            return claims
+
+    def put(self, digest: bytes, uid: str, expiry: float):
+        """Function used to cache decoded claims"""
+        with self._lock:
+            self._claims[digest] = (uid, expiry)
+            if len(self._claims) > self.size:
+                self._claims.popitem(last=False)
+
+    def discard(self, digest: bytes):
+        """Function used to remove claims from cache"""
+        with self._lock:
+            self._claims.pop(digest, None)
+
+CLAIMS_CACHE = ClaimsCache(JWT_CACHE_SIZE)
+
+def extract_bearer_token() -> str:
+    """Function used to extract the token value
+    from the Authorization: Bearer <token> header
+
+    Returns:
+        str containing token if present else None
+    """
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        return header[7:].strip()
+    return None
+
+def verify_token(token: str) -> str:
+    """Function used to verify a token in the format
+    generated by the identity provider and return the
+    user ID. Signatures are only verified the first time
+    a token is seen
+
+    Arguments:
+        token: str JWT token
+    Returns:
+        str containing user ID or None if token is invalid
+    """
+    digest, now = hashlib.sha256(token.encode()).digest(), time.time()
+    if (claims := CLAIMS_CACHE.get(digest)) is not None:
+        uid, expiry = claims
+        if expiry > now:
+            return uid
+        CLAIMS_CACHE.discard(digest)
+        return None
+    try:
+        claims = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+    except jwt.InvalidTokenError:
+        LOGGER.warning('received invalid token')
+        return None
+    uid, expiry = claims.get('uid'), claims.get('exp')
+    if not isinstance(uid, str) or not isinstance(expiry, (int, float)):
+        LOGGER.warning('received token with invalid claims')
+        return None
+    CLAIMS_CACHE.put(digest, uid, expiry)
+    return uid
+
+def authenticate_header() -> str:
+    """Function used to authenticate requests using
+    the user ID header set by the gateway"""
+    return request.headers.get('X-Authenticated-Userid')
+
+def authenticate_token() -> str:
+    """Function used to authenticate requests using a bearer
+    token. Requests with invalid tokens are rejected"""
+    if (token := extract_bearer_token()) is None:
+        return None
+    if (uid := verify_token(token)) is None:
+        abort(401, 'invalid token')
+    return uid
+
+AUTHENTICATION_MODES = {
+    'header': [authenticate_header],
+    'jwt': [authenticate_token],
+    'both': [authenticate_token, authenticate_header]
+}
+
 class AuthenticationPlugin:
-    """Bottle plugin used to check token authentication
-    on API routes. Tokens are parsed and injected into
-    the request headers"""
+    """Bottle plugin used to authenticate requests to API
+    routes and set request.uid. The mode is one of
+    AUTHENTICATION_MODES:
+
+        header: user ID from the X-Authenticated-Userid header
+            set by the gateway
+        jwt: user ID from a bearer token of the identity
+            provider. Requires the jwt secret to be set
+        both: bearer token if present, else the header.
+            Requests with invalid tokens are rejected
+
+    Requests without a user ID are rejected with 401"""
+
+    def __init__(self, mode: str = AUTHENTICATION_MODE):
+        if (authenticators := AUTHENTICATION_MODES.get(mode)) is None:
+            raise ValueError(f'invalid authentication mode {mode}')
+        if authenticate_token in authenticators and not JWT_SECRET:
+            raise RuntimeError('jwt secret must be set to verify tokens')
+        self.authenticators = authenticators
 
     def setup(self, app: object):
         """Function used to check that plugin has not been
@@ -29,13 +148,11 @@ class AuthenticationPlugin:
         """Function used to apply authorization decorator
         to bottle application"""
         def wrapper(*args: tuple, **kwargs: dict):
-            if (user := request.headers.get('X-Authenticated-Userid')) is not None:
-                request.uid = user
+            for authenticator in self.authenticators:
+                if (user := authenticator()) is not None:
+                    request.uid = user
+                    break
             else:
                 abort(401, 'unauthorized')
             return callback(*args, **kwargs)
         return wrapper
-
-
-
-
@@ -0,0 +1,341 @@
+"""module containing the persistence backends of the monty
+API. The backend is selected with the persistence_backend
+setting. The memory backend keeps all tasks in process and
+is used for tests, benchmarks of the API layer and single
+node demos"""
+
+import abc
+import logging
+import json
+import re
+import threading
+import uuid
+from bisect import bisect_left, bisect_right
+from datetime import datetime, date
+
+import persistence
+from config import PERSISTENCE_BACKEND, TASK_STREAM_BATCH_SIZE
+from data_models import NewTaskRequest
+from calibration import DurationCalibration, effort_ratio
+from versioning import invalidate_user, use_persisted_versions
+from invalidation import start_invalidation_listener
+from archive import start_archive_mover
+
+LOGGER = logging.getLogger(__name__)
+
+
+# columns returned for every task, in the order of the Task model
+TASK_COLUMNS = ['task_id', 'task_title', 'content', 'priority', 'duration', 'hours_remaining',
+                'created', 'deadline', 'completion_date']
+
+OPERATIONS = ['create_user_task', 'complete_task', 'update_task_hours', 'get_task', 'get_user_task', 'get_user_tasks',
+              'get_user_tasks_in_range', 'delete_task', 'get_user_tasks_json', 'stream_user_tasks_json',
+              'get_team_task_columns', 'get_schedule_task_columns', 'search_user_tasks',
+              'get_duration_calibrations']
+
+
+class PersistenceBackend(abc.ABC):
+    """Class containing the operations that persistence
+    backends must implement. Tasks are returned as dicts
+    containing TASK_COLUMNS. Backends missing an operation
+    cannot be instantiated"""
+
+    def start(self):
+        """Function used to start any background services"""
+
+    @abc.abstractmethod
+    def create_user_task(self, uid: str, body: NewTaskRequest) -> uuid.UUID:
+        """Function used to create a task for a user"""
+
+    @abc.abstractmethod
+    def complete_task(self, task_id: str, body: object) -> bool:
+        """Function used to mark a task as completed. Returns
+        False if the task does not exist"""
+
+    @abc.abstractmethod
+    def update_task_hours(self, task_id: str, body: object) -> bool:
+        """Function used to update the remaining hours of a task.
+        Returns False if the task does not exist"""
+
+    @abc.abstractmethod
+    def get_task(self, task_id: str) -> dict:
+        """Function used to retrieve a task"""
+
+    @abc.abstractmethod
+    def get_user_task(self, uid: str, task_id: str) -> dict:
+        """Function used to retrieve a task of a given user"""
+
+    @abc.abstractmethod
+    def get_user_tasks(self, uid: str) -> list:
+        """Function used to retrieve all tasks of a user"""
+
+    @abc.abstractmethod
+    def get_user_tasks_in_range(self, uid: str, start: datetime, end: datetime) -> list:
+        """Function used to retrieve the tasks of a user
+        created strictly between start and end"""
+
+    @abc.abstractmethod
+    def delete_task(self, task_id: str):
+        """Function used to delete a task"""
+
+    @abc.abstractmethod
+    def get_user_tasks_json(self, uid: str, fetch_completed: bool = False) -> str:
+        """Function used to retrieve the tasks of a user as a JSON array"""
+
+    @abc.abstractmethod
+    def stream_user_tasks_json(self, uid: str, fetch_completed: bool = False, batch_size: int = TASK_STREAM_BATCH_SIZE):
+        """Generator used to stream the tasks of a user as NDJSON"""
+
+    @abc.abstractmethod
+    def get_team_task_columns(self, uids: list) -> dict:
+        """Function used to retrieve the uid, duration, deadline,
+        priority and completion_date columns of all tasks of a
+        list of users"""
+
+    @abc.abstractmethod
+    def get_schedule_task_columns(self, uid: str) -> dict:
+        """Function used to retrieve the task_id, duration,
+        deadline and priority columns of all tasks of a user"""
+
+    @abc.abstractmethod
+    def search_user_tasks(self, uid: str, terms: list, limit: int, after: tuple = None, fetch_completed: bool = False,
+                          prefix: bool = True) -> list:
+        """Function used to search the titles and content of the
+        tasks of a user. Returns a page of JSON rendered tasks
+        ordered by rank and task ID, starting after the given
+        (rank, task_id) tuple"""
+
+    @abc.abstractmethod
+    def get_duration_calibrations(self, uids: list) -> dict:
+        """Function used to retrieve the DurationCalibration
+        of each of a list of users"""
+
+class PostgresBackend(PersistenceBackend):
+    """Class containing the postgres backend. All operations
+    are the functions of the persistence module"""
+
+    create_user_task = staticmethod(persistence.create_user_task)
+    complete_task = staticmethod(persistence.complete_task)
+    update_task_hours = staticmethod(persistence.update_task_hours)
+    get_task = staticmethod(persistence.get_task)
+    get_user_task = staticmethod(persistence.get_user_task)
+    get_user_tasks = staticmethod(persistence.get_user_tasks)
+    get_user_tasks_in_range = staticmethod(persistence.get_user_tasks_in_range)
+    delete_task = staticmethod(persistence.delete_task)
+    get_user_tasks_json = staticmethod(persistence.get_user_tasks_json)
+    stream_user_tasks_json = staticmethod(persistence.stream_user_tasks_json)
+    get_team_task_columns = staticmethod(persistence.get_team_task_columns)
+    get_schedule_task_columns = staticmethod(persistence.get_schedule_task_columns)
+    search_user_tasks = staticmethod(persistence.search_user_tasks)
+    get_duration_calibrations = staticmethod(persistence.get_duration_calibrations)
+
+    def start(self):
+        """Function used to check that the task schema has been
+        migrated and start the invalidation listener and the
+        archive mover. The schema is never changed by the API.
+        ETags are generated from the persisted user versions, so
+        that all processes agree on them"""
+        if missing := persistence.get_missing_relations():
+            raise RuntimeError(f'task schema is missing {", ".join(missing)}, run migrate.py before the API')
+        use_persisted_versions(persistence.get_user_version)
+        start_invalidation_listener()
+        start_archive_mover()
+
+class MemoryBackend(PersistenceBackend):
+    """Class containing an in-memory backend. Tasks are indexed
+    by ID and by user, and the tasks of every user are indexed
+    by creation time in sorted lists so that range queries
+    are answered with a binary search"""
+
+    def __init__(self):
+        self.tasks, self.user_tasks = {}, {}
+        # sorted creation times of the tasks of each user and the
+        # IDs of the tasks at the same positions
+        self.created_times, self.created_ids = {}, {}
+        self.calibrations = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def normalize_id(task_id: object) -> str:
+        """Function used to convert task IDs to the
+        format used as key. Returns None if invalid"""
+        try:
+            return str(uuid.UUID(str(task_id)))
+        except ValueError:
+            return None
+
+    @staticmethod
+    def render(task: dict) -> str:
+        """Function used to render a task as a JSON object"""
+        return json.dumps({column: value.isoformat() if isinstance(value, datetime) else value
+                           for column, value in task.items()}, separators=(',', ':'))
+
+    def copy(self, task: dict) -> dict:
+        """Function used to copy the columns of a task"""
+        return {column: task[column] for column in TASK_COLUMNS} if task is not None else None
+
+    def create_user_task(self, uid: str, body: NewTaskRequest) -> uuid.UUID:
+        """Function used to create a task for a user and
+        insert it into the creation time index of the user"""
+        task_id, now = uuid.uuid4(), datetime.utcnow()
+        deadline = body.deadline
+        if isinstance(deadline, date) and not isinstance(deadline, datetime):
+            deadline = datetime(deadline.year, deadline.month, deadline.day)
+        task = {'task_id': str(task_id), 'task_title': body.task_title, 'content': body.content, 'priority': body.priority,
+                'duration': body.duration, 'hours_remaining': body.duration, 'created': now, 'deadline': deadline,
+                'completion_date': None, 'uid': uid, 'hours_added': 0}
+        with self._lock:
+            self.tasks[task['task_id']] = task
+            self.user_tasks.setdefault(uid, {})[task['task_id']] = task
+            times, ids = self.created_times.setdefault(uid, []), self.created_ids.setdefault(uid, [])
+            position = bisect_right(times, now)
+            times.insert(position, now)
+            ids.insert(position, task['task_id'])
+        invalidate_user(uid)
+        return task_id
+
+    def complete_task(self, task_id: str, body: object) -> bool:
+        """Function used to mark a task as completed. The
+        first completion of a task updates the duration
+        calibration of its user. Returns False if the task
+        does not exist"""
+        with self._lock:
+            if (task := self.tasks.get(self.normalize_id(task_id))) is None:
+                return False
+            ratio = effort_ratio(task['duration'], task['hours_added'], task['hours_remaining'],
+                                 getattr(body, 'actual_hours', None))
+            if task['completion_date'] is None and ratio is not None:
+                self.calibrations.setdefault(task['uid'], DurationCalibration()).observe(ratio)
+            task['completion_date'] = datetime.utcnow()
+        invalidate_user(task['uid'])
+        return True
+
+    def update_task_hours(self, task_id: str, body: object) -> bool:
+        """Function used to update the remaining hours of a
+        task. Increases of remaining hours are added up in
+        hours_added. Returns False if the task does not exist"""
+        if not body.remaining_hours:
+            LOGGER.warning('received no update hours')
+            return True
+        LOGGER.debug('updating task with body %s', body)
+        with self._lock:
+            if (task := self.tasks.get(self.normalize_id(task_id))) is None:
+                return False
+            task['hours_added'] += max(body.remaining_hours - task['hours_remaining'], 0)
+            task['hours_remaining'] = body.remaining_hours
+        invalidate_user(task['uid'])
+        return True
+
+    def get_task(self, task_id: str) -> dict:
+        """Function used to retrieve a task or None if the
+        task does not exist"""
+        with self._lock:
+            return self.copy(self.tasks.get(self.normalize_id(task_id)))
+
+    def get_user_task(self, uid: str, task_id: str) -> dict:
+        """Function used to retrieve a task of a given user
+        or None if the user has no such task"""
+        with self._lock:
+            return self.copy(self.user_tasks.get(uid, {}).get(self.normalize_id(task_id)))
+
+    def get_user_tasks(self, uid: str) -> list:
+        """Function used to retrieve all tasks of a user"""
+        with self._lock:
+            return [self.copy(task) for task in self.user_tasks.get(uid, {}).values()]
+
+    def get_user_tasks_in_range(self, uid: str, start: datetime, end: datetime) -> list:
+        """Function used to retrieve the tasks of a user
+        created strictly between start and end with a binary
+        search of the creation time index"""
+        with self._lock:
+            times, ids = self.created_times.get(uid, []), self.created_ids.get(uid, [])
+            return [self.copy(self.tasks[task_id]) for task_id in ids[bisect_right(times, start):bisect_left(times, end)]]
+
+    def delete_task(self, task_id: str):
+        """Function used to delete a task and remove it
+        from the indexes of its user"""
+        with self._lock:
+            if (task := self.tasks.pop(self.normalize_id(task_id), None)) is None:
+                return
+            del self.user_tasks[task['uid']][task['task_id']]
+            times, ids = self.created_times[task['uid']], self.created_ids[task['uid']]
+            position = bisect_left(times, task['created'])
+            position += ids[position:].index(task['task_id'])
+            del times[position], ids[position]
+        invalidate_user(task['uid'])
+
+    def select_tasks(self, uid: str, fetch_completed: bool) -> list:
+        """Function used to select the tasks of a user with
+        or without completed tasks"""
+        return [task for task in self.get_user_tasks(uid) if fetch_completed or task['completion_date'] is None]
+
+    def get_user_tasks_json(self, uid: str, fetch_completed: bool = False) -> str:
+        """Function used to retrieve the tasks of a user
+        as a JSON array"""
+        return '[' + ','.join(self.render(task) for task in self.select_tasks(uid, fetch_completed)) + ']'
+
+    def stream_user_tasks_json(self, uid: str, fetch_completed: bool = False, batch_size: int = TASK_STREAM_BATCH_SIZE):
+        """Generator used to stream the tasks of a user as
+        NDJSON in batches of batch_size tasks"""
+        tasks = self.select_tasks(uid, fetch_completed)
+        for offset in range(0, len(tasks), batch_size):
+            yield ''.join(self.render(task) + '\n' for task in tasks[offset:offset + batch_size])
+
+    def get_team_task_columns(self, uids: list) -> dict:
+        """Function used to retrieve the uid, duration,
+        deadline, priority and completion_date columns of
+        all tasks of a list of users"""
+        with self._lock:
+            tasks = [task for uid in uids for task in self.user_tasks.get(uid, {}).values()]
+            return {column: [task[column] for task in tasks]
+                    for column in ['uid', 'duration', 'deadline', 'priority', 'completion_date']}
+
+    def get_schedule_task_columns(self, uid: str) -> dict:
+        """Function used to retrieve the task_id, duration,
+        deadline and priority columns of all tasks of a user"""
+        with self._lock:
+            tasks = list(self.user_tasks.get(uid, {}).values())
+            return {column: [task[column] for task in tasks] for column in ['task_id', 'duration', 'deadline', 'priority']}
+
+    def search_user_tasks(self, uid: str, terms: list, limit: int, after: tuple = None, fetch_completed: bool = False,
+                          prefix: bool = True) -> list:
+        """Function used to search tasks without an index. Terms
+        are matched against lower case words without stemming and
+        ranked using the default weights of ts_rank_cd"""
+        terms, matches = [term.lower() for term in terms], []
+        for task in self.select_tasks(uid, fetch_completed):
+            scores = [0.0] * len(terms)
+            for column, weight in [('task_title', 1.0), ('content', 0.4)]:
+                words = re.findall(r'\w+', task[column].lower())
+                for i, term in enumerate(terms):
+                    partial = prefix and i == len(terms) - 1
+                    scores[i] += weight * sum(word.startswith(term) if partial else word == term for word in words)
+            if terms and all(scores):
+                matches.append((-sum(scores), task['task_id'], task))
+        matches.sort(key=lambda match: match[:2])
+        if after is not None:
+            matches = [match for match in matches if match[:2] > (-after[0], after[1])]
+        return [{**json.loads(self.render(task)), 'rank': -rank} for rank, _, task in matches[:limit]]
+
+    def get_duration_calibrations(self, uids: list) -> dict:
+        """Function used to retrieve copies of the
+        DurationCalibration of each of a list of users"""
+        with self._lock:
+            return {uid: DurationCalibration.from_row(self.calibrations[uid].to_row()) if uid in self.calibrations
+                    else DurationCalibration() for uid in uids}
+
+PERSISTENCE_BACKENDS = {
+    'postgres': PostgresBackend,
+    'memory': MemoryBackend
+}
+
+if (backend := PERSISTENCE_BACKENDS.get(PERSISTENCE_BACKEND)) is None:
+    raise ValueError(f'invalid persistence backend {PERSISTENCE_BACKEND}')
+BACKEND = backend()
+LOGGER.info('using %s persistence backend', PERSISTENCE_BACKEND)
+
+# operations of the selected backend
+create_user_task, complete_task, update_task_hours, get_task, get_user_task, get_user_tasks, get_user_tasks_in_range, \
+    delete_task, get_user_tasks_json, stream_user_tasks_json, get_team_task_columns, get_schedule_task_columns, \
+    search_user_tasks, get_duration_calibrations = \
+    [getattr(BACKEND, operation) for operation in OPERATIONS]
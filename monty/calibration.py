@@ -0,0 +1,180 @@
+"""module containing online estimators of how long tasks of a
+user take compared to their planned duration. Every completed
+task contributes a single ratio of actual to planned hours,
+which updates a running mean and variance and a quantile
+sketch in constant time, so calibrations never require a
+scan of completed tasks
+
+Actual hours are taken from the completion request if given.
+Otherwise they are the hours worked according to the remaining
+hours at completion, i.e. the planned duration plus all upward
+revisions minus the hours still remaining. Tasks completed
+without either signal are not observed"""
+
+import logging
+import math
+
+import numpy as np
+
+from config import CALIBRATION_SKETCH_ACCURACY, CALIBRATION_STATISTIC, CALIBRATION_PRIOR_WEIGHT
+
+LOGGER = logging.getLogger(__name__)
+
+
+# ratios are clamped to this range before they are observed
+MIN_RATIO, MAX_RATIO = 1 / 32, 32.0
+
+# sparse sketch buckets are stored as bucket indices followed by counts
+SKETCH_INDEX_DTYPE, SKETCH_COUNT_DTYPE = np.dtype('<u2'), np.dtype('<u4')
+
+
+class DurationCalibration:
+    """Class containing the duration calibration of a single
+    user. The mean and variance of ratios are maintained with
+    Welford's algorithm and quantiles with a sketch of counts in
+    logarithmic buckets, so that quantiles are accurate to within
+    the relative accuracy of the sketch"""
+
+    gamma = (1 + CALIBRATION_SKETCH_ACCURACY) / (1 - CALIBRATION_SKETCH_ACCURACY)
+    offset = math.floor(math.log(MIN_RATIO, gamma))
+    buckets = math.ceil(math.log(MAX_RATIO, gamma)) - offset + 1
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0, sketch: bytes = b''):
+        self.count, self.mean, self.m2 = count, mean, m2
+        self.sketch = self.decode_sketch(sketch)
+
+    @classmethod
+    def from_row(cls, row: dict) -> 'DurationCalibration':
+        """Function used to load a calibration from a
+        row containing count, mean, m2 and sketch"""
+        if row is None:
+            return cls()
+        return cls(int(row['count']), float(row['mean']), float(row['m2']), bytes(row['sketch']))
+
+    def to_row(self) -> dict:
+        """Function used to convert a calibration into a
+        row containing count, mean, m2 and sketch"""
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2, 'sketch': self.encode_sketch()}
+
+    def decode_sketch(self, sketch: bytes) -> np.ndarray:
+        """Function used to decode a sparse sketch into
+        an array of counts per bucket"""
+        counts = np.zeros(self.buckets, dtype=np.int64)
+        size = len(sketch) // (SKETCH_INDEX_DTYPE.itemsize + SKETCH_COUNT_DTYPE.itemsize)
+        indices = np.frombuffer(sketch, dtype=SKETCH_INDEX_DTYPE, count=size)
+        counts[indices] = np.frombuffer(sketch, dtype=SKETCH_COUNT_DTYPE, count=size, offset=indices.nbytes)
+        return counts
+
+    def encode_sketch(self) -> bytes:
+        """Function used to encode the non-empty buckets of
+        the sketch. Ratios of a user are usually spread over a
+        few buckets, so sketches take tens of bytes"""
+        indices = np.flatnonzero(self.sketch)
+        return indices.astype(SKETCH_INDEX_DTYPE).tobytes() + self.sketch[indices].astype(SKETCH_COUNT_DTYPE).tobytes()
+
+    def observe(self, ratio: float):
+        """Function used to add the ratio of actual to planned
+        hours of a completed task
+
+        Arguments:
+            ratio: float ratio of actual to planned hours
+        """
+        ratio = min(max(float(ratio), MIN_RATIO), MAX_RATIO)
+        self.count += 1
+        delta = ratio - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (ratio - self.mean)
+        self.sketch[math.ceil(math.log(ratio, self.gamma)) - self.offset] += 1
+
+    @property
+    def variance(self) -> float:
+        """Sample variance of observed ratios"""
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Function used to estimate a quantile of observed
+        ratios from the sketch
+
+        Arguments:
+            q: float quantile between 0 and 1
+        Returns:
+            float estimated ratio or 1.0 if nothing was observed
+        """
+        if not self.count:
+            return 1.0
+        index = int(np.searchsorted(np.cumsum(self.sketch), q * (self.count - 1), side='right'))
+        return 2 * self.gamma ** (index + self.offset) / (self.gamma + 1)
+
+    def factor(self, statistic: str = CALIBRATION_STATISTIC, prior_weight: float = CALIBRATION_PRIOR_WEIGHT) -> float:
+        """Function used to calculate the factor applied to
+        planned durations. The statistic is shrunk towards 1
+        as if prior_weight tasks had been completed on plan,
+        so that a few completions only move the factor slightly
+
+        Arguments:
+            statistic: str key of CALIBRATION_STATISTICS
+            prior_weight: float number of on plan tasks assumed
+        Returns:
+            float factor to multiply planned durations by
+        """
+        if not self.count:
+            return 1.0
+        value = CALIBRATION_STATISTICS[statistic](self)
+        return (self.count * value + prior_weight) / (self.count + prior_weight)
+
+    def summary(self) -> dict:
+        """Function used to summarize a calibration"""
+        return {
+            'count': self.count,
+            'mean': round(self.mean, 4),
+            'variance': round(self.variance, 4),
+            'quantiles': {f'p{round(q * 100)}': round(self.quantile(q), 4) for q in [0.1, 0.5, 0.9]},
+            'factor': round(self.factor(), 4)
+        }
+
+CALIBRATION_STATISTICS = {
+    'mean': lambda calibration: calibration.mean,
+    'median': lambda calibration: calibration.quantile(0.5),
+    'p90': lambda calibration: calibration.quantile(0.9)
+}
+
+if CALIBRATION_STATISTIC not in CALIBRATION_STATISTICS:
+    raise ValueError(f'invalid calibration statistic {CALIBRATION_STATISTIC}')
+
+def effort_ratio(duration: int, hours_added: int, hours_remaining: int, actual_hours: int = None) -> float:
+    """Function used to calculate the ratio of actual to
+    planned hours of a completed task
+
+    Arguments:
+        duration: int planned hours
+        hours_added: int sum of upward revisions of remaining hours
+        hours_remaining: int remaining hours at completion
+        actual_hours: optional int hours reported on completion
+    Returns:
+        float ratio or None if the task has no planned hours
+        or no hours were reported or worked
+    """
+    if duration <= 0:
+        return None
+    if actual_hours is not None and actual_hours > 0:
+        return actual_hours / duration
+    if (worked := duration + hours_added - hours_remaining) <= 0:
+        return None
+    return worked / duration
+
+def calibrate_durations(duration: object, factor: object) -> np.ndarray:
+    """Function used to correct planned durations with
+    calibration factors. Corrected durations are rounded to
+    hundredths of hours and durations are returned unchanged
+    if all factors are 1
+
+    Arguments:
+        duration: planned task durations in hours
+        factor: factor or array of factors per task
+    Returns:
+        array of corrected durations
+    """
+    duration, factor = np.asarray(duration), np.asarray(factor, dtype=np.float64)
+    if np.all(factor == 1):
+        return duration
+    return np.round(duration * factor, 2)
@@ -0,0 +1,136 @@
+"""module containing response compression plugin for monty application"""
+
+import logging
+import json
+import zlib
+
+import brotli
+from bottle import request, response
+
+from config import COMPRESSION_MIN_SIZE, GZIP_LEVEL, BROTLI_QUALITY
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class GzipStream:
+    """Streaming gzip compressor. Each compressed chunk
+    is flushed so that it can be decoded by the client
+    as soon as it arrives"""
+
+    def __init__(self):
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        """Function used to compress and flush a chunk"""
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        """Function used to terminate the stream"""
+        return self._compressor.flush()
+
+class BrotliStream:
+    """Streaming brotli compressor. Each compressed chunk
+    is flushed so that it can be decoded by the client
+    as soon as it arrives"""
+
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        """Function used to compress and flush a chunk"""
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        """Function used to terminate the stream"""
+        return self._compressor.finish()
+
+# supported encodings in order of preference
+COMPRESSORS = {
+    'br': BrotliStream,
+    'gzip': GzipStream
+}
+
+COMPRESSIBLE_TYPES = ['application/json', 'application/x-ndjson', 'text/']
+
+def negotiate_encoding(header: str) -> str:
+    """Function used to select the content encoding for
+    a response from the value of the Accept-Encoding header
+
+    Arguments:
+        header: str value of Accept-Encoding header
+    Returns:
+        str containing selected encoding or None if no
+            supported encoding is accepted
+    """
+    weights = {}
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        try:
+            quality = float(params.strip()[2:]) if params.strip().startswith('q=') else 1.0
+        except ValueError:
+            continue
+        weights[coding.strip().lower()] = quality
+    candidates = [(weights.get(coding, weights.get('*', 0)), -i, coding) for i, coding in enumerate(COMPRESSORS)]
+    quality, _, coding = max(candidates)
+    return coding if quality > 0 else None
+
+def compress_stream(chunks: object, compressor: object):
+    """Generator used to compress an iterable of
+    response chunks
+
+    Arguments:
+        chunks: iterable of str or bytes chunks
+        compressor: streaming compressor to use
+    Returns:
+        generator of compressed chunks
+    """
+    try:
+        for chunk in chunks:
+            if (data := compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk)):
+                yield data
+        yield compressor.finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+class CompressionPlugin:
+    """Bottle plugin used to compress response bodies
+    with the content encoding negotiated from the
+    Accept-Encoding header. Both regular and streaming
+    responses are supported"""
+
+    def setup(self, app: object):
+        """Function used to check that plugin has not been
+        added to bottle application twice"""
+        for plugin in app.plugins:
+            if isinstance(plugin, CompressionPlugin):
+                raise RuntimeError('compression plugin already applied to application')
+
+    def apply(self, callback: object, context: object):
+        """Function used to apply compression decorator
+        to bottle application"""
+        def wrapper(*args: tuple, **kwargs: dict):
+            body = callback(*args, **kwargs)
+            if isinstance(body, dict):
+                # serialize here so that JSON responses can be compressed
+                body = json.dumps(body)
+                response.content_type = 'application/json'
+            response.add_header('Vary', 'Accept-Encoding')
+
+            if not body or 'Content-Encoding' in response.headers:
+                return body
+            if not any(response.content_type.startswith(content) for content in COMPRESSIBLE_TYPES):
+                return body
+            if isinstance(body, (str, bytes)) and len(body) < COMPRESSION_MIN_SIZE:
+                return body
+            if (encoding := negotiate_encoding(request.headers.get('Accept-Encoding', ''))) is None:
+                return body
+
+            response.set_header('Content-Encoding', encoding)
+            compressor = COMPRESSORS[encoding]()
+            if isinstance(body, (str, bytes)):
+                data = body.encode() if isinstance(body, str) else body
+                return compressor.compress(data) + compressor.finish()
+            return compress_stream(body, compressor)
+        return wrapper
@@ -2,9 +2,18 @@
 
 import logging
 import os
+import sys
 
 from typing import Any
 
+# docker images copy the shared modules next to the service modules,
+# while checkouts keep them in the shared directory of the repository
+SHARED_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'shared')
+if os.path.isdir(SHARED_DIRECTORY) and SHARED_DIRECTORY not in sys.path:
+    sys.path.append(SHARED_DIRECTORY)
+
+from log_setup import configure_logging, parse_module_levels
+
 LOGGER = logging.getLogger(__name__)
 
 
@@ -42,8 +51,18 @@ LOG_LEVELS = {
     'CRITICAL': logging.CRITICAL
 }
 
-LOG_LEVEL = LOG_LEVELS.get(override_value('log_level', 'DEBUG'), logging.DEBUG)
-logging.basicConfig(level=LOG_LEVEL)
+LOG_LEVEL = LOG_LEVELS.get(override_value('log_level', 'INFO'), logging.INFO)
+# per-module levels in the format module=LEVEL,module=LEVEL
+MODULE_LOG_LEVELS = parse_module_levels(override_value('module_log_levels', ''), LOG_LEVELS)
+LOG_FORMAT = override_value('log_format', 'text')
+# max debug records emitted per message per interval. 0 disables limit
+LOG_RATE_LIMIT = override_value('log_rate_limit', 10)
+LOG_RATE_INTERVAL = override_value('log_rate_interval', 1.0)
+LOG_SAMPLE_RATE = override_value('log_sample_rate', 1.0)
+
+LOG_LISTENER = configure_logging(LOG_LEVEL, module_levels=MODULE_LOG_LEVELS, log_format=LOG_FORMAT,
+                                 rate_limit=LOG_RATE_LIMIT, rate_interval=LOG_RATE_INTERVAL,
+                                 sample_rate=LOG_SAMPLE_RATE)
 
 logging.getLogger('matplotlib').setLevel(level=logging.WARN)
 
@@ -52,6 +71,110 @@ LISTEN_PORT = override_value('LISTEN_PORT', 10999)
 
 TASK_PRIORITY_THRESHOLD = override_value('task_priority_threshold', 0.75)
 
+# simulation results depend on the current time, so tags are
+# additionally rotated after the given number of seconds
+SIMULATION_ETAG_TTL = override_value('simulation_etag_ttl', 60)
+
+SIMULATION_HOURS_PER_DAY = override_value('simulation_hours_per_day', 8)
+TEAM_SIMULATION_MAX_MEMBERS = override_value('team_simulation_max_members', 100)
+# there is no team model, so only the given comma separated users may
+# retrieve the results of other members. other members only receive
+# their own results and the results of the team as a whole
+TEAM_SIMULATION_ADMINS = {uid.strip() for uid in override_value('team_simulation_admins', '').split(',') if uid.strip()}
+SCHEDULE_DEFAULT_LIMIT = override_value('schedule_default_limit', 1000)
+SCHEDULE_MAX_LIMIT = override_value('schedule_max_limit', 10000)
+
+# text search configuration used to build search documents
+SEARCH_CONFIG = override_value('search_config', 'english')
+SEARCH_DEFAULT_LIMIT = override_value('search_default_limit', 20)
+SEARCH_MAX_LIMIT = override_value('search_max_limit', 100)
+SEARCH_MAX_TERMS = override_value('search_max_terms', 8)
+
+INTERNAL_LISTEN_ADDRESS = override_value('internal_listen_address', '0.0.0.0')
+INTERNAL_LISTEN_PORT = override_value('internal_listen_port', 10998)
+
+# on-demand profiling settings. requests are profiled when sent with
+# a X-Monty-Profile header matching the token or when sampled
+PROFILING_ENABLED = override_value('profiling_enabled', False)
+PROFILING_TOKEN = override_value('profiling_token', '', secret=True)
+PROFILING_SAMPLE_RATE = override_value('profiling_sample_rate', 0.0)
+PROFILING_MODE = override_value('profiling_mode', 'cprofile')
+PROFILING_INTERVAL = override_value('profiling_interval', 0.001)
+PROFILING_DIRECTORY = override_value('profiling_directory', '/tmp/monty-profiles')
+PROFILING_HISTORY = override_value('profiling_history', 100)
+
+SERVER_THREADS = override_value('server_threads', 8)
+
+# admission control settings. queued requests hold a server thread, so
+# the concurrency and queue sizes of all classes of routes together must
+# leave at least the reserved number of server threads free for routes
+# without admission control
+ADMISSION_QUEUE_TIMEOUT = override_value('admission_queue_timeout', 2.0)
+ADMISSION_RETRY_AFTER = override_value('admission_retry_after', 1)
+ADMISSION_RESERVED_THREADS = override_value('admission_reserved_threads', 1)
+
+SIMULATION_CONCURRENCY = override_value('simulation_concurrency', 1)
+SIMULATION_QUEUE_SIZE = override_value('simulation_queue_size', 1)
+SIMULATION_RATE = override_value('simulation_rate', 0.5)
+SIMULATION_BURST = override_value('simulation_burst', 5)
+
+METRICS_CONCURRENCY = override_value('metrics_concurrency', 1)
+METRICS_QUEUE_SIZE = override_value('metrics_queue_size', 1)
+METRICS_RATE = override_value('metrics_rate', 2.0)
+METRICS_BURST = override_value('metrics_burst', 10)
+
+TASKS_CONCURRENCY = override_value('tasks_concurrency', 2)
+TASKS_QUEUE_SIZE = override_value('tasks_queue_size', 1)
+TASKS_RATE = override_value('tasks_rate', 5.0)
+TASKS_BURST = override_value('tasks_burst', 20)
+
+SYNTHETIC_CHUNK_SIZE = override_value('synthetic_chunk_size', 100000)
+SYNTHETIC_DEADLINE_SCALE = override_value('synthetic_deadline_scale', 5.0)
+SYNTHETIC_DURATION_SCALE = override_value('synthetic_duration_scale', 7.0)
+
+TASK_STREAM_BATCH_SIZE = override_value('task_stream_batch_size', 500)
+
+# channel used to notify other processes of changes to user data
+INVALIDATION_CHANNEL = override_value('invalidation_channel', 'monty_invalidation')
+INVALIDATION_POLL_INTERVAL = override_value('invalidation_poll_interval', 5.0)
+INVALIDATION_RECONNECT_DELAY = override_value('invalidation_reconnect_delay', 1.0)
+
+# tasks completed more than the given number of days ago are moved to
+# the archive table every interval. archiving is disabled if the
+# interval is not positive
+ARCHIVE_AFTER_DAYS = override_value('archive_after_days', 30)
+ARCHIVE_INTERVAL = override_value('archive_interval', 300)
+ARCHIVE_BATCH_SIZE = override_value('archive_batch_size', 10000)
+SNAPSHOT_CHUNK_SIZE = override_value('snapshot_chunk_size', 100000)
+
+# planned durations are corrected with the ratio of actual to planned
+# hours of completed tasks. the statistic is one of mean, median or p90
+# and is shrunk towards 1 by the given number of on plan tasks
+CALIBRATION_ENABLED = override_value('calibration_enabled', True)
+CALIBRATION_STATISTIC = override_value('calibration_statistic', 'mean')
+CALIBRATION_PRIOR_WEIGHT = override_value('calibration_prior_weight', 5.0)
+CALIBRATION_SKETCH_ACCURACY = override_value('calibration_sketch_accuracy', 0.02)
+
+# approximate simulations sample tasks until confidence bounds are within
+# the accuracy or the time budget in seconds is spent. task sets of at
+# most min tasks and samples above max fraction of tasks are run exactly
+APPROXIMATE_MIN_TASKS = override_value('approximate_min_tasks', 50000)
+APPROXIMATE_SAMPLE_SIZE = override_value('approximate_sample_size', 50000)
+APPROXIMATE_ACCURACY = override_value('approximate_accuracy', 0.01)
+APPROXIMATE_TIME_BUDGET = override_value('approximate_time_budget', 1.0)
+APPROXIMATE_MAX_TIME_BUDGET = override_value('approximate_max_time_budget', 10.0)
+APPROXIMATE_CONFIDENCE = override_value('approximate_confidence', 0.95)
+APPROXIMATE_GROUPS = override_value('approximate_groups', 10)
+APPROXIMATE_MAX_FRACTION = override_value('approximate_max_fraction', 0.25)
+APPROXIMATE_QUANTILE_SAMPLE = override_value('approximate_quantile_sample', 10000)
+
+COMPRESSION_MIN_SIZE = override_value('compression_min_size', 1024)
+GZIP_LEVEL = override_value('gzip_level', 6)
+BROTLI_QUALITY = override_value('brotli_quality', 5)
+
+# one of postgres or memory. see backends.py
+PERSISTENCE_BACKEND = override_value('persistence_backend', 'postgres')
+
 POSTGRES_PORT = override_value('postgres_port', 5432)
 POSTGRES_HOST = override_value('postgres_host', 'localhost')
 POSTGRES_USER = override_value('postgres_user', 'postgres')
@@ -59,6 +182,11 @@ POSTGRES_PASSWORD = override_value('postgres_password', '')
 POSTGRES_DB = override_value('postgres_db', 'monty')
 
 AUTH_SERVICE_URL = override_value('auth_service_url', 'http://164.90.180.125/authenticate')
+INTROSPECTION_CONNECT_TIMEOUT = override_value('introspection_connect_timeout', 1.0)
+INTROSPECTION_READ_TIMEOUT = override_value('introspection_read_timeout', 2.0)
+INTROSPECTION_POOL_SIZE = override_value('introspection_pool_size', 10)
+INTROSPECTION_CACHE_TTL = override_value('introspection_cache_ttl', 60.0)
+INTROSPECTION_CACHE_SIZE = override_value('introspection_cache_size', 10000)
 
 def get_postgres_connection_string() -> str:
     """Function used go generate the postgres
@@ -67,4 +195,10 @@ def get_postgres_connection_string() -> str:
 
 DB_CONNECTION_STRING = get_postgres_connection_string()
 
-JWT_SECRET = override_value('jwt_secret', '')
\ No newline at end of file
+JWT_SECRET = override_value('jwt_secret', '', secret=True)
+
+# authentication mode. must be one of header (trust the
+# X-Authenticated-Userid header set by the gateway), jwt (verify
+# Authorization: Bearer tokens locally) or both
+AUTHENTICATION_MODE = override_value('authentication_mode', 'header')
+JWT_CACHE_SIZE = override_value('jwt_cache_size', 10000)
\ No newline at end of file
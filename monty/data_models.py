@@ -5,9 +5,9 @@ import json
 import uuid
 
 from datetime import datetime, date
-from typing import Any, Optional
+from typing import Any, List, Optional
 
-from bottle import request, abort
+from bottle import request, response, abort
 from pydantic import BaseModel, ValidationError, Field
 
 
@@ -24,6 +24,20 @@ def dataclass_response(func: object):
         return response
     return wrapper
 
+def json_envelope(payload: str, http_code: int = 200, success: bool = True) -> bytes:
+    """Function used to wrap a pre-rendered JSON payload in
+    the same envelope that is generated for HTTPResponse
+    objects without parsing the payload
+
+    Arguments:
+        payload: str containing JSON encoded payload
+        http_code: int HTTP code of response
+        success: bool success flag of response
+    Returns:
+        bytes containing JSON encoded HTTPResponse
+    """
+    response.content_type = 'application/json'
+    return f'{{"http_code": {http_code}, "success": {json.dumps(success)}, "payload": {payload}}}'.encode()
 
 REQUEST_BODY_SOURCES = {
     'json': lambda: request.json
@@ -66,8 +80,10 @@ class NewTaskRequest(BaseModel):
     deadline: date
 
 class TaskUpdateRequest(BaseModel):
-    """Dataclass containing request for updating tasks"""
+    """Dataclass containing request for updating tasks. Actual
+    hours are only used when completing tasks"""
     remaining_hours: Optional[int]
+    actual_hours: Optional[int]
 
 class Task(BaseModel):
     """Dataclass contining monte carlo task"""
@@ -100,3 +116,34 @@ class UserMetrics(BaseModel):
     completed_tasks: int
     completed_in_time: int
 
+class TeamSimulationRequest(BaseModel):
+    """Dataclass containing request for team simulation. The
+    accuracy and time budget are only used by approximate
+    simulations"""
+    members: List[str]
+    hours_per_day: Optional[int]
+    approximate: Optional[bool]
+    accuracy: Optional[float]
+    time_budget: Optional[float]
+
+class AdmissionPolicy(BaseModel):
+    """Dataclass containing admission control policy
+    of a single route"""
+    concurrency: int
+    queue_size: int
+    rate: float
+    burst: int
+
+class ProfileRecord(BaseModel):
+    """Dataclass containing details of a profiled request"""
+    profile_id: str
+    mode: str
+    method: str
+    route: str
+    path: str
+    uid: str
+    status: int
+    started: datetime
+    duration: float
+    cpu_time: float
+    filename: str
@@ -1,19 +1,18 @@
 """module containing helpers functions"""
 
 import logging
+import argparse
+import io
 import json
-import uuid
-from math import floor
 from typing import List
-from datetime import datetime, timedelta
-from random import randint, choice, uniform
+from datetime import datetime
 
-import requests
 import numpy as np
-from pydantic import ValidationError
 
-from config import AUTH_SERVICE_URL
+from config import SYNTHETIC_CHUNK_SIZE, SYNTHETIC_DEADLINE_SCALE, SYNTHETIC_DURATION_SCALE
 from data_models import Task, IntrospectionResponse
+from introspection import INTROSPECTION_CLIENT
+from persistence import copy_tasks
 
 LOGGER = logging.getLogger(__name__)
 
@@ -25,7 +24,143 @@ def get_tasks(input_file: str = './tasks.json') -> list:
         data = json.load(f)
     return [Task(**task) for task in data['tasks']]
 
-def create_tasks(count: int, output: str = './tasks.json', save: bool = False) -> List[Task]:
+def sample_truncated_exponential(rng: np.random.Generator, scale: np.ndarray, upper: np.ndarray) -> np.ndarray:
+    """Function used to sample from exponential distributions
+    truncated to [0, upper) using the inverse CDF
+
+    Arguments:
+        rng: numpy random generator
+        scale: array of distribution scales
+        upper: array of upper bounds
+    Returns:
+        array of samples
+    """
+    return -scale * np.log1p(-rng.random(len(scale)) * -np.expm1(-upper / scale))
+
+def generate_task_chunks(count: int, users: list = None, seed: int = None, chunk_size: int = SYNTHETIC_CHUNK_SIZE,
+                         start: datetime = datetime(2020, 8, 9)):
+    """Generator used to create synthetic tasks in chunks of
+    columns. All columns are generated with vectorized operations.
+    Each user is assigned its own activity level and deadline and
+    duration distributions so that task sets differ between users
+
+    Arguments:
+        count: int number of tasks to create
+        users: list of user IDs to create tasks for
+        seed: int random seed
+        chunk_size: int max number of tasks per chunk
+        start: datetime reference date of deadlines
+    Returns:
+        generator of dicts mapping column names to column values
+    """
+    rng = np.random.default_rng(seed)
+    users = np.array(users if users else ['synthetic-user-0'])
+    # per user distributions
+    activity = rng.gamma(1.0, size=len(users))
+    deadline_scales = SYNTHETIC_DEADLINE_SCALE * rng.lognormal(0, 0.25, size=len(users))
+    duration_scales = SYNTHETIC_DURATION_SCALE * rng.lognormal(0, 0.25, size=len(users))
+
+    reference = np.datetime64(start, 's')
+    for offset in range(0, count, chunk_size):
+        size = min(chunk_size, count - offset)
+        user_index = rng.choice(len(users), size=size, p=activity / activity.sum())
+
+        deadline = np.round(rng.exponential(deadline_scales[user_index])) + 1
+        # only include durations that are less than the deadline
+        duration = np.round(sample_truncated_exponential(rng, duration_scales[user_index], deadline * 24 - 0.5)) + 1
+
+        ids = rng.integers(0, 256, size=(size, 16), dtype=np.uint8)
+        ids[:, 6] = ids[:, 6] & 0x0f | 0x40
+        ids[:, 8] = ids[:, 8] & 0x3f | 0x80
+        hexed = ids.tobytes().hex()
+
+        numbers = range(offset, offset + size)
+        yield {
+            'task_id': [f'{hexed[i:i + 8]}-{hexed[i + 8:i + 12]}-{hexed[i + 12:i + 16]}-{hexed[i + 16:i + 20]}-{hexed[i + 20:i + 32]}'
+                        for i in range(0, size * 32, 32)],
+            'uid': users[user_index],
+            'task_title': [f'task {i}' for i in numbers],
+            'content': [f'testing task {i}' for i in numbers],
+            'priority': rng.integers(1, 101, size=size),
+            'duration': duration.astype(np.int64),
+            'hours_remaining': duration.astype(np.int64),
+            'created': reference - rng.integers(0, 7 * 24 * 3600, size=size).astype('timedelta64[s]'),
+            'deadline': reference + deadline.astype('timedelta64[D]').astype('timedelta64[s]'),
+            'completion_date': [None] * size
+        }
+
+TASK_COLUMNS = ['task_id', 'uid', 'task_title', 'content', 'priority', 'duration', 'hours_remaining',
+                'created', 'deadline', 'completion_date']
+
+def chunk_rows(chunk: dict) -> zip:
+    """Function used to convert a chunk of columns into rows
+    of python values in the order of TASK_COLUMNS"""
+    columns = dict(chunk)
+    for column in ['created', 'deadline']:
+        columns[column] = np.datetime_as_string(chunk[column], unit='s').tolist()
+    for column in ['uid', 'priority', 'duration', 'hours_remaining']:
+        columns[column] = np.asarray(chunk[column]).tolist()
+    return zip(*[columns[column] for column in TASK_COLUMNS])
+
+def render_json_rows(chunk: dict) -> list:
+    """Function used to render a chunk as a list of JSON
+    objects. Generated strings never need escaping"""
+    return [f'{{"task_id": "{task_id}", "uid": "{uid}", "task_title": "{title}", "content": "{content}", '
+            f'"priority": {priority}, "duration": {duration}, "hours_remaining": {remaining}, '
+            f'"created": "{created}", "deadline": "{deadline}", "completion_date": null}}'
+            for task_id, uid, title, content, priority, duration, remaining, created, deadline, _ in chunk_rows(chunk)]
+
+def write_tasks_json(chunks: object, f: object):
+    """Function used to stream chunks to a file in the
+    same {'tasks': [...]} format read by get_tasks"""
+    f.write('{"tasks": [')
+    first = True
+    for chunk in chunks:
+        if (rows := render_json_rows(chunk)):
+            f.write(('' if first else ', ') + ', '.join(rows))
+            first = False
+    f.write(']}')
+
+def write_tasks_ndjson(chunks: object, f: object):
+    """Function used to stream chunks to a file as
+    newline delimited JSON"""
+    for chunk in chunks:
+        f.writelines(row + '\n' for row in render_json_rows(chunk))
+
+def copy_tasks_to_postgres(chunks: object):
+    """Function used to stream chunks into the tasks
+    table using COPY"""
+    for chunk in chunks:
+        data = io.StringIO()
+        data.writelines('\t'.join('\\N' if value is None else str(value) for value in row) + '\n'
+                        for row in chunk_rows(chunk))
+        data.seek(0)
+        copy_tasks(data, TASK_COLUMNS, set(np.asarray(chunk['uid']).tolist()))
+
+TASK_WRITERS = {
+    'json': write_tasks_json,
+    'ndjson': write_tasks_ndjson
+}
+
+def save_tasks(count: int, output: str, output_format: str = 'json', users: list = None, seed: int = None):
+    """Function used to generate synthetic tasks and stream
+    them to a local file or the postgres database
+
+    Arguments:
+        count: int number of tasks to create
+        output: str output path. ignored for postgres
+        output_format: str one of json, ndjson or postgres
+        users: list of user IDs to create tasks for
+        seed: int random seed
+    """
+    chunks = generate_task_chunks(count, users=users, seed=seed)
+    if output_format == 'postgres':
+        copy_tasks_to_postgres(chunks)
+        return
+    with open(output, 'w') as f:
+        TASK_WRITERS[output_format](chunks, f)
+
+def create_tasks(count: int, output: str = './tasks.json', save: bool = False, seed: int = None) -> List[dict]:
     """Function used to create tasks that are saved
     to a local JSON file to use for testing
 
@@ -33,47 +168,39 @@ def create_tasks(count: int, output: str = './tasks.json', save: bool = False) -
         count: int number of tasks to create
         output: str output path of task JSON file
         save: bool save to local disk if True
+        seed: int random seed
     Returns:
-        list of Task objects
+        list of task dicts
     """
-    tasks = []
-    now = datetime(2020, 8, 9)
-    deadline_dist, duration_dist = np.round(np.random.exponential(5, 10000)), np.round(np.random.exponential(7, 10000))
-    for i in range(count):
-        deadline = choice(deadline_dist) + 1
-        # only include durations that are less than the deadline
-        valid_durations = np.where(duration_dist < deadline * 24)
-        duration = choice(duration_dist[valid_durations]) + 1
-        task = {
-            'task_id': str(uuid.uuid4()),
-            'content': 'testing task ' + str(i),
-            'priority': randint(1, 100),
-            'deadline': (now + timedelta(days=deadline)).isoformat(),
-            'duration': int(duration),
-            'completion_date': None
-        }
-        tasks.append(task)
+    # a seed is drawn once so that saved and returned tasks are the same
+    seed = np.random.SeedSequence(seed).entropy
     if save:
-        with open(output, 'w') as f:
-            json.dump({'tasks': tasks}, f)
+        save_tasks(count, output, seed=seed)
+    tasks = []
+    for chunk in generate_task_chunks(count, seed=seed):
+        tasks.extend(dict(zip(TASK_COLUMNS, row)) for row in chunk_rows(chunk))
     return tasks
 
-def get_user_details(uid: str, token: str) -> dict:
+def get_user_details(uid: str, token: str) -> IntrospectionResponse:
     """Function used to retreive user details
-    from the Authentication API
+    from the Authentication API. Details are served
+    from the cache of the introspection client if present
 
     Arguments:
         uid: str ID of user
+        token: str access token of user
     """
-    url = AUTH_SERVICE_URL + '/user'
-    try:
-        data = {'uid': uid, 'token': token}
-        response = requests.post(url, data=data)
-
-        return IntrospectionResponse(**response.json())
-    except (requests.HTTPError, ValidationError):
-        LOGGER.exception('unable to retrieve user details from authentication server')
+    return INTROSPECTION_CLIENT.get_user_details(uid, token)
 
 if __name__ == '__main__':
 
-    create_tasks(1000, save=True)
\ No newline at end of file
+    arg_parser = argparse.ArgumentParser(description='synthetic task generator')
+    arg_parser.add_argument('--count', type=int, default=1000)
+    arg_parser.add_argument('--users', type=int, default=1)
+    arg_parser.add_argument('--seed', type=int, default=None)
+    arg_parser.add_argument('--format', choices=['json', 'ndjson', 'postgres'], default='json')
+    arg_parser.add_argument('--output', default='./tasks.json')
+    args = arg_parser.parse_args()
+
+    save_tasks(args.count, args.output, output_format=args.format, seed=args.seed,
+               users=[f'synthetic-user-{i}' for i in range(args.users)])
\ No newline at end of file
@@ -0,0 +1,206 @@
+"""module containing instrumentation plugin and metric primitives
+used to expose request, database and simulation timings in the
+prometheus text format"""
+
+import logging
+import threading
+from bisect import bisect_left
+from time import perf_counter
+
+from bottle import response, HTTPResponse
+
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def escape_label(value: str) -> str:
+    """Function used to escape label values for
+    the prometheus text format"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    """Function used to render a label set
+
+    Arguments:
+        names: tuple of label names
+        values: tuple of label values
+        extra: str optional pre-rendered label to append
+    Returns:
+        str containing rendered label set
+    """
+    labels = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+class Counter:
+    """Class containing a monotonically increasing counter"""
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        """Function used to increment the counter"""
+        with self._lock:
+            self.value += amount
+
+    def render(self, name: str, names: tuple, values: tuple) -> list:
+        """Function used to render counter samples"""
+        return [f'{name}{format_labels(names, values)} {self.value}']
+
+class Histogram:
+    """Class containing a histogram with fixed buckets"""
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum, self.count = 0.0, 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """Function used to record a single observation"""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def render(self, name: str, names: tuple, values: tuple) -> list:
+        """Function used to render histogram samples"""
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        lines, cumulative = [], 0
+        for bound, bucket_count in zip(list(self.buckets) + ['+Inf'], counts):
+            cumulative += bucket_count
+            bound_label = f'le="{bound}"'
+            lines.append(f'{name}_bucket{format_labels(names, values, bound_label)} {cumulative}')
+        lines.append(f'{name}_sum{format_labels(names, values)} {total}')
+        lines.append(f'{name}_count{format_labels(names, values)} {count}')
+        return lines
+
+METRIC_TYPES = {
+    'counter': Counter,
+    'histogram': Histogram
+}
+
+class MetricFamily:
+    """Class containing all labelled children of a metric"""
+
+    def __init__(self, name: str, description: str, kind: str, label_names: tuple):
+        self.name, self.description, self.kind, self.label_names = name, description, kind, label_names
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: tuple) -> object:
+        """Function used to retrieve the child metric for
+        a set of label values. Children are created on first
+        use. Callers on hot paths should resolve children once
+        and keep a reference"""
+        if (child := self._children.get(values)) is None:
+            with self._lock:
+                child = self._children.setdefault(values, METRIC_TYPES[self.kind]())
+        return child
+
+    def render(self) -> list:
+        """Function used to render the metric family"""
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.kind}']
+        for values, child in list(self._children.items()):
+            lines.extend(child.render(self.name, self.label_names, values))
+        return lines
+
+REGISTRY = []
+
+def register(name: str, description: str, kind: str, label_names: tuple) -> MetricFamily:
+    """Function used to create and register a new metric family
+
+    Arguments:
+        name: str name of metric
+        description: str help text of metric
+        kind: str metric type. must be one of METRIC_TYPES
+        label_names: tuple of label names
+    Returns:
+        MetricFamily object
+    """
+    family = MetricFamily(name, description, kind, label_names)
+    REGISTRY.append(family)
+    return family
+
+def render_metrics() -> str:
+    """Function used to render all registered metrics
+    in the prometheus text format"""
+    lines = []
+    for family in REGISTRY:
+        lines.extend(family.render())
+    return '\n'.join(lines) + '\n'
+
+REQUEST_LATENCY = register('monty_http_request_duration_seconds', 'HTTP request latency by route',
+                           'histogram', ('route', 'method'))
+REQUEST_STATUS = register('monty_http_requests_total', 'HTTP requests by route and status code',
+                          'counter', ('route', 'method', 'status'))
+DB_QUERY_LATENCY = register('monty_db_query_duration_seconds', 'database query latency by function',
+                            'histogram', ('function',))
+DB_ROWS = register('monty_db_rows_total', 'rows returned or affected by function', 'counter', ('function',))
+SIMULATION_LATENCY = register('monty_simulation_duration_seconds', 'simulation run time by policy',
+                              'histogram', ('policy',))
+INVALIDATIONS = register('monty_cache_invalidations_total', 'cache invalidations received from other processes',
+                         'counter', ('kind',))
+
+def observe_after(body: object, start: float, latency: Histogram, status: Counter):
+    """Generator used to record the latency and status of
+    a request once a streaming response body has been consumed
+
+    Arguments:
+        body: iterable response body
+        start: float perf_counter value at the start of the request
+        latency: Histogram of request latency
+        status: Counter of requests with the response status
+    Returns:
+        generator of response chunks
+    """
+    try:
+        yield from body
+    finally:
+        latency.observe(perf_counter() - start)
+        status.inc()
+        if hasattr(body, 'close'):
+            body.close()
+
+class InstrumentationPlugin:
+    """Bottle plugin used to record latency and status
+    codes of all routes. Should be installed before all
+    other plugins so that rejected requests are recorded.
+    Latency of streamed responses includes the time taken
+    to consume the response body"""
+
+    def setup(self, app: object):
+        """Function used to check that plugin has not been
+        added to bottle application twice"""
+        for plugin in app.plugins:
+            if isinstance(plugin, InstrumentationPlugin):
+                raise RuntimeError('instrumentation plugin already applied to application')
+
+    def apply(self, callback: object, context: object):
+        """Function used to apply instrumentation decorator
+        to bottle application"""
+        latency = REQUEST_LATENCY.labels(context.rule, context.method)
+
+        def wrapper(*args: tuple, **kwargs: dict):
+            start, status, streamed = perf_counter(), 500, False
+            try:
+                body = callback(*args, **kwargs)
+                status = response.status_code
+                if body is None or isinstance(body, (str, bytes, dict)):
+                    return body
+                streamed = True
+                return observe_after(body, start, latency, REQUEST_STATUS.labels(context.rule, context.method, status))
+            except HTTPResponse as err:
+                status = err.status_code
+                raise
+            finally:
+                if not streamed:
+                    latency.observe(perf_counter() - start)
+                    REQUEST_STATUS.labels(context.rule, context.method, status).inc()
+        return wrapper
@@ -0,0 +1,65 @@
+"""Module containing internal API functions. The internal
+API is served on a separate port that is not exposed
+through the gateway"""
+
+import logging
+import threading
+
+from bottle import Bottle, response, static_file
+
+from config import INTERNAL_LISTEN_ADDRESS, INTERNAL_LISTEN_PORT, PROFILING_DIRECTORY
+from data_models import dataclass_response, HTTPResponse
+from instrumentation import render_metrics
+from profiling import PROFILE_RECORDS
+
+
+LOGGER = logging.getLogger(__name__)
+
+INTERNAL_APP = Bottle()
+
+@INTERNAL_APP.route('/internal/metrics', method=['GET'])
+def get_internal_metrics() -> str:
+    """API route used to expose request, database and
+    simulation timings in the prometheus text format
+
+    Returns:
+        str containing rendered metrics
+    """
+    response.content_type = 'text/plain; version=0.0.4; charset=utf-8'
+    return render_metrics()
+
+@INTERNAL_APP.route('/internal/profiles', method=['GET'])
+@dataclass_response
+def list_profiles() -> HTTPResponse:
+    """API route used to list the most recent request
+    profiles, newest first
+
+    Returns:
+        HTTPResponse containing profile records
+    """
+    return HTTPResponse(success=True, http_code=200, payload=list(reversed(PROFILE_RECORDS)))
+
+@INTERNAL_APP.route('/internal/profiles/<filename>', method=['GET'])
+def get_profile(filename: str) -> object:
+    """API route used to download a saved profile
+
+    Arguments:
+        filename: str name of profile file
+    Returns:
+        file containing profile
+    """
+    return static_file(filename, root=PROFILING_DIRECTORY, download=True)
+
+def start_internal_server() -> threading.Thread:
+    """Function used to serve the internal API from
+    a background thread
+
+    Returns:
+        Thread object running the server
+    """
+    LOGGER.info('starting internal API on %s:%s', INTERNAL_LISTEN_ADDRESS, INTERNAL_LISTEN_PORT)
+    thread = threading.Thread(target=INTERNAL_APP.run, daemon=True, kwargs={
+        'host': INTERNAL_LISTEN_ADDRESS, 'port': INTERNAL_LISTEN_PORT, 'server': 'waitress', 'quiet': True
+    })
+    thread.start()
+    return thread
@@ -0,0 +1,117 @@
+"""module containing pooled and cached client for the
+introspection endpoint of the authentication service"""
+
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+from pydantic import ValidationError
+
+from config import AUTH_SERVICE_URL, INTROSPECTION_CONNECT_TIMEOUT, INTROSPECTION_READ_TIMEOUT, \
+    INTROSPECTION_POOL_SIZE, INTROSPECTION_CACHE_TTL, INTROSPECTION_CACHE_SIZE
+from data_models import IntrospectionResponse
+
+LOGGER = logging.getLogger(__name__)
+
+
+class InflightRequest:
+    """Class containing the result of an upstream request
+    that concurrent callers for the same user wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+class IntrospectionClient:
+    """Class used to retrieve user details from the
+    authentication service. Connections are kept alive in
+    a pool, successful responses are cached per user and
+    token digest for a fixed TTL and concurrent requests for
+    the same user and token are coalesced into a single
+    upstream request, so that a token is never answered with
+    the response to another token"""
+
+    def __init__(self, base_url: str = AUTH_SERVICE_URL, ttl: float = INTROSPECTION_CACHE_TTL,
+                 cache_size: int = INTROSPECTION_CACHE_SIZE, pool_size: int = INTROSPECTION_POOL_SIZE,
+                 timeout: tuple = (INTROSPECTION_CONNECT_TIMEOUT, INTROSPECTION_READ_TIMEOUT)):
+        self.url, self.ttl, self.cache_size, self.timeout = base_url + '/user', ttl, cache_size, timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._cache, self._inflight = OrderedDict(), {}
+        self._lock = threading.Lock()
+
+    def fetch(self, uid: str, token: str) -> IntrospectionResponse:
+        """Function used to retrieve user details from
+        the authentication service without caching
+
+        Arguments:
+            uid: str ID of user
+            token: str access token of user
+        Returns:
+            IntrospectionResponse or None if request failed
+        """
+        try:
+            response = self.session.post(self.url, data={'uid': uid, 'token': token}, timeout=self.timeout)
+            response.raise_for_status()
+            return IntrospectionResponse(**response.json())
+        except (requests.RequestException, ValueError, ValidationError):
+            LOGGER.exception('unable to retrieve user details from authentication server')
+
+    def get_user_details(self, uid: str, token: str) -> IntrospectionResponse:
+        """Function used to retrieve user details from the
+        cache or the authentication service
+
+        Arguments:
+            uid: str ID of user
+            token: str access token of user
+        Returns:
+            IntrospectionResponse or None if request failed
+        """
+        key = (uid, hashlib.sha256(token.encode()).digest())
+        with self._lock:
+            if (entry := self._cache.get(key)) is not None and entry[0] > time.monotonic():
+                self._cache.move_to_end(key)
+                return entry[1]
+            if (inflight := self._inflight.get(key)) is None:
+                inflight = self._inflight[key] = InflightRequest()
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            inflight.done.wait(sum(self.timeout))
+            return inflight.result
+
+        try:
+            inflight.result = self.fetch(uid, token)
+            if inflight.result is not None and inflight.result.success:
+                self.cache(key, inflight.result)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            inflight.done.set()
+        return inflight.result
+
+    def cache(self, key: tuple, details: IntrospectionResponse):
+        """Function used to add user details to the cache
+        under a key of user ID and token digest"""
+        with self._lock:
+            self._cache[key] = (time.monotonic() + self.ttl, details)
+            self._cache.move_to_end(key)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def invalidate(self, uid: str):
+        """Function used to remove all tokens of a user
+        from the cache"""
+        with self._lock:
+            for key in [key for key in self._cache if key[0] == uid]:
+                del self._cache[key]
+
+INTROSPECTION_CLIENT = IntrospectionClient()
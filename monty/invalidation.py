@@ -0,0 +1,124 @@
+"""module containing the listener used to keep cached data
+coherent between monty processes. Write paths notify all
+processes of changed users with postgres NOTIFY and every
+process invalidates its cached data of those users. Any
+notifications missed while disconnected cannot be recovered,
+so all cached data is dropped whenever the listener connects
+
+    python invalidation.py
+"""
+
+import logging
+import json
+import select
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+
+from config import INVALIDATION_CHANNEL, INVALIDATION_POLL_INTERVAL, INVALIDATION_RECONNECT_DELAY
+from persistence import persistence
+from versioning import PROCESS_ID, invalidate_user
+from instrumentation import INVALIDATIONS
+
+LOGGER = logging.getLogger(__name__)
+
+
+class InvalidationListener:
+    """Class used to listen for invalidation notifications
+    from a background thread. The connection is checked every
+    poll interval and re-established after failures"""
+
+    def __init__(self, channel: str = INVALIDATION_CHANNEL, poll_interval: float = INVALIDATION_POLL_INTERVAL,
+                 reconnect_delay: float = INVALIDATION_RECONNECT_DELAY):
+        self.channel, self.poll_interval, self.reconnect_delay = channel, poll_interval, reconnect_delay
+        self.connected = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self) -> threading.Thread:
+        """Function used to start listening from a daemon thread"""
+        self._thread = threading.Thread(target=self.run, name='invalidation-listener', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        """Function used to stop listening. The connection is
+        closed at the end of the current poll interval"""
+        self._stopped.set()
+
+    def run(self):
+        """Function used to listen until stopped"""
+        while not self._stopped.is_set():
+            try:
+                self.listen()
+            except (psycopg2.Error, OSError):
+                LOGGER.exception('invalidation listener disconnected. retrying in %ss', self.reconnect_delay)
+            self.connected.clear()
+            self._stopped.wait(self.reconnect_delay)
+
+    def listen(self):
+        """Function used to listen on a single connection"""
+        with persistence() as conn:
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            conn.cursor().execute(f'LISTEN {self.channel}')
+            # notifications sent before LISTEN have been missed
+            self.flush()
+            self.connected.set()
+            LOGGER.info('listening for invalidations on channel %s', self.channel)
+            while not self._stopped.is_set():
+                if select.select([conn], [], [], self.poll_interval) == ([], [], []):
+                    # detects connections that were closed without notice
+                    conn.cursor().execute('SELECT 1')
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    self.handle(conn.notifies.pop(0).payload)
+
+    def flush(self):
+        """Function used to drop all cached data"""
+        INVALIDATIONS.labels('flush').inc()
+        LOGGER.info('invalidating all cached data')
+        invalidate_user(None)
+
+    def handle(self, payload: str):
+        """Function used to invalidate cached data of the
+        user contained in a notification
+
+        Arguments:
+            payload: str JSON payload containing uid,
+                user_version and origin
+        """
+        try:
+            message = json.loads(payload)
+            uid, version, origin = message['uid'], int(message['user_version']), message['origin']
+        except (ValueError, TypeError, KeyError):
+            LOGGER.warning('received invalid invalidation %s. invalidating all cached data', payload)
+            self.flush()
+            return
+        # changes made by this process are invalidated on commit
+        if origin == PROCESS_ID:
+            return
+        LOGGER.debug('invalidating user %s at version %s', uid, version)
+        INVALIDATIONS.labels('user').inc()
+        invalidate_user(uid, version)
+
+INVALIDATION_LISTENER = InvalidationListener()
+
+def start_invalidation_listener() -> threading.Thread:
+    """Function used to start the invalidation listener
+
+    Returns:
+        Thread object running the listener
+    """
+    return INVALIDATION_LISTENER.start()
+
+
+if __name__ == '__main__':
+
+    # runs a standalone listener that logs received invalidations
+    logging.getLogger(__name__).setLevel(logging.DEBUG)
+    start_invalidation_listener()
+    while True:
+        time.sleep(1)
@@ -0,0 +1,261 @@
+"""module containing a reproducible HTTP load test harness for the
+monty API and the identity provider. Requests to the monty API set the
+X-Authenticated-Userid header in the same way as the gateway, so both
+services can be tested locally without a gateway
+
+    python loadtest.py --duration 60 --concurrency 8 --output report.json
+"""
+
+import logging
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import numpy as np
+import requests
+
+from helpers import create_tasks
+
+LOGGER = logging.getLogger(__name__)
+
+
+DEFAULT_MIX = 'create=10,list=30,patch=15,simulation=5,metrics=15,signup=5,token=20'
+PASSWORD = 'loadtest-password'
+
+
+class LoadTestState:
+    """Class containing seeded users and tasks shared
+    between all load test workers"""
+
+    def __init__(self, monty_url: str, auth_url: str):
+        self.monty_url, self.auth_url = monty_url, auth_url
+        self.users, self.tasks = [], defaultdict(list)
+        self._lock = threading.Lock()
+
+    def add_task(self, uid: str, task_id: str):
+        """Function used to register a created task"""
+        with self._lock:
+            self.tasks[uid].append(task_id)
+
+    def add_user(self, uid: str):
+        """Function used to register a created user"""
+        with self._lock:
+            self.users.append(uid)
+
+def new_task_body(task: dict, offset: timedelta) -> dict:
+    """Function used to convert a synthetic task into a new
+    task request. Deadlines are shifted by the given offset
+    so that they lie in the future"""
+    deadline = datetime.fromisoformat(task['deadline']) + offset
+    return {
+        'task_title': task.get('task_title', task['content']),
+        'content': task['content'],
+        'priority': task['priority'],
+        'duration': task['duration'],
+        'deadline': deadline.date().isoformat()
+    }
+
+def create(session: requests.Session, state: LoadTestState, rng: random.Random) -> requests.Response:
+    """Function used to create a single task for a random user"""
+    uid = rng.choice(state.users)
+    body = {'task_title': 'load test task', 'content': 'load test task', 'priority': rng.randint(1, 100),
+            'duration': rng.randint(1, 24), 'deadline': (datetime.utcnow() + timedelta(days=rng.randint(1, 14))).date().isoformat()}
+    response = session.post(state.monty_url + '/monty/task', json=body, headers={'X-Authenticated-Userid': uid})
+    if response.ok:
+        state.add_task(uid, response.json()['payload']['task_id'])
+    return response
+
+def list_tasks(session: requests.Session, state: LoadTestState, rng: random.Random) -> requests.Response:
+    """Function used to list the tasks of a random user"""
+    params = {'fetch_completed': rng.choice(['true', 'false'])}
+    return session.get(state.monty_url + '/monty/tasks', params=params,
+                       headers={'X-Authenticated-Userid': rng.choice(state.users)})
+
+def patch(session: requests.Session, state: LoadTestState, rng: random.Random) -> requests.Response:
+    """Function used to update the remaining hours of a random
+    task or complete it. Returns None without sending a request
+    if no user has any tasks"""
+    if not (uids := [uid for uid in state.users if state.tasks.get(uid)]):
+        return None
+    uid = rng.choice(uids)
+    task_id = rng.choice(state.tasks[uid])
+    operation = 'COMPLETE' if rng.random() < 0.1 else 'UPDATE'
+    return session.patch(state.monty_url + '/monty/task/' + task_id, params={'operation': operation},
+                         json={'remaining_hours': rng.randint(1, 24)}, headers={'X-Authenticated-Userid': uid})
+
+def simulation(session: requests.Session, state: LoadTestState, rng: random.Random) -> requests.Response:
+    """Function used to run the simulation of a random user"""
+    return session.get(state.monty_url + '/monty/simulation', headers={'X-Authenticated-Userid': rng.choice(state.users)})
+
+def metrics(session: requests.Session, state: LoadTestState, rng: random.Random) -> requests.Response:
+    """Function used to retrieve the metrics of a random user"""
+    end = datetime.utcnow() + timedelta(days=1)
+    start = end - timedelta(days=rng.choice([7, 30, 365]))
+    return session.get(f'{state.monty_url}/monty/metrics/{start.isoformat()}/{end.isoformat()}',
+                       headers={'X-Authenticated-Userid': rng.choice(state.users)})
+
+def signup(session: requests.Session, state: LoadTestState, rng: random.Random) -> requests.Response:
+    """Function used to sign up a new user"""
+    uid = 'loadtest-' + uuid.UUID(int=rng.getrandbits(128)).hex
+    return session.post(state.auth_url + '/authenticate/signup',
+                        json={'uid': uid, 'password': PASSWORD, 'email': uid + '@loadtest.local'})
+
+def token(session: requests.Session, state: LoadTestState, rng: random.Random) -> requests.Response:
+    """Function used to request a token for a seeded user"""
+    return session.post(state.auth_url + '/authenticate/token', json={'uid': rng.choice(state.users), 'password': PASSWORD})
+
+OPERATIONS = {
+    'create': create,
+    'list': list_tasks,
+    'patch': patch,
+    'simulation': simulation,
+    'metrics': metrics,
+    'signup': signup,
+    'token': token
+}
+
+def parse_mix(value: str) -> dict:
+    """Function used to parse an operation mix from a string
+    in the format operation=weight,operation=weight"""
+    mix = {}
+    for item in value.split(','):
+        operation, _, weight = item.strip().partition('=')
+        if operation not in OPERATIONS:
+            raise ValueError(f'invalid operation {operation}')
+        mix[operation] = float(weight)
+    return mix
+
+def seed(state: LoadTestState, users: int, tasks_per_user: int, seed_value: int):
+    """Function used to seed users in the identity provider and
+    tasks in the monty API. Tasks are generated with the synthetic
+    task generator
+
+    Arguments:
+        state: LoadTestState to seed
+        users: int number of users to create
+        tasks_per_user: int number of tasks to create per user
+        seed_value: int random seed
+    """
+    session = requests.Session()
+    # synthetic tasks are generated relative to a fixed date
+    offset = datetime.utcnow() - datetime(2020, 8, 9)
+    for i in range(users):
+        uid = f'loadtest-{seed_value}-{i}'
+        response = session.post(state.auth_url + '/authenticate/signup',
+                                json={'uid': uid, 'password': PASSWORD, 'email': uid + '@loadtest.local'})
+        if not response.ok:
+            LOGGER.warning('unable to sign up user %s: %s', uid, response.text)
+        state.add_user(uid)
+        for task in create_tasks(tasks_per_user, seed=seed_value + i):
+            response = session.post(state.monty_url + '/monty/task', json=new_task_body(task, offset),
+                                    headers={'X-Authenticated-Userid': uid})
+            response.raise_for_status()
+            state.add_task(uid, response.json()['payload']['task_id'])
+    LOGGER.info('seeded %s users with %s tasks each', users, tasks_per_user)
+
+def worker(state: LoadTestState, mix: dict, deadline: float, rng: random.Random, results: dict, skipped: dict):
+    """Function used to send requests until the deadline. Latencies
+    and status codes are recorded per operation in results and
+    operations that could not send a request are counted in skipped"""
+    session, operations, weights = requests.Session(), list(mix), list(mix.values())
+    while time.monotonic() < deadline:
+        operation = rng.choices(operations, weights)[0]
+        start = time.perf_counter()
+        try:
+            if (response := OPERATIONS[operation](session, state, rng)) is None:
+                skipped[operation] += 1
+                continue
+            status = response.status_code
+        except (requests.RequestException, ValueError, KeyError):
+            status = 0
+        results[operation].append((time.perf_counter() - start, status))
+
+def summarize(results: dict, elapsed: float, skipped: dict = None) -> dict:
+    """Function used to aggregate recorded requests into
+    throughput, latency percentiles and error rates. Skipped
+    operations are reported separately and are not requests"""
+    routes, skipped = {}, skipped or {}
+    for operation in sorted(set(results) | set(skipped)):
+        if not (samples := results.get(operation)):
+            routes[operation] = {'requests': 0, 'skipped': skipped[operation]}
+            continue
+        latencies = np.array([latency for latency, _ in samples]) * 1000
+        statuses = defaultdict(int)
+        for _, status in samples:
+            statuses[str(status)] += 1
+        errors = sum(count for status, count in statuses.items() if status == '0' or int(status) >= 400)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        routes[operation] = {
+            'requests': len(samples),
+            'throughput': round(len(samples) / elapsed, 2),
+            'error_rate': round(errors / len(samples), 4),
+            'latency_ms': {'mean': round(float(latencies.mean()), 2), 'p50': round(float(p50), 2),
+                           'p95': round(float(p95), 2), 'p99': round(float(p99), 2),
+                           'max': round(float(latencies.max()), 2)},
+            'status_codes': dict(statuses),
+            'skipped': skipped.get(operation, 0)
+        }
+    total = sum(route['requests'] for route in routes.values())
+    return {'requests': total, 'throughput': round(total / elapsed, 2), 'routes': routes}
+
+def run_load_test(monty_url: str, auth_url: str, mix: dict, duration: float, concurrency: int,
+                  users: int, tasks_per_user: int, seed_value: int) -> dict:
+    """Function used to seed both services and run a load
+    test with the given operation mix
+
+    Returns:
+        dict containing load test report
+    """
+    state = LoadTestState(monty_url.rstrip('/'), auth_url.rstrip('/'))
+    seed(state, users, tasks_per_user, seed_value)
+
+    deadline, worker_results = time.monotonic() + duration, [defaultdict(list) for _ in range(concurrency)]
+    worker_skipped = [defaultdict(int) for _ in range(concurrency)]
+    threads = [threading.Thread(target=worker, args=(state, mix, deadline, random.Random(seed_value + i), *counters))
+               for i, counters in enumerate(zip(worker_results, worker_skipped))]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+
+    results, skipped = defaultdict(list), defaultdict(int)
+    for worker_result, worker_skip in zip(worker_results, worker_skipped):
+        for operation, samples in worker_result.items():
+            results[operation].extend(samples)
+        for operation, count in worker_skip.items():
+            skipped[operation] += count
+    report = summarize(results, elapsed, skipped)
+    report['config'] = {'mix': mix, 'duration': duration, 'concurrency': concurrency, 'users': users,
+                        'tasks_per_user': tasks_per_user, 'seed': seed_value}
+    report['elapsed'] = round(elapsed, 2)
+    return report
+
+
+if __name__ == '__main__':
+
+    arg_parser = argparse.ArgumentParser(description='monty load test harness')
+    arg_parser.add_argument('--monty-url', default='http://localhost:10999')
+    arg_parser.add_argument('--auth-url', default='http://localhost:10081')
+    arg_parser.add_argument('--mix', default=DEFAULT_MIX, help='operation weights e.g. list=10,simulation=1')
+    arg_parser.add_argument('--duration', type=float, default=30)
+    arg_parser.add_argument('--concurrency', type=int, default=8)
+    arg_parser.add_argument('--users', type=int, default=20)
+    arg_parser.add_argument('--tasks-per-user', type=int, default=200)
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--output', default=None, help='path of JSON report. printed if not set')
+    args = arg_parser.parse_args()
+
+    report = run_load_test(args.monty_url, args.auth_url, parse_mix(args.mix), args.duration, args.concurrency,
+                           args.users, args.tasks_per_user, args.seed)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
@@ -3,7 +3,7 @@
 import logging
 from datetime import datetime
 
-from persistence import get_user_tasks_in_range
+from backends import get_user_tasks_in_range
 from data_models import UserMetrics, Task
 
 LOGGER = logging.getLogger(__name__)
@@ -0,0 +1,63 @@
+"""module containing the one-shot migration of the task
+schema. Migrations take exclusive locks and adding the
+search column rewrites the task tables, so they are run
+once per deployment before the API is started rather than
+by the API itself. All statements are idempotent and run
+in a single transaction
+
+    python migrate.py
+"""
+
+import logging
+
+from config import SEARCH_CONFIG
+from persistence import persistence, TASK_TABLE_COLUMNS
+
+LOGGER = logging.getLogger(__name__)
+
+# weighted text search document of a task. maintained by postgres
+# in a generated column of both task tables
+SEARCH_VECTOR_SQL = (f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(task_title, '')), 'A') || "
+                     f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(content, '')), 'B')")
+
+# completed tasks are moved from the tasks table into the archive
+# table. reads of all tasks go through the all_tasks view, while
+# reads of open tasks only touch the tasks table and its indexes.
+# search indexes include the uid so that searches are scoped to
+# the tasks of a single user. new columns of the view must be
+# appended so that the view can be replaced without dropping it
+TASK_MIGRATIONS = [
+    'CREATE EXTENSION IF NOT EXISTS btree_gin',
+    'ALTER TABLE tasks ADD COLUMN IF NOT EXISTS hours_added integer NOT NULL DEFAULT 0',
+    f'ALTER TABLE tasks ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ({SEARCH_VECTOR_SQL}) STORED',
+    'CREATE TABLE IF NOT EXISTS tasks_archive (LIKE tasks INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED)',
+    'ALTER TABLE tasks_archive ADD COLUMN IF NOT EXISTS hours_added integer NOT NULL DEFAULT 0',
+    f'ALTER TABLE tasks_archive ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ({SEARCH_VECTOR_SQL}) STORED',
+    'CREATE UNIQUE INDEX IF NOT EXISTS tasks_archive_task_id ON tasks_archive(task_id)',
+    'CREATE INDEX IF NOT EXISTS tasks_archive_uid_created ON tasks_archive(uid, created)',
+    'CREATE INDEX IF NOT EXISTS tasks_open_uid ON tasks(uid) WHERE completion_date IS NULL',
+    'CREATE INDEX IF NOT EXISTS tasks_completion_date ON tasks(completion_date) WHERE completion_date IS NOT NULL',
+    'CREATE INDEX IF NOT EXISTS tasks_search ON tasks USING GIN (uid, search_vector)',
+    'CREATE INDEX IF NOT EXISTS tasks_archive_search ON tasks_archive USING GIN (uid, search_vector)',
+    'CREATE TABLE IF NOT EXISTS duration_calibration (uid text PRIMARY KEY, count bigint NOT NULL DEFAULT 0, '
+    "mean double precision NOT NULL DEFAULT 0, m2 double precision NOT NULL DEFAULT 0, sketch bytea NOT NULL DEFAULT '', "
+    'updated timestamp)',
+    'CREATE TABLE IF NOT EXISTS user_versions (uid text PRIMARY KEY, version bigint NOT NULL)',
+    f'CREATE OR REPLACE VIEW all_tasks AS SELECT {TASK_TABLE_COLUMNS},search_vector FROM tasks '
+    f'UNION ALL SELECT {TASK_TABLE_COLUMNS},search_vector FROM tasks_archive'
+]
+
+def migrate():
+    """Function used to create the archive table, the all_tasks
+    view, the search and calibration columns, the calibration
+    table and their indexes if they do not exist"""
+    with persistence() as conn:
+        cursor = conn.cursor()
+        for statement in TASK_MIGRATIONS:
+            LOGGER.info('running migration %s', statement.split(' AS ')[0])
+            cursor.execute(statement)
+        conn.commit()
+
+if __name__ == '__main__':
+
+    migrate()
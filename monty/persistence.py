@@ -6,12 +6,17 @@ import uuid
 
 from datetime import timedelta, datetime
 from contextlib import contextmanager
+from time import perf_counter
 
 import psycopg2
 import psycopg2.extras
 
-from config import POSTGRES_HOST, POSTGRES_PORT, POSTGRES_DB, POSTGRES_USER, POSTGRES_PASSWORD
+from config import POSTGRES_HOST, POSTGRES_PORT, POSTGRES_DB, POSTGRES_USER, POSTGRES_PASSWORD, \
+    TASK_STREAM_BATCH_SIZE, INVALIDATION_CHANNEL, SEARCH_CONFIG
 from data_models import NewTaskRequest
+from calibration import DurationCalibration, effort_ratio
+from versioning import PROCESS_ID, invalidate_user
+from instrumentation import DB_QUERY_LATENCY, DB_ROWS
 
 LOGGER = logging.getLogger(__name__)
 
@@ -34,70 +39,440 @@ def persistence():
         if connection is not None:
             connection.close()
 
+class CountingCursor(psycopg2.extras.RealDictCursor):
+    """Cursor used to count the rows returned or affected by
+    all executed statements. The rowcount of a cursor only
+    refers to the last statement, which for writes is usually
+    the version update of commit_user_changes"""
+
+    def __init__(self, *args: tuple, **kwargs: dict):
+        super().__init__(*args, **kwargs)
+        self.total_rowcount = 0
+
+    def execute(self, query: str, args: object = None):
+        """Function used to execute a statement and add
+        its row count to the total of the cursor"""
+        super().execute(query, args)
+        self.total_rowcount += max(self.rowcount, 0)
+
 def database_function(func: object):
     """Wrapper used to insert database connection
-    and cursor into function call arguments"""
+    and cursor into function call arguments. Query time
+    and row counts of all statements are recorded per
+    function"""
+    latency, rows = DB_QUERY_LATENCY.labels(func.__name__), DB_ROWS.labels(func.__name__)
     def wrapper(*args: tuple, **kwargs: dict):
         with persistence() as conn:
-            cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-            return func(conn, cursor, *args, **kwargs)
+            cursor = conn.cursor(cursor_factory=CountingCursor)
+            start = perf_counter()
+            try:
+                return func(conn, cursor, *args, **kwargs)
+            finally:
+                latency.observe(perf_counter() - start)
+                if cursor.total_rowcount:
+                    rows.inc(cursor.total_rowcount)
     return wrapper
 
+def commit_user_changes(conn: object, cursor: object, uids: set):
+    """Function used to commit changes to the data of a set of
+    users. The persisted version of every user is incremented
+    and a notification containing the new version is sent as
+    part of the transaction, so that other processes invalidate
+    their cached data if and only if the changes are committed.
+    Cached data of this process is invalidated once the changes
+    are committed
+
+    Arguments:
+        conn: postgres connection
+        cursor: cursor used to make changes
+        uids: set of user IDs whose data was changed
+    """
+    uids, versions = sorted({str(uid) for uid in uids}), {}
+    if uids:
+        cursor.execute('WITH versions AS (INSERT INTO user_versions(uid, version) SELECT uid, 1 FROM unnest(%s::text[]) AS uid '
+                       'ON CONFLICT (uid) DO UPDATE SET version=user_versions.version + 1 RETURNING uid, version) '
+                       "SELECT uid, version, pg_notify(%s, json_build_object('uid', uid, 'user_version', version, "
+                       "'origin', %s)::text) FROM versions", (uids, INVALIDATION_CHANNEL, PROCESS_ID))
+        versions = {row['uid']: row['version'] for row in cursor.fetchall()}
+    conn.commit()
+    for uid, version in versions.items():
+        invalidate_user(uid, version)
+
 @database_function
 def create_user_task(conn: object, cursor: object, uid: str, body: NewTaskRequest):
     """Function used to retrieve a single user details"""
     task_id, now = uuid.uuid4(), datetime.utcnow()
     args = (str(task_id), body.task_title, uid, body.content, body.priority, body.duration, body.duration, body.deadline, None, now)
     cursor.execute('INSERT INTO tasks(task_id,task_title,uid,content,priority,duration,hours_remaining,deadline,completion_date,created) VALUES(%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)', args)
-    conn.commit()
+    commit_user_changes(conn, cursor, {uid})
     return task_id
 
+def observe_duration(cursor: object, uid: str, ratio: float):
+    """Function used to add the ratio of actual to planned hours
+    of a completed task to the calibration of a user. The row of
+    the user is locked until the transaction is committed, so
+    concurrent completions are applied one after the other
+
+    Arguments:
+        cursor: cursor of the transaction completing the task
+        uid: str ID of user
+        ratio: float ratio of actual to planned hours
+    """
+    cursor.execute('INSERT INTO duration_calibration(uid) VALUES(%s) ON CONFLICT DO NOTHING', (uid,))
+    cursor.execute('SELECT count,mean,m2,sketch FROM duration_calibration WHERE uid=%s FOR UPDATE', (uid,))
+    calibration = DurationCalibration.from_row(cursor.fetchone())
+    calibration.observe(ratio)
+    row = calibration.to_row()
+    cursor.execute('UPDATE duration_calibration SET count=%s,mean=%s,m2=%s,sketch=%s,updated=%s WHERE uid=%s',
+                   (row['count'], row['mean'], row['m2'], psycopg2.Binary(row['sketch']), datetime.utcnow(), uid))
+
+# tables containing tasks. archived tasks can still be updated
+TASK_TABLES = ['tasks', 'tasks_archive']
+
 @database_function
-def complete_task(conn: object, cursor: object, task_id: str, body):
-    """Function used to retrieve a single user details"""
-    cursor.execute('UPDATE tasks SET completion_date=%s WHERE task_id=%s', (datetime.utcnow(), task_id))
-    conn.commit()
+def complete_task(conn: object, cursor: object, task_id: str, body) -> bool:
+    """Function used to mark an active or archived task as
+    completed. The first completion of a task updates the
+    duration calibration of its user in the same transaction
+
+    Returns:
+        bool True if task exists else False
+    """
+    for table in TASK_TABLES:
+        cursor.execute(f'UPDATE {table} SET completion_date=%s FROM (SELECT task_id,completion_date FROM {table} '
+                       f'WHERE task_id=%s FOR UPDATE) previous WHERE {table}.task_id=previous.task_id RETURNING uid,'
+                       'duration,hours_added,hours_remaining,previous.completion_date IS NOT NULL AS completed',
+                       (datetime.utcnow(), task_id))
+        if rows := cursor.fetchall():
+            break
+    for row in rows:
+        ratio = effort_ratio(row['duration'], row['hours_added'], row['hours_remaining'],
+                             getattr(body, 'actual_hours', None))
+        if not row['completed'] and ratio is not None:
+            observe_duration(cursor, row['uid'], ratio)
+    commit_user_changes(conn, cursor, {row['uid'] for row in rows})
+    return bool(rows)
 
 @database_function
-def update_task_hours(conn: object, cursor: object, task_id: str, body):
-    """Function used to retrieve a single user details"""
-    if body.remaining_hours:
-        LOGGER.debug('updating task with body %s', body)
-        cursor.execute('UPDATE tasks SET hours_remaining=%s WHERE task_id=%s', (body.remaining_hours, task_id))
-        conn.commit()
-    else:
+def update_task_hours(conn: object, cursor: object, task_id: str, body) -> bool:
+    """Function used to update the remaining hours of an active
+    or archived task. Increases of remaining hours are added up
+    in hours_added
+
+    Returns:
+        bool True if task exists or no hours were given else False
+    """
+    if not body.remaining_hours:
         LOGGER.warning('received no update hours')
+        return True
+    LOGGER.debug('updating task with body %s', body)
+    for table in TASK_TABLES:
+        cursor.execute(f'UPDATE {table} SET hours_remaining=%s,hours_added=hours_added + GREATEST(%s - hours_remaining, 0) '
+                       'WHERE task_id=%s RETURNING uid', (body.remaining_hours, body.remaining_hours, task_id))
+        if rows := cursor.fetchall():
+            break
+    commit_user_changes(conn, cursor, {row['uid'] for row in rows})
+    return bool(rows)
 
 @database_function
 def get_user_tasks(conn: object, cursor: object, uid: str):
     """Function used to retrieve a single user details"""
-    cursor.execute('SELECT task_id,task_title,content,priority,duration,deadline,completion_date,created,hours_remaining FROM tasks WHERE uid=%s', (uid,))
+    cursor.execute('SELECT task_id,task_title,content,priority,duration,deadline,completion_date,created,hours_remaining FROM all_tasks WHERE uid=%s', (uid,))
     return cursor.fetchall()
 
+def array_agg_sql(columns: list) -> str:
+    """Function used to generate an SQL expression that
+    aggregates columns into arrays. Columns may be cast
+    using column::type
+
+    Arguments:
+        columns: list of columns to aggregate
+    Returns:
+        str containing SQL expression
+    """
+    return ','.join(f"COALESCE(array_agg({column}), '{{}}') AS {column.split('::')[0]}" for column in columns)
+
+TEAM_TASK_COLUMNS = ['uid', 'duration', 'deadline', 'priority', 'completion_date']
+SCHEDULE_TASK_COLUMNS = ['task_id::text', 'duration', 'deadline', 'priority']
+
+@database_function
+def get_team_task_columns(conn: object, cursor: object, uids: list) -> dict:
+    """Function used to retrieve the simulated columns of all
+    tasks of a list of users in a single query. Columns are
+    aggregated into arrays by postgres so that a single row
+    is returned regardless of the number of tasks
+
+    Arguments:
+        uids: list of user IDs
+    Returns:
+        dict mapping column names to lists of values
+    """
+    cursor.execute(f'SELECT {array_agg_sql(TEAM_TASK_COLUMNS)} FROM all_tasks WHERE uid=ANY(%s)', (list(uids),))
+    return cursor.fetchone()
+
+@database_function
+def get_schedule_task_columns(conn: object, cursor: object, uid: str) -> dict:
+    """Function used to retrieve the columns of all tasks
+    of a user that are required to project a schedule
+
+    Arguments:
+        uid: str ID of user
+    Returns:
+        dict mapping column names to lists of values
+    """
+    cursor.execute(f'SELECT {array_agg_sql(SCHEDULE_TASK_COLUMNS)} FROM all_tasks WHERE uid=%s', (uid,))
+    return cursor.fetchone()
+
+def isoformat_sql(column: str) -> str:
+    """Function used to generate an SQL expression that renders
+    a timestamp column in the same format as datetime.isoformat()
+    i.e. microseconds are only included when non-zero. Note
+    that the expression is escaped for use in parameterized
+    queries
+
+    Arguments:
+        column: str name of column to render
+    Returns:
+        str containing SQL expression
+    """
+    return (f"CASE WHEN {column} IS NULL THEN NULL "
+            f"WHEN date_part('microseconds', {column}::timestamp)::int %% 1000000 = 0 "
+            f"THEN to_char({column}::timestamp, 'YYYY-MM-DD\"T\"HH24:MI:SS') "
+            f"ELSE to_char({column}::timestamp, 'YYYY-MM-DD\"T\"HH24:MI:SS.US') END")
+
+# JSON rendering of the task columns used in get_user_tasks. Column
+# order matches the field order of the Task model so that the rendered
+# objects are identical to the serialized pydantic models
+TASK_JSON_COLUMNS = ','.join([
+    'task_id', 'task_title', 'content', 'priority', 'duration', 'hours_remaining',
+    isoformat_sql('created') + ' AS created',
+    isoformat_sql('deadline') + ' AS deadline',
+    isoformat_sql('completion_date') + ' AS completion_date'
+])
+
+def user_tasks_json_query(fetch_completed: bool) -> str:
+    """Function used to generate the query used to select
+    the JSON rendered tasks of a given user
+
+    Arguments:
+        fetch_completed: bool include completed tasks if True
+    Returns:
+        str containing SQL query with uid parameter
+    """
+    # open tasks are never archived
+    if not fetch_completed:
+        return f'SELECT {TASK_JSON_COLUMNS} FROM tasks WHERE uid=%s AND completion_date IS NULL'
+    return f'SELECT {TASK_JSON_COLUMNS} FROM all_tasks WHERE uid=%s'
+
+@database_function
+def get_user_tasks_json(conn: object, cursor: object, uid: str, fetch_completed: bool = False) -> str:
+    """Function used to retrieve all tasks for a given user
+    as a JSON array rendered by postgres. The array is
+    returned as raw text so that no per-row work is done
+    in python
+
+    Arguments:
+        uid: str ID of user
+        fetch_completed: bool include completed tasks if True
+    Returns:
+        str containing JSON array of tasks
+    """
+    cursor.execute(f'SELECT COALESCE(json_agg(t), \'[]\')::text AS tasks FROM ({user_tasks_json_query(fetch_completed)}) t', (uid,))
+    return cursor.fetchone()['tasks']
+
+def stream_user_tasks_json(uid: str, fetch_completed: bool = False, batch_size: int = TASK_STREAM_BATCH_SIZE):
+    """Generator used to stream the tasks of a given user
+    as newline delimited JSON. Rows are fetched in batches
+    from a server side cursor so that memory usage does not
+    depend on the number of tasks
+
+    Arguments:
+        uid: str ID of user
+        fetch_completed: bool include completed tasks if True
+        batch_size: int number of rows fetched per round trip
+    Returns:
+        generator of str chunks containing NDJSON lines
+    """
+    with persistence() as conn:
+        cursor = conn.cursor(name='tasks_' + uuid.uuid4().hex)
+        cursor.itersize = batch_size
+        cursor.execute(f'SELECT row_to_json(t)::text FROM ({user_tasks_json_query(fetch_completed)}) t', (uid,))
+        while (rows := cursor.fetchmany(batch_size)):
+            yield ''.join(row[0] + '\n' for row in rows)
+
+def stream_tasks(uid: str = None, batch_size: int = TASK_STREAM_BATCH_SIZE):
+    """Generator used to stream all tasks, or the tasks of a
+    given user, in batches from a server side cursor
+
+    Arguments:
+        uid: str ID of user. all tasks are returned if not set
+        batch_size: int number of rows fetched per round trip
+    Returns:
+        generator of lists of task dicts
+    """
+    query = ('SELECT task_id::text,uid,task_title,content,priority,duration,hours_remaining,created,deadline,'
+             'completion_date FROM all_tasks')
+    with persistence() as conn:
+        cursor = conn.cursor(name='tasks_' + uuid.uuid4().hex, cursor_factory=psycopg2.extras.RealDictCursor)
+        cursor.itersize = batch_size
+        cursor.execute(query + (' WHERE uid=%s' if uid is not None else ''), (uid,) if uid is not None else None)
+        while (rows := cursor.fetchmany(batch_size)):
+            yield rows
+
+def copy_tasks(data: object, columns: list, uids: set):
+    """Function used to bulk load tasks into the tasks
+    table using COPY
+
+    Arguments:
+        data: file like object containing tab separated rows
+        columns: list of column names in the order of the rows
+        uids: set of user IDs contained in the rows
+    """
+    with persistence() as conn:
+        cursor = conn.cursor()
+        cursor.copy_expert(f'COPY tasks({",".join(columns)}) FROM STDIN', data)
+        commit_user_changes(conn, cursor, uids)
+
+def search_query(terms: list, prefix: bool = True) -> str:
+    """Function used to build a text search query matching all
+    terms. Terms must only contain word characters
+
+    Arguments:
+        terms: list of str search terms
+        prefix: bool match the last term as a prefix if True
+    Returns:
+        str containing query in the to_tsquery format
+    """
+    return ' & '.join(terms[:-1] + [terms[-1] + (':*' if prefix else '')]) if terms else ''
+
+@database_function
+def search_user_tasks(conn: object, cursor: object, uid: str, terms: list, limit: int, after: tuple = None,
+                      fetch_completed: bool = False, prefix: bool = True) -> list:
+    """Function used to search the titles and content of the
+    tasks of a user. Matches are ranked with titles weighted above
+    content and returned in pages of rank and task ID, so only the
+    matching rows of a single page are rendered
+
+    Arguments:
+        uid: str ID of user
+        terms: list of str search terms
+        limit: int max number of tasks to return
+        after: tuple containing (rank, task_id) of the last task
+            of the previous page
+        fetch_completed: bool include completed tasks if True
+        prefix: bool match the last term as a prefix if True
+    Returns:
+        list of dicts containing JSON rendered task columns and rank
+    """
+    table = 'all_tasks' if fetch_completed else 'tasks'
+    rank, task_id = after if after is not None else (None, None)
+    cursor.execute(f'SELECT * FROM (SELECT {TASK_JSON_COLUMNS},ts_rank_cd(search_vector, query) AS rank '
+                   f"FROM {table}, to_tsquery('{SEARCH_CONFIG}', %s) query WHERE uid=%s AND search_vector @@ query"
+                   f"{'' if fetch_completed else ' AND completion_date IS NULL'}) matches "
+                   'WHERE %s::real IS NULL OR rank < %s::real OR (rank = %s::real AND task_id > %s::uuid) '
+                   'ORDER BY rank DESC, task_id LIMIT %s', (search_query(terms, prefix), uid, rank, rank, rank, task_id, limit))
+    return cursor.fetchall()
+
+@database_function
+def get_duration_calibrations(conn: object, cursor: object, uids: list) -> dict:
+    """Function used to retrieve the duration calibrations
+    of a list of users. Users without completed tasks are
+    returned with empty calibrations
+
+    Arguments:
+        uids: list of user IDs
+    Returns:
+        dict mapping user IDs to DurationCalibration objects
+    """
+    cursor.execute('SELECT uid,count,mean,m2,sketch FROM duration_calibration WHERE uid=ANY(%s)', (list(uids),))
+    calibrations = {row['uid']: DurationCalibration.from_row(row) for row in cursor.fetchall()}
+    return {uid: calibrations.get(uid, DurationCalibration()) for uid in uids}
+
 @database_function
 def get_user_task(conn: object, cursor: object, uid: str, task_id: str):
     """Function used to retrieve a single task for
     a given user ID"""
-    cursor.execute('SELECT task_id,task_title,content,priority,duration,deadline,completion_date,created,hours_remaining FROM tasks WHERE uid=%s AND task_id=%s', (uid, task_id))
+    cursor.execute('SELECT task_id,task_title,content,priority,duration,deadline,completion_date,created,hours_remaining FROM all_tasks WHERE uid=%s AND task_id=%s', (uid, task_id))
     return cursor.fetchone()
 
 @database_function
 def get_user_tasks_in_range(conn: object, cursor: object, uid: str, start: datetime, end: datetime):
     """Function used to retrieve user tasks in time range"""
-    cursor.execute('SELECT task_id,task_title,content,priority,duration,deadline,completion_date,created,hours_remaining FROM tasks WHERE uid=%s AND created > %s AND created < %s', (uid, start, end))
+    cursor.execute('SELECT task_id,task_title,content,priority,duration,deadline,completion_date,created,hours_remaining FROM all_tasks WHERE uid=%s AND created > %s AND created < %s', (uid, start, end))
     return cursor.fetchall()
 
 @database_function
 def get_task(conn: object, cursor: object, task_id: uuid.UUID):
     """Function used to retrieve a single user details"""
-    cursor.execute('SELECT task_id,task_title,content,priority,duration,deadline,completion_date,created,hours_remaining FROM tasks WHERE task_id=%s', (task_id,))
+    cursor.execute('SELECT task_id,task_title,content,priority,duration,deadline,completion_date,created,hours_remaining FROM all_tasks WHERE task_id=%s', (task_id,))
     return cursor.fetchone()
 
 @database_function
 def delete_task(conn: object, cursor: object, task_id: uuid.UUID):
     """Function used to retrieve a single user details"""
-    cursor.execute('DELETE FROM tasks WHERE task_id=%s', (task_id,))
-    conn.commit()
+    cursor.execute('WITH active AS (DELETE FROM tasks WHERE task_id=%s RETURNING uid), '
+                   'archived AS (DELETE FROM tasks_archive WHERE task_id=%s RETURNING uid) '
+                   'SELECT uid FROM active UNION ALL SELECT uid FROM archived', (task_id, task_id))
+    commit_user_changes(conn, cursor, {row['uid'] for row in cursor.fetchall()})
+
+
+# columns of the tasks and tasks_archive tables, excluding generated columns
+TASK_TABLE_COLUMNS = 'task_id,task_title,uid,content,priority,duration,hours_remaining,deadline,completion_date,created,' \
+    'hours_added'
+
+@database_function
+def get_user_version(conn: object, cursor: object, uid: str) -> int:
+    """Function used to retrieve the persisted data version of
+    a user, which is incremented by every committed change"""
+    cursor.execute('SELECT version FROM user_versions WHERE uid=%s', (uid,))
+    return row['version'] if (row := cursor.fetchone()) is not None else 0
+
+# relations created by migrate.py. the all_tasks view is created
+# last, so it only exists once the other migrations have been run
+TASK_SCHEMA_RELATIONS = ['tasks_archive', 'duration_calibration', 'user_versions', 'all_tasks']
+
+@database_function
+def get_missing_relations(conn: object, cursor: object) -> list:
+    """Function used to retrieve the relations of the task
+    schema that do not exist. The schema is only read
+
+    Returns:
+        list containing names of missing relations
+    """
+    cursor.execute('SELECT name FROM unnest(%s::text[]) AS name WHERE to_regclass(name) IS NULL',
+                   (TASK_SCHEMA_RELATIONS,))
+    return [row['name'] for row in cursor.fetchall()]
+
+@database_function
+def archive_completed_tasks(conn: object, cursor: object, completed_before: datetime, batch_size: int) -> int:
+    """Function used to move a batch of tasks completed before
+    a given date from the tasks table into the archive table
+    in a single transaction. Rows locked by other transactions
+    are skipped and moved by a later batch
+
+    Arguments:
+        completed_before: datetime max completion date of moved tasks
+        batch_size: int max number of tasks to move
+    Returns:
+        int number of tasks moved
+    """
+    cursor.execute('WITH moved AS (DELETE FROM tasks WHERE task_id IN (SELECT task_id FROM tasks WHERE completion_date < %s '
+                   'LIMIT %s FOR UPDATE SKIP LOCKED) RETURNING *) '
+                   f'INSERT INTO tasks_archive({TASK_TABLE_COLUMNS}) SELECT {TASK_TABLE_COLUMNS} FROM moved RETURNING uid',
+                   (completed_before, batch_size))
+    rows = cursor.fetchall()
+    # tasks are unchanged but their order in all_tasks changes
+    commit_user_changes(conn, cursor, {row['uid'] for row in rows})
+    return len(rows)
+
+@database_function
+def get_table_sizes(conn: object, cursor: object) -> dict:
+    """Function used to retrieve the number of rows and the
+    size of the tables and indexes of active and archived tasks"""
+    cursor.execute("SELECT relname AS table, n_live_tup AS rows, pg_table_size(relid) AS table_bytes, "
+                   "pg_indexes_size(relid) AS index_bytes FROM pg_stat_user_tables "
+                   "WHERE relname IN ('tasks', 'tasks_archive')")
+    return {row.pop('table'): dict(row) for row in cursor.fetchall()}
 
 
 if __name__ == '__main__':
@@ -0,0 +1,185 @@
+"""module containing on-demand request profiling plugin for monty application"""
+
+import logging
+import cProfile
+import hmac
+import os
+import re
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from datetime import datetime
+
+from bottle import request, response, HTTPResponse
+
+from config import PROFILING_ENABLED, PROFILING_TOKEN, PROFILING_SAMPLE_RATE, PROFILING_MODE, \
+    PROFILING_INTERVAL, PROFILING_DIRECTORY, PROFILING_HISTORY
+from data_models import ProfileRecord
+
+
+LOGGER = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Monty-Profile'
+
+# most recent profiles, newest last
+PROFILE_RECORDS = deque(maxlen=PROFILING_HISTORY)
+
+# only a single deterministic profiler can be active at a time
+CPROFILE_LOCK = threading.Lock()
+
+
+class DeterministicProfiler:
+    """Class used to capture a cProfile profile of the
+    current thread and save it in the pstats format"""
+    extension = 'pstats'
+
+    def __init__(self):
+        self._profile = cProfile.Profile()
+
+    def start(self) -> bool:
+        """Function used to start profiling. Returns False if
+        another request is already being profiled"""
+        if not CPROFILE_LOCK.acquire(blocking=False):
+            return False
+        self._profile.enable()
+        return True
+
+    def stop(self):
+        """Function used to stop profiling"""
+        self._profile.disable()
+        CPROFILE_LOCK.release()
+
+    def save(self, path: str):
+        """Function used to save profile to disk"""
+        self._profile.dump_stats(path)
+
+class SamplingProfiler:
+    """Class used to periodically sample the stack of the
+    current thread from a background thread. Samples are
+    saved in the collapsed stack format used by flamegraph
+    tools"""
+    extension = 'collapsed'
+
+    def __init__(self, interval: float = PROFILING_INTERVAL):
+        self.interval, self.stacks = interval, Counter()
+        self._thread_id = threading.get_ident()
+        self._stopped = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        """Function used to collect stack samples until stopped"""
+        while not self._stopped.wait(self.interval):
+            if (frame := sys._current_frames().get(self._thread_id)) is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self) -> bool:
+        """Function used to start sampling"""
+        self._sampler.start()
+        return True
+
+    def stop(self):
+        """Function used to stop sampling"""
+        self._stopped.set()
+        self._sampler.join()
+
+    def save(self, path: str):
+        """Function used to save collapsed stacks to disk"""
+        with open(path, 'w') as f:
+            f.writelines(f'{stack} {count}\n' for stack, count in self.stacks.items())
+
+PROFILERS = {
+    'cprofile': DeterministicProfiler,
+    'sampling': SamplingProfiler
+}
+
+def is_profiling_requested() -> bool:
+    """Function used to determine if the current request
+    should be profiled. Requests are profiled if they carry
+    a valid profiling token or are randomly sampled"""
+    if PROFILING_TOKEN and (token := request.headers.get(PROFILE_HEADER)) is not None:
+        return hmac.compare_digest(token.encode(), PROFILING_TOKEN.encode())
+    return PROFILING_SAMPLE_RATE > 0 and random.random() < PROFILING_SAMPLE_RATE
+
+def get_profile_filename(profile_id: str, route: str, uid: str, extension: str) -> str:
+    """Function used to generate a file name for a profile
+    that is tagged with the route and user"""
+    tags = re.sub(r'[^A-Za-z0-9_-]+', '_', f'{route}_{uid}').strip('_')
+    return f'{datetime.utcnow():%Y%m%dT%H%M%S}_{tags}_{profile_id}.{extension}'
+
+class ProfilingPlugin:
+    """Bottle plugin used to profile individual requests on
+    demand. The plugin is disabled by default and must be
+    installed after the AuthenticationPlugin"""
+
+    def __init__(self, enabled: bool = PROFILING_ENABLED, mode: str = PROFILING_MODE):
+        if mode not in PROFILERS:
+            raise ValueError(f'invalid profiling mode {mode}')
+        self.enabled, self.mode = enabled, mode
+        if enabled:
+            os.makedirs(PROFILING_DIRECTORY, exist_ok=True)
+
+    def setup(self, app: object):
+        """Function used to check that plugin has not been
+        added to bottle application twice"""
+        for plugin in app.plugins:
+            if isinstance(plugin, ProfilingPlugin):
+                raise RuntimeError('profiling plugin already applied to application')
+
+    def apply(self, callback: object, context: object):
+        """Function used to apply profiling decorator
+        to bottle application"""
+        if not self.enabled:
+            return callback
+
+        def wrapper(*args: tuple, **kwargs: dict):
+            if not is_profiling_requested():
+                return callback(*args, **kwargs)
+            profiler = PROFILERS[self.mode]()
+            if not profiler.start():
+                LOGGER.warning('skipping profile of %s. profiler already active', context.rule)
+                return callback(*args, **kwargs)
+
+            started, start, cpu_start, status = datetime.utcnow(), time.perf_counter(), time.thread_time(), 500
+            try:
+                body = callback(*args, **kwargs)
+                status = response.status_code
+                return body
+            except HTTPResponse as err:
+                status = err.status_code
+                raise
+            finally:
+                profiler.stop()
+                duration, cpu_time = time.perf_counter() - start, time.thread_time() - cpu_start
+                profile_id, uid = uuid.uuid4().hex[:8], str(getattr(request, 'uid', ''))
+                save_profile(profiler, ProfileRecord(
+                    profile_id=profile_id, mode=self.mode, method=context.method, route=context.rule,
+                    path=request.fullpath, uid=uid, status=status, started=started, duration=duration,
+                    cpu_time=cpu_time, filename=get_profile_filename(profile_id, context.rule, uid, profiler.extension)
+                ))
+        return wrapper
+
+def save_profile(profiler: object, record: ProfileRecord):
+    """Function used to save a profile to the profiling
+    directory and add it to the list of recent profiles
+
+    Arguments:
+        profiler: profiler object to save
+        record: ProfileRecord containing request details
+    """
+    try:
+        profiler.save(os.path.join(PROFILING_DIRECTORY, record.filename))
+    except OSError:
+        LOGGER.exception('unable to save profile %s', record.filename)
+        return
+    LOGGER.info('saved profile of %s %s for user %s (%.3fs) to %s', record.method, record.path,
+                record.uid, record.duration, record.filename)
+    PROFILE_RECORDS.append(record)
@@ -1,21 +1,33 @@
 """Module containing monte carlo simulation functions"""
 
 import logging
+import argparse
 import json
 import copy
 
 from datetime import datetime, timedelta
+from statistics import NormalDist
+from time import perf_counter
 from typing import List
 
 import matplotlib.pyplot as plt
 import numpy as np
 
-from config import TASK_PRIORITY_THRESHOLD
+from config import TASK_PRIORITY_THRESHOLD, APPROXIMATE_MIN_TASKS, APPROXIMATE_SAMPLE_SIZE, APPROXIMATE_ACCURACY, \
+    APPROXIMATE_TIME_BUDGET, APPROXIMATE_CONFIDENCE, APPROXIMATE_GROUPS, APPROXIMATE_MAX_FRACTION, \
+    APPROXIMATE_QUANTILE_SAMPLE
 from data_models import Task
 from helpers import get_tasks, create_tasks
+from instrumentation import SIMULATION_LATENCY
+from snapshot import TaskSnapshot
 
 LOGGER = logging.getLogger(__name__)
 
+# number of deadline and priority strata per segment of approximate simulations
+DEADLINE_STRATA, PRIORITY_STRATA = 8, 4
+# decimal digits of approximate estimates and their bounds
+BOUND_DIGITS = 4
+
 
 def get_important_tasks(tasks: List[Task]) -> List[Task]:
     """Function used to retrieve tasks that are considered
@@ -130,7 +142,9 @@ def analyse_task_set(hours_per_day: int, tasks: List[Task]) -> dict:
     """
     results = {}
     for sim_type in SORTING_FUNCTIONS:
+        start = perf_counter()
         completed, important_completed, completed_in_time = run_simulation(hours_per_day, copy.deepcopy(tasks), sim_type=sim_type)
+        SIMULATION_LATENCY.labels(sim_type).observe(perf_counter() - start)
         results[sim_type] = {
             'completed': round(completed, 2),
             'important_completed': round(important_completed, 2),
@@ -139,6 +153,408 @@ def analyse_task_set(hours_per_day: int, tasks: List[Task]) -> dict:
         LOGGER.info('completed: %s important completed: %s completed in time: %s', completed, important_completed, completed_in_time)
     return results
 
+# vectorized equivalents of SORTING_FUNCTIONS. tasks are sorted within
+# segments, which are used as the primary sort key. all sorts are
+# stable so that ties are ordered in the same way as by sorted()
+COLUMN_SORTING_FUNCTIONS = {
+    'as_they_come': lambda segment, duration, deadline, priority: np.argsort(segment, kind='stable'),
+    'due_first': lambda segment, duration, deadline, priority: np.lexsort((deadline, segment)),
+    'due_last': lambda segment, duration, deadline, priority: np.lexsort((-deadline, segment)),
+    'important_first': lambda segment, duration, deadline, priority: np.lexsort((-priority, segment)),
+    'easier_first': lambda segment, duration, deadline, priority: np.lexsort((duration, segment)),
+    'easier_important_first': lambda segment, duration, deadline, priority: np.lexsort((priority - 100, -duration, segment)),
+    'easier_due_first': lambda segment, duration, deadline, priority: np.lexsort((-deadline, -duration, segment))
+}
+
+def run_segmented_simulation(hours_per_day: int, segment: np.ndarray, workers: np.ndarray, duration: np.ndarray,
+                             deadline: np.ndarray, priority: np.ndarray, completion_date: np.ndarray,
+                             now: np.datetime64, weights: np.ndarray = None, totals: np.ndarray = None,
+                             capacity: np.ndarray = None) -> dict:
+    """Function used to run all simulations on segmented columns
+    of task values. Every segment is simulated independently in
+    the same way as run_simulation, but all segments are sorted
+    and tallied together using segment-wise sorts and cumulative
+    sums. Tasks of a segment are shared between its workers.
+    Weighted tasks stand in for the given number of tasks of a
+    sample, in which case the totals and capacity of segments
+    must be taken from the full task set
+
+    Arguments:
+        hours_per_day: int hours per day to work on task set
+        segment: array of segment indices of tasks
+        workers: array of number of workers per segment
+        duration: array of task durations in hours
+        deadline: array of task deadlines as int64 microseconds
+        priority: array of task priorities
+        completion_date: array of existing completion dates as
+            int64 microseconds. NaT values mark open tasks
+        now: datetime64 start of simulation
+        weights: optional array of sampling weights of tasks
+        totals: optional array of number of tasks per segment
+        capacity: optional array of hours available per segment
+    Returns:
+        dict mapping simulation types to arrays of shape (segments, 3)
+        containing (completed, important_completed, completed_in_time)
+    """
+    segments, nat = len(workers), np.datetime64('NaT').astype(np.int64)
+    counts = np.bincount(segment, minlength=segments)
+    totals = counts if totals is None else totals
+    if capacity is None:
+        capacity = np.bincount(segment, weights=duration, minlength=segments) * (24 / hours_per_day) / workers
+    # segment of each position once tasks are sorted by segment
+    sorted_segment = np.repeat(np.arange(segments), counts)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    start_us = now.astype('datetime64[us]').astype(np.int64)
+
+    results = {}
+    for sim_type, sorter in COLUMN_SORTING_FUNCTIONS.items():
+        start = perf_counter()
+        order = sorter(segment, duration, deadline, priority)
+        hours = duration[order] if weights is None else duration[order] * weights[order]
+        # cumulative sum within segments
+        finish = np.concatenate(([0], np.cumsum(hours)))
+        finish = finish[1:] - finish[starts][sorted_segment]
+        if weights is not None:
+            # sampled tasks only stand in for tasks worked on before them
+            finish += duration[order] - hours
+        finish = finish / workers[sorted_segment]
+        simulated = finish <= capacity[sorted_segment]
+        # tasks that are not completed in the simulation keep existing completion dates
+        completion = completion_date[order].copy()
+        completion[simulated] = start_us + np.round(finish[simulated] * 3600 * 10 ** 6).astype(np.int64)
+        completed_mask = completion != nat
+
+        in_time_mask = completed_mask & (completion < deadline[order])
+        if weights is not None:
+            completed_mask, in_time_mask = completed_mask * weights[order], in_time_mask * weights[order]
+        completed = np.bincount(sorted_segment, weights=completed_mask, minlength=segments)
+        important = completed - np.round(TASK_PRIORITY_THRESHOLD * completed)
+        in_time = np.bincount(sorted_segment, weights=in_time_mask, minlength=segments)
+        results[sim_type] = np.stack([completed, important, in_time], axis=1) / np.maximum(totals, 1)[:, None]
+        SIMULATION_LATENCY.labels(sim_type).observe(perf_counter() - start)
+    return results
+
+def segment_results(results: dict, index: int) -> dict:
+    """Function used to extract the results of a single
+    segment in the format of analyse_task_set"""
+    return {sim_type: {key: round(float(value), 2) for key, value in
+                       zip(['completed', 'important_completed', 'completed_in_time'], values[index])}
+            for sim_type, values in results.items()}
+
+def prepare_columns(duration: object, deadline: object, priority: object, completion_date: object = None) -> tuple:
+    """Function used to convert task values into the
+    column types used by run_segmented_simulation. Durations
+    are kept as floats if they have been calibrated"""
+    duration, priority = np.asarray(duration), np.asarray(priority, dtype=np.int64)
+    duration = duration.astype(np.float64 if duration.dtype.kind == 'f' and len(duration) else np.int64)
+    deadline = np.asarray(deadline, dtype='datetime64[us]').astype(np.int64)
+    if completion_date is None:
+        completion_date = np.full(len(duration), np.datetime64('NaT'), dtype='datetime64[us]')
+    completion_date = np.asarray(completion_date, dtype='datetime64[us]').astype(np.int64)
+    return duration, deadline, priority, completion_date
+
+def analyse_columns(hours_per_day: int, duration: np.ndarray, deadline: np.ndarray, priority: np.ndarray,
+                    completion_date: np.ndarray = None, now: datetime = None) -> dict:
+    """Function used to run all simulations on columns of task
+    values. Accepts plain or memory mapped arrays and produces
+    the same results as analyse_task_set
+
+    Arguments:
+        hours_per_day: int hours per day to work on task set
+        duration: array of task durations in hours
+        deadline: array of task deadlines as datetime64
+        priority: array of task priorities
+        completion_date: optional array of completion dates as datetime64
+        now: datetime start of simulation. defaults to current time
+    Returns:
+        dict containing results in the format of analyse_task_set
+    """
+    columns = prepare_columns(duration, deadline, priority, completion_date)
+    results = run_segmented_simulation(hours_per_day, np.zeros(len(columns[0]), dtype=np.int64), np.ones(1),
+                                       *columns, np.datetime64(now or datetime.utcnow(), 'us'))
+    return segment_results(results, 0)
+
+def analyse_team(hours_per_day: int, members: List[str], uid: object, duration: object, deadline: object,
+                 priority: object, completion_date: object = None, now: datetime = None) -> dict:
+    """Function used to run all simulations for every member
+    of a team and for the team as a whole in a single batch.
+    The team results are obtained by pooling the tasks of all
+    members and sharing them between all members
+
+    Arguments:
+        hours_per_day: int hours per day each member works on tasks
+        members: list of user IDs of team members
+        uid: user ID of each task
+        duration: task durations in hours
+        deadline: task deadlines
+        priority: task priorities
+        completion_date: optional task completion dates
+        now: datetime start of simulation. defaults to current time
+    Returns:
+        dict containing results of each member and of the team
+    """
+    segment, workers, columns = team_segments(members, uid, duration, deadline, priority, completion_date)
+    results = run_segmented_simulation(hours_per_day, segment, workers, *columns,
+                                       np.datetime64(now or datetime.utcnow(), 'us'))
+    return {
+        'members': {member: segment_results(results, i) for i, member in enumerate(members)},
+        'team': segment_results(results, len(members))
+    }
+
+def team_segments(members: List[str], uid: object, duration: object, deadline: object, priority: object,
+                  completion_date: object = None) -> tuple:
+    """Function used to segment the tasks of a team into a
+    segment per member followed by a pooled team segment,
+    which contains a copy of all tasks
+
+    Returns:
+        tuple containing (segment, workers, columns)
+    """
+    indices = {member: i for i, member in enumerate(members)}
+    segment = np.array([indices[task_uid] for task_uid in uid], dtype=np.int64)
+    columns = prepare_columns(duration, deadline, priority, completion_date)
+    segment = np.concatenate([segment, np.full(len(segment), len(members), dtype=np.int64)])
+    columns = [np.concatenate([column, column]) for column in columns]
+    workers = np.concatenate([np.ones(len(members)), [max(len(members), 1)]])
+    return segment, workers, columns
+
+def stratify(segment: np.ndarray, segments: int, deadline: np.ndarray, priority: np.ndarray,
+             rng: np.random.Generator) -> tuple:
+    """Function used to assign tasks to strata of similar
+    deadlines and priorities within each segment. Stratum
+    boundaries are quantiles of a small uniform sample
+
+    Returns:
+        tuple containing (stratum of each task, number of strata)
+    """
+    sample = rng.integers(len(deadline), size=min(len(deadline), APPROXIMATE_QUANTILE_SAMPLE))
+    cuts = [np.unique(np.quantile(column[sample], np.linspace(0, 1, bins + 1)[1:-1]))
+            for column, bins in [(deadline, DEADLINE_STRATA), (priority, PRIORITY_STRATA)]]
+    deadline_bin, priority_bin = [np.searchsorted(cut, column, side='right')
+                                  for cut, column in zip(cuts, [deadline, priority])]
+    deadline_bins, priority_bins = len(cuts[0]) + 1, len(cuts[1]) + 1
+    return (segment * deadline_bins + deadline_bin) * priority_bins + priority_bin, segments * deadline_bins * priority_bins
+
+def estimate_segmented_simulation(hours_per_day: int, segment: np.ndarray, workers: np.ndarray, duration: np.ndarray,
+                                  deadline: np.ndarray, priority: np.ndarray, completion_date: np.ndarray,
+                                  now: np.datetime64, accuracy: float = APPROXIMATE_ACCURACY,
+                                  time_budget: float = APPROXIMATE_TIME_BUDGET, seed: int = None,
+                                  task_index: np.ndarray = None) -> tuple:
+    """Function used to estimate the results of run_segmented_simulation
+    from a stratified sample of tasks. Tasks are sampled within strata
+    of deadline and priority and weighted by the number of tasks they
+    stand in for. Confidence bounds are obtained from the spread of
+    estimates of random groups of the sample, which are simulated in
+    the same run as the whole sample. The sample grows until bounds
+    are within the accuracy or the next round would exceed the time
+    budget. Small task sets and samples that would need a large share
+    of all tasks are simulated exactly. Tasks that appear in several
+    segments are counted once and are sampled in all of them or none
+
+    Arguments:
+        hours_per_day: int hours per day to work on task set
+        segment, workers, duration, deadline, priority, completion_date,
+            now: see run_segmented_simulation
+        accuracy: float target half width of confidence bounds
+        time_budget: float seconds after which no round is started
+        seed: int optional random seed
+        task_index: optional array containing the index of the distinct
+            task of every row. rows are distinct tasks if not given
+    Returns:
+        tuple containing (results, half_widths, details) where results and
+        half_widths map simulation types to arrays of shape (segments, 3)
+    """
+    if task_index is None:
+        task_index = np.arange(len(duration))
+    start, segments = perf_counter(), len(workers)
+    tasks = int(task_index.max()) + 1 if len(task_index) else 0
+    details = {'total': tasks, 'rounds': 0, 'confidence': APPROXIMATE_CONFIDENCE}
+
+    def exact() -> tuple:
+        results = run_segmented_simulation(hours_per_day, segment, workers, duration, deadline, priority,
+                                           completion_date, now)
+        details.update({'exact': True, 'sampled': tasks, 'accuracy_met': True,
+                        'elapsed': round(perf_counter() - start, 4)})
+        return results, {sim_type: np.zeros_like(values) for sim_type, values in results.items()}, details
+
+    if tasks <= APPROXIMATE_MIN_TASKS:
+        return exact()
+
+    rng, z = np.random.default_rng(seed), NormalDist().inv_cdf(0.5 + APPROXIMATE_CONFIDENCE / 2)
+    totals = np.bincount(segment, minlength=segments)
+    capacity = np.bincount(segment, weights=duration, minlength=segments) * (24 / hours_per_day) / workers
+    strata, count = stratify(segment, segments, deadline, priority, rng)
+    stratum_totals = np.bincount(strata, minlength=count)
+    stratum_shares = stratum_totals / np.maximum(totals, 1)[np.arange(count) // (count // segments)]
+    # samples of successive rounds are nested as the sampling probability grows
+    keys, groups = rng.random(tasks)[task_index], rng.integers(APPROXIMATE_GROUPS, size=tasks)[task_index]
+    # the whole sample is followed by a copy split into random groups
+    replicate_workers, replicate_totals, replicate_capacity = [np.tile(values, APPROXIMATE_GROUPS + 1)
+                                                               for values in [workers, totals, capacity]]
+
+    size = APPROXIMATE_SAMPLE_SIZE
+    while True:
+        round_start = perf_counter()
+        # size tasks per segment in proportion to strata with at least
+        # two tasks per stratum, so that small segments are taken whole
+        target = np.minimum(np.maximum(size * stratum_shares, 2), stratum_totals)
+        rows = np.flatnonzero(keys < (target / np.maximum(stratum_totals, 1))[strata])
+        sampled_tasks = len(np.unique(task_index[rows]))
+        if sampled_tasks > APPROXIMATE_MAX_FRACTION * tasks:
+            return exact()
+        sampled = np.bincount(strata[rows], minlength=count)
+        weights = (stratum_totals / np.maximum(sampled, 1))[strata[rows]]
+        # strata without sampled tasks are accounted for by scaling weights to segment totals
+        weights *= (totals / np.maximum(np.bincount(segment[rows], weights=weights, minlength=segments), 1))[segment[rows]]
+        segment_sampled = np.bincount(segment[rows], minlength=segments)
+
+        replicate_segment = np.concatenate([segment[rows], segments * (groups[rows] + 1) + segment[rows]])
+        results = run_segmented_simulation(hours_per_day, replicate_segment, replicate_workers,
+                                           *(np.tile(column[rows], 2) for column in
+                                             [duration, deadline, priority, completion_date]),
+                                           now, weights=np.concatenate([weights, weights * APPROXIMATE_GROUPS]),
+                                           totals=replicate_totals, capacity=replicate_capacity)
+        # variance is at least that of a single task of the sample, so that
+        # rare outcomes missed by all groups do not get empty bounds, and
+        # vanishes for segments that are sampled whole
+        floor = (1 / np.maximum(segment_sampled, 1) ** 2)[:, None]
+        correction = (1 - segment_sampled / np.maximum(totals, 1))[:, None]
+        estimates, half_widths = {}, {}
+        for sim_type, values in results.items():
+            replicates = values[segments:].reshape(APPROXIMATE_GROUPS, segments, 3)
+            estimates[sim_type] = values[:segments]
+            variance = np.maximum(replicates.var(axis=0, ddof=1) / APPROXIMATE_GROUPS, floor) * correction
+            half_widths[sim_type] = z * np.sqrt(variance)
+
+        widest = max(float(values.max(initial=0)) for values in half_widths.values())
+        details.update({'exact': False, 'sampled': sampled_tasks, 'rounds': details['rounds'] + 1,
+                        'accuracy_met': widest <= accuracy})
+        if widest <= accuracy:
+            break
+        # samples needed for the accuracy grow with the square of the width
+        growth = min(max((widest / accuracy) ** 2, 2), 16)
+        elapsed, round_time = perf_counter() - start, perf_counter() - round_start
+        if growth * sampled_tasks > APPROXIMATE_MAX_FRACTION * tasks:
+            # exact runs cost about as much as a sample of all rows
+            if elapsed + round_time * len(duration) / len(rows) <= time_budget:
+                return exact()
+            break
+        if elapsed + round_time * growth > time_budget:
+            break
+        size = int(size * growth)
+    details['elapsed'] = round(perf_counter() - start, 4)
+    return estimates, half_widths, details
+
+def segment_bounds(results: dict, half_widths: dict, index: int) -> dict:
+    """Function used to extract the results of a single segment
+    in the format of analyse_task_set with confidence bounds.
+    Estimates and bounds are rounded to the same precision, so
+    that estimates always lie within their bounds"""
+    keys = ['completed', 'important_completed', 'completed_in_time']
+    return {sim_type: {**{key: round(float(value), BOUND_DIGITS) for key, value in zip(keys, values[index])},
+                       'bounds': {key: [round(max(float(value - width), 0), BOUND_DIGITS),
+                                        round(min(float(value + width), 1), BOUND_DIGITS)]
+                                  for key, value, width in zip(keys, values[index], half_widths[sim_type][index])}}
+            for sim_type, values in results.items()}
+
+def approximate_columns(hours_per_day: int, duration: object, deadline: object, priority: object,
+                        completion_date: object = None, now: datetime = None, accuracy: float = APPROXIMATE_ACCURACY,
+                        time_budget: float = APPROXIMATE_TIME_BUDGET, seed: int = None) -> dict:
+    """Function used to estimate the results of analyse_columns
+    with confidence bounds. See estimate_segmented_simulation
+
+    Returns:
+        dict containing results with bounds and approximation details
+    """
+    columns = prepare_columns(duration, deadline, priority, completion_date)
+    results, half_widths, details = estimate_segmented_simulation(
+        hours_per_day, np.zeros(len(columns[0]), dtype=np.int64), np.ones(1), *columns,
+        np.datetime64(now or datetime.utcnow(), 'us'), accuracy=accuracy, time_budget=time_budget, seed=seed)
+    return {'results': segment_bounds(results, half_widths, 0), 'approximation': details}
+
+def approximate_team(hours_per_day: int, members: List[str], uid: object, duration: object, deadline: object,
+                     priority: object, completion_date: object = None, now: datetime = None,
+                     accuracy: float = APPROXIMATE_ACCURACY, time_budget: float = APPROXIMATE_TIME_BUDGET,
+                     seed: int = None) -> dict:
+    """Function used to estimate the results of analyse_team
+    with confidence bounds. See estimate_segmented_simulation
+
+    Returns:
+        dict containing results with bounds of each member and
+        of the team and approximation details
+    """
+    segment, workers, columns = team_segments(members, uid, duration, deadline, priority, completion_date)
+    # the pooled team segment repeats the tasks of all members
+    task_index = np.tile(np.arange(len(segment) // 2), 2)
+    results, half_widths, details = estimate_segmented_simulation(
+        hours_per_day, segment, workers, *columns, np.datetime64(now or datetime.utcnow(), 'us'),
+        accuracy=accuracy, time_budget=time_budget, seed=seed, task_index=task_index)
+    return {
+        'members': {member: segment_bounds(results, half_widths, i) for i, member in enumerate(members)},
+        'team': segment_bounds(results, half_widths, len(members)),
+        'approximation': details
+    }
+
+def project_schedule(hours_per_day: int, duration: object, deadline: object, priority: object, now: datetime,
+                     sim_type: str = 'as_they_come') -> tuple:
+    """Function used to project the schedule of a task set for a
+    simulation type. Tasks are worked on back to back in the
+    order of the simulation, so start and finish times are
+    obtained from a cumulative sum of the sorted durations
+
+    Arguments:
+        hours_per_day: int hours per day to work on task set
+        duration: task durations in hours
+        deadline: task deadlines
+        priority: task priorities
+        now: datetime start of schedule
+        sim_type: str simulation type to use
+    Returns:
+        tuple containing (order, start, finish, on_time, scheduled) where
+        start and finish are hour offsets from now in simulation order and
+        scheduled is the number of tasks finished before the simulation ends
+    """
+    duration, deadline, priority, _ = prepare_columns(duration, deadline, priority)
+    order = COLUMN_SORTING_FUNCTIONS[sim_type](np.zeros(len(duration), dtype=np.int64), duration, deadline, priority)
+    finish = np.cumsum(duration[order])
+    start = finish - duration[order]
+    on_time = np.datetime64(now, 'us').astype(np.int64) + finish * 3600 * 10 ** 6 < deadline[order]
+    scheduled = int(np.searchsorted(finish, duration.sum() * (24 / hours_per_day), side='right'))
+    return order, start, finish, on_time, scheduled
+
+def encode_schedule(task_ids: list, schedule: tuple, offset: int = 0, limit: int = None) -> dict:
+    """Function used to encode a window of a projected schedule.
+    Task IDs are listed in simulation order and times are
+    encoded as the start offset of the first task followed by
+    the duration of each task in hours, so that the start of
+    a task is the sum of all preceding values and its finish
+    is the start plus its own value. On time flags are encoded
+    as a string of 0 and 1 characters
+
+    Arguments:
+        task_ids: list of task IDs
+        schedule: tuple returned by project_schedule
+        offset: int index of first task in window
+        limit: int max number of tasks in window
+    Returns:
+        dict containing encoded schedule window
+    """
+    order, start, finish, on_time, scheduled = schedule
+    window = slice(offset, len(order) if limit is None else offset + limit)
+    # calibrated durations are rounded to hundredths of hours
+    start, deltas = start[window], finish[window] - start[window]
+    if deltas.dtype.kind == 'f':
+        start, deltas = start.round(2), deltas.round(2)
+    return {
+        'total': len(order),
+        'scheduled': scheduled,
+        'offset': offset,
+        'task_ids': [task_ids[i] for i in order[window].tolist()],
+        'start': start[0].item() if len(start) else 0,
+        'deltas': deltas.tolist(),
+        'on_time': (on_time[window].astype(np.uint8) + ord('0')).tobytes().decode()
+    }
+
 def plot_simulation_results(results: dict):
     """Function used to plot results obtained from
     running simulations
@@ -162,14 +578,26 @@ def plot_simulation_results(results: dict):
 
 if __name__ == '__main__':
 
-    tasks = get_tasks()
-    plot_simulation_results(analyse_task_set(8, tasks))
-
-
-
-
-
-
-
-
-
+    arg_parser = argparse.ArgumentParser(description='monty task simulation')
+    arg_parser.add_argument('--input', default='./tasks.json')
+    arg_parser.add_argument('--snapshot', default=None, help='path of task snapshot. used instead of input if set')
+    arg_parser.add_argument('--uid', default=None, help='only simulate tasks of user. snapshot only')
+    arg_parser.add_argument('--hours-per-day', type=int, default=8)
+    arg_parser.add_argument('--approximate', action='store_true', help='estimate results from a sample. snapshot only')
+    arg_parser.add_argument('--accuracy', type=float, default=APPROXIMATE_ACCURACY)
+    arg_parser.add_argument('--time-budget', type=float, default=APPROXIMATE_TIME_BUDGET)
+    args = arg_parser.parse_args()
+
+    if args.snapshot is None:
+        plot_simulation_results(analyse_task_set(args.hours_per_day, get_tasks(args.input)))
+    else:
+        snapshot = TaskSnapshot(args.snapshot)
+        rows = slice(None) if args.uid is None else snapshot.user_indices(args.uid)
+        columns = [snapshot[column][rows] for column in ['duration', 'deadline', 'priority', 'completion_date']]
+        if args.approximate:
+            approximation = approximate_columns(args.hours_per_day, *columns, accuracy=args.accuracy,
+                                                time_budget=args.time_budget)
+            print(json.dumps(approximation, indent=2))
+            plot_simulation_results(approximation['results'])
+        else:
+            plot_simulation_results(analyse_columns(args.hours_per_day, *columns))
@@ -0,0 +1,277 @@
+"""module containing a binary columnar snapshot format for
+task sets. Fixed width columns are stored as raw NumPy arrays
+and strings are stored in a heap with an offsets column, so
+that snapshots are opened with np.memmap without parsing
+
+    python snapshot.py --source json --input tasks.json --output tasks.snapshot
+    python simulation.py --snapshot tasks.snapshot
+"""
+
+import logging
+import argparse
+import json
+import os
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+from config import SNAPSHOT_CHUNK_SIZE
+from data_models import Task
+from helpers import generate_task_chunks
+from persistence import stream_tasks
+
+LOGGER = logging.getLogger(__name__)
+
+
+SNAPSHOT_VERSION = 1
+
+# dtypes and per row shapes of fixed width columns
+FIXED_COLUMNS = {
+    'task_id': ('|u1', [16]),
+    'uid_index': ('<i4', []),
+    'priority': ('<i4', []),
+    'duration': ('<i4', []),
+    'hours_remaining': ('<i4', []),
+    'created': ('<M8[us]', []),
+    'deadline': ('<M8[us]', []),
+    'completion_date': ('<M8[us]', [])
+}
+STRING_COLUMNS = ['task_title', 'content']
+
+
+class SnapshotWriter:
+    """Class used to write a snapshot directory. Columns are
+    appended in chunks using the column format of the synthetic
+    task generator, so memory usage only depends on chunk size"""
+
+    def __init__(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        self.path, self.count, self.uids = path, 0, {}
+        self._files = {column: open(os.path.join(path, column + '.bin'), 'wb') for column in FIXED_COLUMNS}
+        self._heaps, self._heap_sizes = {}, {}
+        for column in STRING_COLUMNS:
+            self._files[column + '.offsets'] = open(os.path.join(path, column + '.offsets.bin'), 'wb')
+            self._heaps[column] = open(os.path.join(path, column + '.heap.bin'), 'wb')
+            self._heap_sizes[column] = 0
+            np.zeros(1, dtype='<i8').tofile(self._files[column + '.offsets'])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info: tuple):
+        self.close()
+
+    def uid_indices(self, uids: object) -> np.ndarray:
+        """Function used to map user IDs to indices
+        into the uids list of the snapshot"""
+        unique, inverse = np.unique(np.asarray(uids, dtype=str), return_inverse=True)
+        indices = np.array([self.uids.setdefault(uid, len(self.uids)) for uid in unique.tolist()], dtype='<i4')
+        return indices[inverse]
+
+    def append(self, chunk: dict):
+        """Function used to append a chunk of tasks
+
+        Arguments:
+            chunk: dict mapping column names to column values
+        """
+        size = len(chunk['task_id'])
+        if not size:
+            return
+        columns = {
+            'task_id': np.frombuffer(bytes.fromhex(''.join(map(str, chunk['task_id'])).replace('-', '')), dtype='|u1'),
+            'uid_index': self.uid_indices(chunk['uid'])
+        }
+        for column, (dtype, _) in FIXED_COLUMNS.items():
+            if column not in columns:
+                columns[column] = np.asarray(chunk[column], dtype=dtype)
+        for column, values in columns.items():
+            values.astype(FIXED_COLUMNS[column][0], copy=False).tofile(self._files[column])
+
+        for column in STRING_COLUMNS:
+            encoded = [value.encode() for value in chunk[column]]
+            self._heaps[column].write(b''.join(encoded))
+            offsets = self._heap_sizes[column] + np.cumsum([len(value) for value in encoded], dtype='<i8')
+            offsets.tofile(self._files[column + '.offsets'])
+            self._heap_sizes[column] = int(offsets[-1])
+        self.count += size
+
+    def close(self):
+        """Function used to close all column files and
+        write snapshot metadata"""
+        for f in list(self._files.values()) + list(self._heaps.values()):
+            f.close()
+        meta = {
+            'version': SNAPSHOT_VERSION,
+            'count': self.count,
+            'created': datetime.utcnow().isoformat(),
+            'uids': list(self.uids),
+            'columns': {column: {'dtype': dtype, 'shape': shape} for column, (dtype, shape) in FIXED_COLUMNS.items()},
+            'strings': STRING_COLUMNS
+        }
+        with open(os.path.join(self.path, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+class TaskSnapshot:
+    """Class used to read a snapshot directory. All columns
+    are memory mapped read only, so opening a snapshot does
+    not read any task data"""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            self.meta = json.load(f)
+        if self.meta['version'] != SNAPSHOT_VERSION:
+            raise ValueError(f'unsupported snapshot version {self.meta["version"]}')
+        self.path, self.count, self.uids = path, self.meta['count'], self.meta['uids']
+        self.columns = {column: self.map(column + '.bin', spec['dtype'], [self.count] + spec['shape'])
+                        for column, spec in self.meta['columns'].items()}
+        self.offsets = {column: self.map(column + '.offsets.bin', '<i8', [self.count + 1])
+                        for column in self.meta['strings']}
+        self.heaps = {column: self.map(column + '.heap.bin', '|u1', [int(self.offsets[column][-1])])
+                      for column in self.meta['strings']}
+
+    def map(self, filename: str, dtype: str, shape: list) -> np.ndarray:
+        """Function used to memory map a column file. Empty
+        files cannot be mapped and are returned as empty arrays"""
+        if not shape[0]:
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(os.path.join(self.path, filename), dtype=dtype, mode='r', shape=tuple(shape))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self.columns[column]
+
+    def string(self, column: str, index: int) -> str:
+        """Function used to retrieve a single string value"""
+        offsets = self.offsets[column]
+        return self.heaps[column][offsets[index]:offsets[index + 1]].tobytes().decode()
+
+    def task(self, index: int) -> Task:
+        """Function used to retrieve a single task as a Task model"""
+        completion_date = self.columns['completion_date'][index]
+        return Task(task_id=uuid.UUID(bytes=self.columns['task_id'][index].tobytes()),
+                    task_title=self.string('task_title', index),
+                    content=self.string('content', index),
+                    priority=int(self.columns['priority'][index]),
+                    duration=int(self.columns['duration'][index]),
+                    hours_remaining=int(self.columns['hours_remaining'][index]),
+                    created=self.columns['created'][index].item(),
+                    deadline=self.columns['deadline'][index].item(),
+                    completion_date=None if np.isnat(completion_date) else completion_date.item())
+
+    def user_indices(self, uid: str) -> np.ndarray:
+        """Function used to retrieve the row indices
+        of all tasks of a given user"""
+        if uid not in self.uids:
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero(self.columns['uid_index'] == self.uids.index(uid))
+
+def rows_to_chunks(rows: object, chunk_size: int = SNAPSHOT_CHUNK_SIZE):
+    """Generator used to group task dicts into chunks of columns.
+    Tasks without a user ID are assigned to the empty user ID"""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield rows_to_columns(chunk)
+            chunk = []
+    if chunk:
+        yield rows_to_columns(chunk)
+
+def rows_to_columns(rows: list) -> dict:
+    """Function used to convert a list of task dicts into columns.
+    Exported task files may lack the task_title, hours_remaining and
+    created fields, which default to the content, the duration and
+    the conversion time, like newly created tasks"""
+    now = datetime.utcnow().isoformat()
+    columns = {column: [row.get(column) for row in rows] for column in list(FIXED_COLUMNS) + STRING_COLUMNS}
+    columns['uid'] = [row.get('uid') or '' for row in rows]
+    columns['task_title'] = [row.get('task_title') or row['content'] for row in rows]
+    columns['hours_remaining'] = [row['duration'] if row.get('hours_remaining') is None else row['hours_remaining']
+                                  for row in rows]
+    columns['created'] = [row.get('created') or now for row in rows]
+    return columns
+
+def iter_json_tasks(f: object, buffer_size: int = 1 << 20):
+    """Generator used to incrementally parse the tasks array of
+    a {'tasks': [...]} JSON file without loading the whole file"""
+    decoder, buffer = json.JSONDecoder(), ''
+    while '[' not in buffer:
+        if not (data := f.read(buffer_size)):
+            return
+        buffer += data
+    buffer, position = buffer[buffer.index('[') + 1:], 0
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if buffer.startswith(']', position):
+            return
+        try:
+            task, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if not (data := f.read(buffer_size)):
+                raise
+            buffer, position = buffer[position:] + data, 0
+            continue
+        yield task
+
+def iter_ndjson_tasks(f: object):
+    """Generator used to parse a newline delimited JSON file"""
+    for line in f:
+        if line.strip():
+            yield json.loads(line)
+
+def json_chunks(input_file: str):
+    """Generator used to read chunks from a JSON file"""
+    with open(input_file, 'r') as f:
+        yield from rows_to_chunks(iter_json_tasks(f))
+
+def ndjson_chunks(input_file: str):
+    """Generator used to read chunks from an NDJSON file"""
+    with open(input_file, 'r') as f:
+        yield from rows_to_chunks(iter_ndjson_tasks(f))
+
+def postgres_chunks(uid: str = None):
+    """Generator used to read chunks from the tasks table"""
+    for rows in stream_tasks(uid=uid, batch_size=SNAPSHOT_CHUNK_SIZE):
+        yield rows_to_columns(rows)
+
+SNAPSHOT_SOURCES = {
+    'json': lambda args: json_chunks(args.input),
+    'ndjson': lambda args: ndjson_chunks(args.input),
+    'postgres': lambda args: postgres_chunks(args.uid),
+    'synthetic': lambda args: generate_task_chunks(args.count, seed=args.seed, chunk_size=SNAPSHOT_CHUNK_SIZE,
+                                                   users=[f'synthetic-user-{i}' for i in range(args.users)])
+}
+
+def write_snapshot(chunks: object, output: str) -> int:
+    """Function used to write chunks of columns to a snapshot
+
+    Arguments:
+        chunks: iterable of dicts mapping column names to values
+        output: str path of snapshot directory
+    Returns:
+        int number of tasks written
+    """
+    with SnapshotWriter(output) as writer:
+        for chunk in chunks:
+            writer.append(chunk)
+    LOGGER.info('wrote %s tasks to snapshot %s', writer.count, output)
+    return writer.count
+
+
+if __name__ == '__main__':
+
+    arg_parser = argparse.ArgumentParser(description='task snapshot converter')
+    arg_parser.add_argument('--source', choices=list(SNAPSHOT_SOURCES), default='json')
+    arg_parser.add_argument('--input', default='./tasks.json')
+    arg_parser.add_argument('--output', default='./tasks.snapshot')
+    arg_parser.add_argument('--uid', default=None, help='only convert tasks of user. postgres only')
+    arg_parser.add_argument('--count', type=int, default=1000, help='number of tasks. synthetic only')
+    arg_parser.add_argument('--users', type=int, default=1, help='number of users. synthetic only')
+    arg_parser.add_argument('--seed', type=int, default=None)
+    args = arg_parser.parse_args()
+
+    write_snapshot(SNAPSHOT_SOURCES[args.source](args), args.output)
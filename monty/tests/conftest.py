@@ -0,0 +1,61 @@
+"""shared setup of the monty tests. Modules of monty are
+imported with flat imports, so the package directory and the
+shared directory are added to the path and the in-memory
+persistence backend is selected before any module is imported"""
+
+import io
+import json
+import os
+import sys
+import uuid
+
+import pytest
+
+os.environ.setdefault('PERSISTENCE_BACKEND', 'memory')
+MONTY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [MONTY_DIRECTORY, os.path.join(os.path.dirname(MONTY_DIRECTORY), 'shared')]
+
+
+class Client:
+    """Class used to call the monty API as a WSGI application
+    with header authentication"""
+
+    def __init__(self, app: object):
+        self.app = app
+
+    def call(self, method: str, path: str, uid: str, query: str = '', body: object = None,
+             headers: dict = None) -> tuple:
+        """Function used to call a route of the API
+
+        Returns:
+            tuple containing (status code, lower case headers,
+                decoded JSON body)
+        """
+        data = json.dumps(body).encode() if body is not None else b''
+        environ = {'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': query, 'SERVER_NAME': 'localhost',
+                   'SERVER_PORT': '80', 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(data),
+                   'wsgi.errors': sys.stderr, 'CONTENT_LENGTH': str(len(data)), 'CONTENT_TYPE': 'application/json',
+                   'HTTP_X_AUTHENTICATED_USERID': uid}
+        environ.update({'HTTP_' + key.upper().replace('-', '_'): value for key, value in (headers or {}).items()})
+        status = {}
+        def start_response(line: str, headers: list, exc_info: tuple = None):
+            status['code'], status['headers'] = int(line.split()[0]), {key.lower(): value for key, value in headers}
+        result = self.app(environ, start_response)
+        content = b''.join(result)
+        if hasattr(result, 'close'):
+            result.close()
+        return status['code'], status['headers'], json.loads(content) if content else None
+
+@pytest.fixture(scope='session')
+def client() -> Client:
+    """Fixture used to create a client of the API with the
+    authentication plugin installed. Admission control is
+    left out so that tests are not rate limited"""
+    import api
+    api.APP.install(api.AuthenticationPlugin())
+    return Client(api.APP)
+
+@pytest.fixture
+def uid() -> str:
+    """Fixture used to create a user without any tasks"""
+    return f'test-{uuid.uuid4()}'
@@ -0,0 +1,23 @@
+"""tests of the admission control plugin"""
+
+import pytest
+from bottle import Bottle
+
+from admission import AdmissionPlugin, ROUTE_POLICIES
+from data_models import AdmissionPolicy
+from config import SERVER_THREADS
+
+
+def test_default_policies_fit_server_threads():
+    Bottle().install(AdmissionPlugin())
+
+def test_policies_exceeding_server_threads_together_are_rejected():
+    # each policy fits on its own, but not all of them together
+    policy = AdmissionPolicy(concurrency=2, queue_size=1, rate=1.0, burst=1)
+    policies = {'/first': policy, '/second': policy.copy(), '/third': policy.copy()}
+    with pytest.raises(ValueError):
+        Bottle().install(AdmissionPlugin(policies, threads=8, reserved_threads=1))
+
+def test_routes_sharing_a_policy_are_counted_once():
+    policy = AdmissionPolicy(concurrency=SERVER_THREADS - 2, queue_size=1, rate=1.0, burst=1)
+    Bottle().install(AdmissionPlugin({rule: policy for rule in ROUTE_POLICIES}, reserved_threads=1))
@@ -0,0 +1,130 @@
+"""tests of the API routes against the in-memory backend"""
+
+from datetime import date, timedelta
+
+import api
+from simulation import COLUMN_SORTING_FUNCTIONS
+
+
+def create_task(client: object, uid: str, title: str = 'write report', content: str = 'quarterly numbers',
+                duration: int = 4, priority: int = 1, days: int = 7) -> str:
+    """Function used to create a task and return its ID"""
+    body = {'task_title': title, 'content': content, 'duration': duration, 'priority': priority,
+            'deadline': (date.today() + timedelta(days=days)).isoformat()}
+    code, _, response = client.call('POST', '/monty/task', uid, body=body)
+    assert code == 200
+    return response['payload']['task_id']
+
+def get_tasks(client: object, uid: str, fetch_completed: bool = True) -> list:
+    """Function used to retrieve the tasks of a user"""
+    code, _, response = client.call('GET', '/monty/tasks', uid, query=f'fetch_completed={fetch_completed}')
+    assert code == 200
+    return response['payload']
+
+def test_task_crud(client, uid):
+    task_id = create_task(client, uid)
+    assert [task['task_id'] for task in get_tasks(client, uid)] == [task_id]
+
+    code, _, _ = client.call('PATCH', f'/monty/task/{task_id}', uid, query='operation=UPDATE',
+                             body={'remaining_hours': 6})
+    assert code == 200
+    assert get_tasks(client, uid)[0]['hours_remaining'] == 6
+
+    code, _, _ = client.call('PATCH', f'/monty/task/{task_id}', uid, query='operation=COMPLETE', body={})
+    assert code == 200
+    assert get_tasks(client, uid, fetch_completed=False) == []
+    assert get_tasks(client, uid)[0]['completion_date'] is not None
+
+    code, _, _ = client.call('DELETE', f'/monty/task/{task_id}', uid)
+    assert code == 200
+    assert get_tasks(client, uid) == []
+
+def test_tasks_of_other_users_are_not_deleted(client, uid):
+    task_id = create_task(client, uid)
+    code, _, _ = client.call('DELETE', f'/monty/task/{task_id}', 'someone-else')
+    assert code == 404
+    assert len(get_tasks(client, uid)) == 1
+
+def test_invalid_task_updates_are_rejected(client, uid):
+    code, _, _ = client.call('PATCH', '/monty/task/00000000-0000-0000-0000-000000000000', uid,
+                             query='operation=COMPLETE', body={})
+    assert code == 400
+    task_id = create_task(client, uid)
+    code, _, _ = client.call('PATCH', f'/monty/task/{task_id}', uid, query='operation=UNKNOWN', body={})
+    assert code == 400
+
+def test_search(client, uid):
+    report = create_task(client, uid, title='write report', content='quarterly numbers')
+    review = create_task(client, uid, title='review code', content='report generator')
+    create_task(client, uid, title='book flights', content='conference')
+
+    code, _, response = client.call('GET', '/monty/tasks/search', uid, query='q=report')
+    assert code == 200
+    # title matches rank above content matches
+    assert [task['task_id'] for task in response['payload']['tasks']] == [report, review]
+
+    code, _, response = client.call('GET', '/monty/tasks/search', uid, query='q=rep&limit=1')
+    assert [task['task_id'] for task in response['payload']['tasks']] == [report]
+    cursor = response['payload']['next']
+    code, _, response = client.call('GET', '/monty/tasks/search', uid, query=f'q=rep&limit=1&cursor={cursor}')
+    assert [task['task_id'] for task in response['payload']['tasks']] == [review]
+
+    code, _, _ = client.call('GET', '/monty/tasks/search', uid, query='q=')
+    assert code == 400
+
+def test_calibration(client, uid):
+    code, _, response = client.call('GET', '/monty/calibration', uid)
+    assert code == 200
+    assert response['payload']['count'] == 0 and response['payload']['factor'] == 1.0
+
+    for _ in range(3):
+        task_id = create_task(client, uid, duration=4)
+        client.call('PATCH', f'/monty/task/{task_id}', uid, query='operation=COMPLETE', body={'actual_hours': 8})
+    code, _, response = client.call('GET', '/monty/calibration', uid)
+    assert response['payload']['count'] == 3
+    assert response['payload']['mean'] == 2.0
+    assert response['payload']['factor'] > 1.0
+
+def test_simulation(client, uid):
+    for days in [1, 3, 10]:
+        create_task(client, uid, days=days)
+    code, _, response = client.call('GET', '/monty/simulation', uid)
+    assert code == 200
+    assert set(response['payload']) == set(COLUMN_SORTING_FUNCTIONS)
+    assert response['payload']['due_first']['completed'] == 1.0
+
+def test_team_simulation(client, uid):
+    create_task(client, uid)
+    create_task(client, 'team-member')
+    code, _, response = client.call('POST', '/monty/simulation/team', uid, body={'members': [uid]})
+    assert code == 200
+    assert list(response['payload']['members']) == [uid]
+    assert list(response['payload']['calibration_factors']) == [uid]
+    assert 'team' in response['payload']
+
+    # pooled results of other users are only returned to team simulation admins
+    for members in [['team-member'], [uid, 'team-member']]:
+        for approximate in [False, True]:
+            code, _, _ = client.call('POST', '/monty/simulation/team', uid,
+                                     body={'members': members, 'approximate': approximate})
+            assert code == 403
+
+def test_team_simulation_admin(client, uid, monkeypatch):
+    monkeypatch.setattr(api, 'TEAM_SIMULATION_ADMINS', {uid})
+    create_task(client, uid)
+    create_task(client, 'team-member')
+    code, _, response = client.call('POST', '/monty/simulation/team', uid, body={'members': [uid, 'team-member']})
+    assert code == 200
+    assert list(response['payload']['members']) == [uid, 'team-member']
+    assert list(response['payload']['calibration_factors']) == [uid, 'team-member']
+
+def test_schedule(client, uid):
+    task_ids = [create_task(client, uid, days=days) for days in [5, 1, 3]]
+    code, _, response = client.call('GET', '/monty/schedule', uid, query='policy=due_first&limit=2')
+    assert code == 200
+    assert response['payload']['total'] == 3
+    assert response['payload']['task_ids'] == [task_ids[1], task_ids[2]]
+    assert len(response['payload']['deltas']) == 2
+
+    code, _, _ = client.call('GET', '/monty/schedule', uid, query='policy=unknown')
+    assert code == 400
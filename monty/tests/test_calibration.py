@@ -0,0 +1,51 @@
+"""tests of effort ratios and duration calibrations"""
+
+import pytest
+
+from calibration import DurationCalibration, effort_ratio
+
+
+@pytest.mark.parametrize('duration,hours_added,hours_remaining,actual_hours,expected', [
+    (4, 0, 4, 8, 2.0),        # reported hours take precedence
+    (4, 2, 0, 2, 0.5),
+    (4, 0, 4, 0, None),       # non-positive reports are ignored
+    (4, 0, 4, None, None),    # completed without any signal
+    (4, 0, 0, None, 1.0),     # completed on plan
+    (4, 0, 1, None, 0.75),    # completed early
+    (4, 4, 2, None, 1.5),     # revised upwards
+    (0, 2, 0, 2, None)        # no planned hours
+])
+def test_effort_ratio(duration, hours_added, hours_remaining, actual_hours, expected):
+    assert effort_ratio(duration, hours_added, hours_remaining, actual_hours) == expected
+
+def test_effort_ratio_below_one():
+    """hours worked can fall short of the plan, so ratios
+    of the fallback are not bounded below by 1"""
+    assert effort_ratio(10, 0, 6) < 1
+
+def test_factor_shrinkage():
+    calibration = DurationCalibration()
+    assert calibration.factor('mean', prior_weight=5) == 1.0
+    for _ in range(5):
+        calibration.observe(2.0)
+    assert calibration.mean == pytest.approx(2.0)
+    assert calibration.factor('mean', prior_weight=5) == pytest.approx(1.5)
+    assert calibration.factor('mean', prior_weight=0) == pytest.approx(2.0)
+    for _ in range(995):
+        calibration.observe(2.0)
+    assert calibration.factor('mean', prior_weight=5) == pytest.approx(2005 / 1005)
+
+def test_factor_shrinks_fast_completions():
+    calibration = DurationCalibration()
+    for _ in range(15):
+        calibration.observe(0.5)
+    assert calibration.factor('mean', prior_weight=5) == pytest.approx(0.625)
+    assert calibration.factor('median', prior_weight=5) == pytest.approx((15 * calibration.quantile(0.5) + 5) / 20)
+
+def test_row_round_trip():
+    calibration = DurationCalibration()
+    for ratio in [0.5, 1.0, 1.25, 3.0]:
+        calibration.observe(ratio)
+    restored = DurationCalibration.from_row(calibration.to_row())
+    assert restored.to_row() == calibration.to_row()
+    assert restored.quantile(0.5) == calibration.quantile(0.5)
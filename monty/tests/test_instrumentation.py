@@ -0,0 +1,26 @@
+"""tests of the request instrumentation plugin"""
+
+import bottle
+
+from instrumentation import InstrumentationPlugin, REQUEST_LATENCY, REQUEST_STATUS
+
+
+def test_streamed_latency():
+    """latency of streamed responses is only recorded once
+    the body has been consumed"""
+    app = bottle.Bottle()
+    app.install(InstrumentationPlugin())
+
+    @app.route('/stream')
+    def stream():
+        yield '{"chunk": 1}\n'
+        yield '{"chunk": 2}\n'
+
+    latency, status = REQUEST_LATENCY.labels('/stream', 'GET'), REQUEST_STATUS.labels('/stream', 'GET', 200)
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/stream', 'SERVER_NAME': 'localhost', 'SERVER_PORT': '80',
+               'wsgi.url_scheme': 'http'}
+    body = app(environ, lambda *args: None)
+    assert latency.count == 0 and status.value == 0
+    assert b''.join(body) == b'{"chunk": 1}\n{"chunk": 2}\n'
+    body.close()
+    assert latency.count == 1 and status.value == 1
@@ -0,0 +1,68 @@
+"""tests of the cached introspection client against a stub
+authentication service"""
+
+import json
+import threading
+from urllib.parse import parse_qs
+from wsgiref.simple_server import make_server, WSGIRequestHandler
+
+import pytest
+
+from introspection import IntrospectionClient
+
+VALID_TOKEN = 'valid-token'
+USER_ID = '6f1c1b36-7fa2-4a40-93c6-1a2b3c4d5e6f'
+
+
+class QuietHandler(WSGIRequestHandler):
+    """Request handler that does not log requests"""
+
+    def log_message(self, *args: tuple):
+        pass
+
+@pytest.fixture
+def auth_service():
+    """Fixture used to run a stub authentication service
+    that only accepts VALID_TOKEN and counts its requests"""
+    requests = []
+
+    def app(environ: dict, start_response: object) -> list:
+        size = int(environ.get('CONTENT_LENGTH') or 0)
+        form = {key: values[0] for key, values in parse_qs(environ['wsgi.input'].read(size).decode()).items()}
+        requests.append(form)
+        if form.get('token') != VALID_TOKEN:
+            start_response('401 Unauthorized', [('Content-Type', 'application/json')])
+            return [json.dumps({'http_code': 401, 'success': False}).encode()]
+        start_response('200 OK', [('Content-Type', 'application/json')])
+        payload = {'uid': USER_ID, 'username': form['uid'], 'email': 'user@example.com',
+                   'created': '2020-01-01T00:00:00', 'admin': False}
+        return [json.dumps({'http_code': 200, 'success': True, 'payload': payload}).encode()]
+
+    server = make_server('127.0.0.1', 0, app, handler_class=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}', requests
+    server.shutdown()
+    server.server_close()
+
+def test_valid_token_is_cached(auth_service):
+    url, requests = auth_service
+    client = IntrospectionClient(base_url=url, ttl=60)
+    assert client.get_user_details('user', VALID_TOKEN).success
+    assert client.get_user_details('user', VALID_TOKEN).success
+    assert len(requests) == 1
+
+def test_invalid_token_is_not_served_from_cache(auth_service):
+    url, requests = auth_service
+    client = IntrospectionClient(base_url=url, ttl=60)
+    assert client.get_user_details('user', VALID_TOKEN).success
+    assert client.get_user_details('user', 'forged-token') is None
+    assert [request['token'] for request in requests] == [VALID_TOKEN, 'forged-token']
+
+def test_invalidate_removes_all_tokens_of_user(auth_service):
+    url, requests = auth_service
+    client = IntrospectionClient(base_url=url, ttl=60)
+    client.get_user_details('user', VALID_TOKEN)
+    client.invalidate('user')
+    client.get_user_details('user', VALID_TOKEN)
+    assert len(requests) == 2
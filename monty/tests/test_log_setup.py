@@ -0,0 +1,24 @@
+"""tests of the queue based logging pipeline"""
+
+import logging
+import queue
+
+from log_setup import DeferredQueueHandler, JsonFormatter
+
+
+def test_prepare_snapshots_message_and_exception():
+    log_queue, values = queue.SimpleQueue(), ['before']
+    logger = logging.getLogger('test_log_setup')
+    logger.propagate, logger.handlers = False, [DeferredQueueHandler(log_queue)]
+    try:
+        raise ValueError('failed')
+    except ValueError:
+        logger.exception('values %s', values)
+    values[0] = 'after'
+
+    record = log_queue.get_nowait()
+    assert record.getMessage() == "values ['before']"
+    assert record.args is None and record.exc_info is None
+    assert 'ValueError: failed' in record.exc_text
+    assert 'ValueError: failed' in logging.Formatter().format(record)
+    assert 'ValueError: failed' in JsonFormatter().format(record)
@@ -0,0 +1,60 @@
+"""tests of approximate simulations against exact simulations"""
+
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+import simulation
+from simulation import analyse_columns, approximate_columns, approximate_team
+
+NOW = datetime(2030, 1, 1)
+METRICS = ['completed', 'important_completed', 'completed_in_time']
+
+
+def generate_columns(count: int, seed: int = 0) -> tuple:
+    """Function used to generate task columns of which a
+    moderate share can be completed in time"""
+    rng = np.random.default_rng(seed)
+    duration = rng.integers(1, 25, count)
+    horizon_us = duration.sum() * 3 * 1.1 * 3600e6
+    deadline = np.datetime64(NOW, 'us') + (rng.random(count) * horizon_us).astype(np.int64)
+    return duration, deadline, rng.integers(1, 101, count)
+
+@pytest.fixture
+def small_thresholds(monkeypatch):
+    """Fixture used to lower the thresholds of approximate
+    simulations so that tests sample small task sets"""
+    monkeypatch.setattr(simulation, 'APPROXIMATE_MIN_TASKS', 1000)
+    monkeypatch.setattr(simulation, 'APPROXIMATE_SAMPLE_SIZE', 500)
+
+def test_estimates_bound_exact_results(small_thresholds):
+    columns = generate_columns(20000)
+    exact = analyse_columns(8, *columns, now=NOW)
+    approximate = approximate_columns(8, *columns, now=NOW, accuracy=0.05, time_budget=10, seed=1)
+    assert not approximate['approximation']['exact']
+    assert approximate['approximation']['sampled'] < 20000
+    for sim_type, results in approximate['results'].items():
+        for metric in METRICS:
+            lower, upper = results['bounds'][metric]
+            assert lower <= results[metric] <= upper
+            # exact results are rounded to 2 digits
+            assert lower - 0.01 <= exact[sim_type][metric] <= upper + 0.01
+
+def test_small_task_sets_are_simulated_exactly():
+    columns = generate_columns(200)
+    exact = analyse_columns(8, *columns, now=NOW)
+    approximate = approximate_columns(8, *columns, now=NOW, seed=1)
+    assert approximate['approximation']['exact']
+    for sim_type, results in approximate['results'].items():
+        assert results['bounds'] == {metric: [results[metric]] * 2 for metric in METRICS}
+        assert {metric: round(results[metric], 2) for metric in METRICS} == exact[sim_type]
+
+def test_team_tasks_are_counted_once(small_thresholds):
+    # 600 distinct tasks are below the threshold although the pooled
+    # team segment doubles the number of simulated rows
+    duration, deadline, priority = generate_columns(600)
+    uid = ['first'] * 300 + ['second'] * 300
+    team = approximate_team(8, ['first', 'second'], uid, duration, deadline, priority, now=NOW, seed=1)
+    assert team['approximation']['exact']
+    assert team['approximation']['total'] == 600
@@ -0,0 +1,33 @@
+"""tests of snapshots written from exported task files"""
+
+import json
+import os
+from datetime import datetime
+
+from conftest import MONTY_DIRECTORY
+from snapshot import TaskSnapshot, json_chunks, write_snapshot
+
+TASKS_FILE = os.path.join(MONTY_DIRECTORY, 'tasks.json')
+
+
+def test_json_round_trip(tmp_path):
+    """tasks.json lacks hours_remaining, created and task_title,
+    which default to the duration, the conversion time and the
+    content of each task"""
+    with open(TASKS_FILE, 'r') as f:
+        tasks = json.load(f)['tasks']
+    before = datetime.utcnow()
+    assert write_snapshot(json_chunks(TASKS_FILE), str(tmp_path)) == len(tasks)
+
+    snapshot = TaskSnapshot(str(tmp_path))
+    assert len(snapshot) == len(tasks)
+    assert snapshot.uids == ['']
+    for index, expected in enumerate(tasks):
+        task = snapshot.task(index)
+        assert str(task.task_id) == expected['task_id']
+        assert task.task_title == task.content == expected['content']
+        assert task.priority == expected['priority']
+        assert task.duration == task.hours_remaining == expected['duration']
+        assert task.deadline == datetime.fromisoformat(expected['deadline'])
+        assert task.completion_date is None
+        assert before <= task.created <= datetime.utcnow()
@@ -0,0 +1,37 @@
+"""tests of ETags and user data versions"""
+
+import versioning
+from versioning import generate_etag, invalidate_user, use_persisted_versions
+
+
+def test_etags_are_only_sent_with_successful_responses(client, uid):
+    code, headers, _ = client.call('GET', '/monty/tasks/search', uid, query='q=report')
+    assert code == 200 and 'etag' in headers
+    code, headers, _ = client.call('GET', '/monty/tasks/search', uid, query='q=report',
+                                   headers={'If-None-Match': headers['etag']})
+    assert code == 304
+    code, headers, _ = client.call('GET', '/monty/tasks/search', uid, query='q=')
+    assert code == 400 and 'etag' not in headers
+
+def test_persisted_versions_are_shared_and_never_decrease(monkeypatch):
+    monkeypatch.setattr(versioning, 'USER_VERSIONS', {})
+    monkeypatch.setattr(versioning, 'VERSION_EPOCH', versioning.VERSION_EPOCH)
+    monkeypatch.setattr(versioning, 'VERSION_LOADER', None)
+    persisted = {'user': 7}
+    use_persisted_versions(lambda uid: persisted.get(uid, 0))
+
+    # every process loading the same version issues the same tag
+    etag = generate_etag('user', 'resource')
+    assert etag.startswith('"p-7-')
+    versioning.USER_VERSIONS.clear()
+    assert generate_etag('user', 'resource') == etag
+
+    # notifications delivered out of order do not move versions back
+    invalidate_user('user', 9)
+    invalidate_user('user', 8)
+    assert generate_etag('user', 'resource').startswith('"p-9-')
+
+    # flushed versions are reloaded instead of restarting at 0
+    persisted['user'] = 10
+    invalidate_user(None)
+    assert generate_etag('user', 'resource').startswith('"p-10-')
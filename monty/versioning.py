@@ -0,0 +1,191 @@
+"""Module containing per-user data versions used to
+generate ETags and answer conditional requests"""
+
+import logging
+import hashlib
+import threading
+import time
+import uuid
+
+from bottle import request, response
+
+
+LOGGER = logging.getLogger(__name__)
+
+# ETags contain an epoch and the data version of a user. Versions
+# of persistent backends are stored with the data and shared by all
+# processes, so their epoch is fixed and every process issues the
+# same tag for the same data. Other versions are only held in memory
+# and use a random epoch, so that tags issued by a different process
+# (or before a restart) never match. The random epoch is replaced
+# whenever all versions are flushed
+VERSION_EPOCH = uuid.uuid4().hex[:8]
+PERSISTED_EPOCH = 'p'
+# identifies changes made by this process in invalidation messages
+PROCESS_ID = uuid.uuid4().hex
+
+# versions known to this process. persisted versions are cached
+# until they are invalidated
+USER_VERSIONS = {}
+VERSION_LOCK = threading.Lock()
+# function used to load the persisted version of a user if set
+VERSION_LOADER = None
+
+# functions called with a user ID when the data of a user is changed
+# by any process, or with None when all cached data must be dropped
+INVALIDATION_HANDLERS = []
+
+def use_persisted_versions(loader: object):
+    """Function used to load versions from the persistence
+    backend instead of counting them in memory
+
+    Arguments:
+        loader: function returning the persisted version of a user
+    """
+    global VERSION_LOADER, VERSION_EPOCH
+    with VERSION_LOCK:
+        VERSION_LOADER, VERSION_EPOCH = loader, PERSISTED_EPOCH
+        USER_VERSIONS.clear()
+
+def get_user_version(uid: str) -> int:
+    """Function used to retrieve the current data
+    version for a given user. Persisted versions are
+    loaded on first use
+
+    Arguments:
+        uid: str ID of user
+    Returns:
+        int containing current version
+    """
+    if (version := USER_VERSIONS.get(str(uid))) is not None or VERSION_LOADER is None:
+        return version or 0
+    return set_user_version(uid, VERSION_LOADER(str(uid)))
+
+def set_user_version(uid: str, version: int) -> int:
+    """Function used to record a persisted data version of a
+    user. Versions never decrease, so versions loaded before
+    a concurrent change do not replace newer versions
+
+    Arguments:
+        uid: str ID of user
+        version: int persisted version
+    Returns:
+        int containing current version
+    """
+    with VERSION_LOCK:
+        version = max(USER_VERSIONS.get(str(uid), 0), version)
+        USER_VERSIONS[str(uid)] = version
+    return version
+
+def bump_user_version(uid: str) -> int:
+    """Function used to increment the in-memory data version
+    of a user. Must be called after every mutation of the users
+    data has been committed
+
+    Arguments:
+        uid: str ID of user
+    Returns:
+        int containing new version
+    """
+    with VERSION_LOCK:
+        version = USER_VERSIONS.get(str(uid), 0) + 1
+        USER_VERSIONS[str(uid)] = version
+    return version
+
+def flush_user_versions():
+    """Function used to invalidate all versions. Persisted
+    versions are reloaded, while in-memory versions are
+    dropped together with every ETag issued by this process"""
+    global VERSION_EPOCH
+    with VERSION_LOCK:
+        if VERSION_LOADER is None:
+            VERSION_EPOCH = uuid.uuid4().hex[:8]
+        USER_VERSIONS.clear()
+
+def invalidate_user(uid: str, version: int = None):
+    """Function used to invalidate all cached data of a
+    user after a change made by any process. Pass None to
+    invalidate the cached data of all users
+
+    Arguments:
+        uid: str ID of user or None
+        version: int persisted version after the change. the
+            in-memory version is incremented if not given
+    """
+    if uid is None:
+        flush_user_versions()
+    elif version is None:
+        bump_user_version(uid)
+    else:
+        set_user_version(uid, version)
+    for handler in INVALIDATION_HANDLERS:
+        handler(uid)
+
+def generate_etag(uid: str, resource: str, ttl: int = None) -> str:
+    """Function used to generate a strong ETag for a
+    resource of a given user. The tag changes whenever the
+    user version changes and, if a ttl is given, when the
+    current time bucket changes
+
+    Arguments:
+        uid: str ID of user
+        resource: str identifier of resource representation
+        ttl: int optional lifetime of tag in seconds
+    Returns:
+        str containing quoted ETag
+    """
+    bucket = int(time.time() // ttl) if ttl else 0
+    digest = hashlib.blake2b(f'{resource}:{bucket}'.encode(), digest_size=8).hexdigest()
+    return f'"{VERSION_EPOCH}-{get_user_version(uid)}-{digest}"'
+
+def etag_matches(etag: str, header: str) -> bool:
+    """Function used to check if an ETag matches the
+    value of an If-None-Match header
+
+    Arguments:
+        etag: str quoted ETag of current representation
+        header: str value of If-None-Match header
+    Returns:
+        True if tag matches else False
+    """
+    tags = [tag.strip() for tag in header.split(',')]
+    return any(tag == '*' or tag.replace('W/', '', 1) == etag for tag in tags)
+
+def is_successful(result: object) -> bool:
+    """Function used to check if a route result is a 2xx
+    response. Envelopes returned by routes carry their own
+    HTTP code, which may differ from the response status"""
+    if not 200 <= response.status_code < 300:
+        return False
+    return not isinstance(result, dict) or 200 <= result.get('http_code', 200) < 300
+
+def conditional_response(ttl: int = None):
+    """Wrapper used to add ETags to route responses and
+    answer requests with a matching If-None-Match header
+    with 304 Not Modified without calling the route. Routes
+    must be authenticated so that request.uid is set
+
+    Arguments:
+        ttl: int optional lifetime of tags in seconds for
+            resources that change over time
+    """
+    def make_wrapper(func: object):
+        def wrapper(*args: tuple, **kwargs: dict):
+            # representations vary by negotiated content type and encoding
+            resource = ':'.join([request.fullpath, request.query_string, request.headers.get('Accept', ''),
+                                 request.headers.get('Accept-Encoding', '')])
+            # tag is generated before the route is called so that data
+            # modified during the request is never cached with a newer tag
+            etag = generate_etag(request.uid, resource, ttl=ttl)
+            if (header := request.headers.get('If-None-Match')) is not None and etag_matches(etag, header):
+                LOGGER.debug('returning not modified for user %s', request.uid)
+                response.set_header('ETag', etag)
+                response.status = 304
+                return b''
+            result = func(*args, **kwargs)
+            # errors must not be cached and revalidated
+            if is_successful(result):
+                response.set_header('ETag', etag)
+            return result
+        return wrapper
+    return make_wrapper
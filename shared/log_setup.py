@@ -0,0 +1,225 @@
+"""module containing logging setup shared by all services.
+Records are handed to a queue on the calling thread and
+formatted and written by a background listener so that log
+I/O never blocks requests. Services import this module with
+flat imports, so images copy it next to the service modules
+and local runs add the shared directory to PYTHONPATH"""
+
+import logging
+import atexit
+import json
+import queue
+import random
+import threading
+import time
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+
+TEXT_FORMAT = '%(levelname)s:%(name)s:%(message)s'
+
+# attributes present on every log record. any other attributes
+# are passed using the extra argument and included in JSON output
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formatter used to render log records as
+    single line JSON objects"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Function used to format log record"""
+        entry = {
+            'timestamp': datetime.utcfromtimestamp(record.created).isoformat() + 'Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage()
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES})
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+EXCEPTION_FORMATTER = logging.Formatter()
+
+FORMATTERS = {
+    'text': lambda: logging.Formatter(TEXT_FORMAT),
+    'json': JsonFormatter
+}
+
+class RateLimitFilter(logging.Filter):
+    """Filter used to limit the number of records emitted per
+    message template in a given interval. Only records at or
+    below the given level are limited, which keeps hot loop
+    debug messages from flooding the log. The number of
+    suppressed records is appended to the next emitted record"""
+
+    def __init__(self, limit: int, interval: float = 1.0, level: int = logging.DEBUG):
+        super().__init__()
+        self.limit, self.interval, self.level = limit, interval, level
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Function used to determine if record is emitted"""
+        if record.levelno > self.level:
+            return True
+        key, now = (record.name, record.msg), time.monotonic()
+        with self._lock:
+            start, count, suppressed = self._windows.get(key, (now, 0, 0))
+            if now - start >= self.interval:
+                start, count = now, 0
+            if count >= self.limit:
+                self._windows[key] = (start, count, suppressed + 1)
+                return False
+            self._windows[key] = (start, count + 1, 0)
+        if suppressed and isinstance(record.msg, str):
+            record.msg = f'{record.msg} [suppressed {suppressed} similar messages]'
+        return True
+
+class SampleFilter(logging.Filter):
+    """Filter used to emit a random sample of records at
+    or below a given level"""
+
+    def __init__(self, rate: float, level: int = logging.DEBUG):
+        super().__init__()
+        self.rate, self.level = rate, level
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Function used to determine if record is emitted"""
+        return record.levelno > self.level or random.random() < self.rate
+
+class DeferredQueueHandler(QueueHandler):
+    """Queue handler that hands records to the listener
+    without applying the formatter first. The message and
+    traceback are rendered on the calling thread, so that
+    arguments changed after the call are logged as they were
+    and exceptions do not keep frames alive in the queue,
+    while formatting and writing happen on the listener"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Function used to prepare record for queueing"""
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = EXCEPTION_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def parse_module_levels(value: str, levels: dict) -> dict:
+    """Function used to parse per-module log levels from
+    a string in the format module=LEVEL,module=LEVEL
+
+    Arguments:
+        value: str containing module levels
+        levels: dict mapping level names to levels
+    Returns:
+        dict mapping logger names to levels
+    """
+    module_levels = {}
+    for item in filter(None, (item.strip() for item in value.split(','))):
+        name, _, level = item.partition('=')
+        if level.strip().upper() in levels:
+            module_levels[name.strip()] = levels[level.strip().upper()]
+    return module_levels
+
+def configure_logging(level: int, module_levels: dict = None, log_format: str = 'text', rate_limit: int = 0,
+                      rate_interval: float = 1.0, sample_rate: float = 1.0) -> QueueListener:
+    """Function used to configure the root logger with
+    a queue based pipeline. Records are filtered on the
+    calling thread and written by a background listener
+
+    Arguments:
+        level: int root log level
+        module_levels: dict mapping logger names to levels
+        log_format: str output format. must be one of FORMATTERS
+        rate_limit: int max debug records per message and interval.
+            0 disables rate limiting
+        rate_interval: float length of rate limit interval in seconds
+        sample_rate: float fraction of debug records to emit
+    Returns:
+        QueueListener writing log records
+    """
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(FORMATTERS.get(log_format, FORMATTERS['text'])())
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    if sample_rate < 1:
+        queue_handler.addFilter(SampleFilter(sample_rate))
+    if rate_limit > 0:
+        queue_handler.addFilter(RateLimitFilter(rate_limit, rate_interval))
+
+    # process lookups are not used by any of the formatters
+    logging.logProcesses, logging.logMultiprocessing = False, False
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    for name, module_level in (module_levels or {}).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+def benchmark(count: int = 100000):
+    """Function used to benchmark the per-call overhead of
+    debug logging from a hot loop on the calling thread with
+    an inline stream handler and with the queue pipeline"""
+
+    class Payload:
+        """object with an expensive representation"""
+        def __repr__(self):
+            return 'Payload(' + ', '.join(f'field_{i}={i}' for i in range(20)) + ')'
+
+    def measure(setup: object) -> float:
+        logger, payload = logging.getLogger('benchmark'), Payload()
+        listener = setup()
+        start = time.perf_counter()
+        for i in range(count):
+            logger.debug('simulating task %s', payload)
+        elapsed = time.perf_counter() - start
+        if listener is not None:
+            listener.stop()
+            atexit.unregister(listener.stop)
+        return elapsed / count * 1e6
+
+    def inline(log_format: str) -> None:
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        handler = logging.FileHandler('/dev/null')
+        handler.setFormatter(FORMATTERS[log_format]())
+        root.addHandler(handler)
+        root.setLevel(logging.DEBUG)
+
+    def pipeline(**kwargs: dict) -> QueueListener:
+        listener = configure_logging(logging.DEBUG, **kwargs)
+        # write to /dev/null rather than stderr
+        listener.handlers[0].setStream(open('/dev/null', 'w'))
+        return listener
+
+    results = {
+        'inline text': measure(lambda: inline('text')),
+        'inline json': measure(lambda: inline('json')),
+        'queue text': measure(lambda: pipeline(log_format='text')),
+        'queue json': measure(lambda: pipeline(log_format='json')),
+        'queue json rate limited': measure(lambda: pipeline(log_format='json', rate_limit=10)),
+        'queue json 1% sampled': measure(lambda: pipeline(log_format='json', sample_rate=0.01)),
+        'disabled': measure(lambda: logging.getLogger().setLevel(logging.INFO))
+    }
+    for name, overhead in results.items():
+        print(f'{name:<28} {overhead:8.2f} us/call')
+
+
+if __name__ == '__main__':
+
+    benchmark()